@@ -1,5 +1,7 @@
 drop table if exists template_by_count;
 
+-- dcm2niix sidecar rows (Source='sidecar') are missing columns (bids_sidecar.SIDECAR_NULL)
+-- and would make their own, incomplete, parameter sets. templates come from dicoms
 create table template_by_count as
 with cnts as (
   select
@@ -8,6 +10,7 @@ with cnts as (
    from acq a
    join acq_param p
      on a.param_id = p.rowid
+   where a.Source is not 'sidecar'
    group by Project, SequenceName, param_id
 ),
 best as (
@@ -25,6 +28,7 @@ select b.*,
         JOIN acq_param p ON a.param_id = p.rowid
         WHERE p.Project = b.Project
         AND p.SequenceName = b.SequenceName
+        AND a.Source is not 'sidecar'
         ORDER BY te_sort
     )
   ) as multiecho_tes
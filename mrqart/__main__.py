@@ -5,6 +5,12 @@ mrqart CLI entrypoint.
 Commands:
   - daily-email (default): runs the daily email job (email_latest_flip.main)
   - seq-report: prints a per-sequence summary for a specific Project/SubID/SequenceName
+  - archive: moves old years of acq into per-year databases (archive.archive_before)
+  - replay: writes dicoms into a watched directory and reports websocket latency (replay.replay)
+  - session-watch: ingests and checks each new session as it lands in scan_data (session_ingest.main)
+  - xnat-emit: posts a fake XNAT session archived event to mrqart.py (xnat_events.post_event)
+  - sidecar-ingest: adds (or checks) acquisitions from dcm2niix JSON sidecars (bids_sidecar)
+  - recheck: recomputes qa_result verdicts made stale by template changes (recheck.recheck)
 """
 
 from __future__ import annotations
@@ -17,6 +23,17 @@ from pathlib import Path
 from .email_latest_flip import main as daily_email_main
 from .seq_report import parse_seq_path, render_seq_report
 
+SUBCOMMANDS = (
+    "daily-email",
+    "seq-report",
+    "archive",
+    "replay",
+    "session-watch",
+    "xnat-emit",
+    "sidecar-ingest",
+    "recheck",
+)
+
 
 def _repo_root() -> Path:
     # mrqart/__main__.py -> mrqart/ -> repo root
@@ -53,6 +70,18 @@ def _build_parser() -> argparse.ArgumentParser:
         default=None,
         help="Override report date as YYYYMMDD or YYYY-MM-DD (default: yesterday)",
     )
+    sp_daily.add_argument(
+        "--from",
+        dest="date_from",
+        default=None,
+        help="Backfill: print (never mail) a report for every day from this date",
+    )
+    sp_daily.add_argument(
+        "--to",
+        dest="date_to",
+        default=None,
+        help="Last day for --from (default: yesterday)",
+    )
     sp_daily.add_argument(
         "--print-email",
         action="store_true",
@@ -60,6 +89,202 @@ def _build_parser() -> argparse.ArgumentParser:
         help="Dry run: build the email and print to stdout instead of sending",
     )
 
+    sp_daily.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Check projects in this many processes (default: 1, serial)",
+    )
+    sp_daily.add_argument(
+        "--archive-dir",
+        default=None,
+        help="Directory of per-year acq_YYYY.sqlite archives to attach (see 'archive')",
+    )
+
+    # ---- archive
+    sp_arch = sub.add_parser(
+        "archive", help="Move old years of acq into per-year attached databases"
+    )
+    sp_arch.add_argument(
+        "--db",
+        default=str(repo / "db.sqlite"),
+        help="Path to db.sqlite (default: ./db.sqlite)",
+    )
+    sp_arch.add_argument(
+        "--archive-dir",
+        required=True,
+        help="Directory for acq_YYYY.sqlite partitions (created if missing)",
+    )
+    sp_arch.add_argument(
+        "--before",
+        type=int,
+        required=True,
+        help="Archive acquisitions from years before this one, e.g. 2025",
+    )
+    sp_arch.add_argument(
+        "--vacuum",
+        action="store_true",
+        default=False,
+        help="VACUUM db.sqlite after moving rows out",
+    )
+
+    # ---- replay
+    sp_replay = sub.add_parser(
+        "replay", help="Load test a running mrqart.py by replaying dicoms"
+    )
+    sp_replay.add_argument(
+        "--src",
+        required=True,
+        help="Directory tree of dicoms to replay, e.g. example_dicoms/phantom20240226",
+    )
+    sp_replay.add_argument(
+        "--dest", required=True, help="Directory mrqart.py is watching (--watch)"
+    )
+    sp_replay.add_argument(
+        "--stations",
+        type=int,
+        default=1,
+        help="Concurrent simulated scanners (default: 1)",
+    )
+    sp_replay.add_argument(
+        "--rate",
+        type=float,
+        default=10.0,
+        help="Files per second per station; 0 for no delay (default: 10)",
+    )
+    sp_replay.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Only replay the first N files of --src",
+    )
+    sp_replay.add_argument(
+        "--ws",
+        default="ws://127.0.0.1:5000",
+        help="Websocket URL of the server (default: ws://127.0.0.1:5000)",
+    )
+
+    # ---- session-watch
+    sp_ses = sub.add_parser(
+        "session-watch",
+        help="Ingest and check each new session minutes after it is copied",
+    )
+    sp_ses.add_argument(
+        "--root",
+        action="append",
+        default=[],
+        help="scan_data style directory of projects, or a project directory."
+        " Repeatable (default: /disk/mace2/scan_data)",
+    )
+    sp_ses.add_argument(
+        "--db",
+        default=str(repo / "db.sqlite"),
+        help="Path to db.sqlite (default: ./db.sqlite)",
+    )
+    sp_ses.add_argument(
+        "--reporting",
+        default=str(repo / "config" / "reporting.toml"),
+        help="Path to reporting.toml (default: ./config/reporting.toml)",
+    )
+    sp_ses.add_argument(
+        "--email-toml",
+        default=str(repo / "config" / "email_settings.toml"),
+        help="Path to email_settings.toml (default: ./config/email_settings.toml)",
+    )
+    sp_ses.add_argument(
+        "--settle",
+        type=float,
+        default=300.0,
+        help="Seconds a session must be unchanged before it is read (default: 300)",
+    )
+    sp_ses.add_argument(
+        "--poll",
+        type=float,
+        default=30.0,
+        help="Seconds between checks for new sessions (default: 30)",
+    )
+    sp_ses.add_argument(
+        "--notify-all",
+        action="store_true",
+        default=False,
+        help="Mail every session, not only those with nonconforming acquisitions",
+    )
+    sp_ses.add_argument(
+        "--session",
+        default=None,
+        help="Ingest and check this one session directory, then exit",
+    )
+    sp_ses.add_argument(
+        "--print-email",
+        action="store_true",
+        default=False,
+        help="Dry run: print each session's report instead of mailing it",
+    )
+
+    # ---- xnat-emit
+    sp_xnat = sub.add_parser(
+        "xnat-emit", help="Send a fake XNAT session archived event to mrqart.py"
+    )
+    sp_xnat.add_argument("project", help="XNAT project, e.g. WPC-8620")
+    sp_xnat.add_argument("label", help="XNAT session label, e.g. 11883_20250102")
+    sp_xnat.add_argument(
+        "--url",
+        default="http://127.0.0.1:8080/xnat/event",
+        help="Event endpoint (default: http://127.0.0.1:8080/xnat/event)",
+    )
+
+    # ---- recheck
+    sp_re = sub.add_parser(
+        "recheck",
+        help="Recompute stored verdicts (qa_result) that template changes made stale",
+    )
+    sp_re.add_argument(
+        "--db",
+        default=str(repo / "db.sqlite"),
+        help="Path to db.sqlite (default: ./db.sqlite)",
+    )
+    sp_re.add_argument(
+        "--reporting",
+        default=str(repo / "config" / "reporting.toml"),
+        help="reporting.toml for [compare] tolerances (default: ./config/reporting.toml)",
+    )
+    sp_re.add_argument(
+        "--rebuild",
+        action="store_true",
+        default=False,
+        help="Rebuild template_by_count first",
+    )
+
+    # ---- sidecar-ingest
+    sp_side = sub.add_parser(
+        "sidecar-ingest",
+        help="Add acquisitions to db.sqlite from dcm2niix BIDS sidecars",
+    )
+    sp_side.add_argument(
+        "paths", nargs="+", help="Sidecar .json files or directories of them"
+    )
+    sp_side.add_argument(
+        "--db",
+        default=str(repo / "db.sqlite"),
+        help="Path to db.sqlite (default: ./db.sqlite)",
+    )
+    sp_side.add_argument(
+        "--subid",
+        default=None,
+        help="SubID for anonymized sidecars (no PatientName)",
+    )
+    sp_side.add_argument(
+        "--acq-date",
+        default=None,
+        help="AcqDate (YYYYMMDD) when neither the sidecar nor its file name has it",
+    )
+    sp_side.add_argument(
+        "--check",
+        action="store_true",
+        default=False,
+        help="Check each acquisition against its template instead of adding it",
+    )
+
     # ---- seq-report
     sp = sub.add_parser(
         "seq-report", help="Quick summary for a specific Project/SubID/SequenceName"
@@ -104,7 +329,7 @@ def main(argv: list[str] | None = None) -> int:
     argv = list(sys.argv[1:] if argv is None else argv)
 
     # Backwards compat: if no subcommand, run daily-email
-    if not argv or argv[0] not in ("daily-email", "seq-report"):
+    if not argv or argv[0] not in SUBCOMMANDS:
         argv = ["daily-email"] + argv
 
     parser = _build_parser()
@@ -140,13 +365,125 @@ def main(argv: list[str] | None = None) -> int:
         print(report)
         return 0
 
+    if args.cmd == "archive":
+        import sqlite3
+
+        from .archive import archive_before
+
+        moved = archive_before(
+            sqlite3.connect(args.db),
+            args.archive_dir,
+            args.before,
+            vacuum=args.vacuum,
+        )
+        for year, n in moved.items():
+            print(f"{year}\t{n} acquisitions -> {args.archive_dir}")
+        return 0
+
+    if args.cmd == "replay":
+        from .replay import replay
+
+        stats = replay(
+            args.src,
+            args.dest,
+            stations=args.stations,
+            rate=args.rate,
+            ws_url=args.ws,
+            limit=args.limit,
+        )
+        for k, v in stats.items():
+            print(f"{k}\t{v}")
+        return 0
+
+    if args.cmd == "session-watch":
+        from .session_ingest import main as session_watch_main
+
+        return int(
+            session_watch_main(
+                args.root,
+                args.db,
+                args.reporting,
+                email_toml=None if args.print_email else args.email_toml,
+                settle=args.settle,
+                poll_interval=args.poll,
+                notify_all=args.notify_all,
+                session=args.session,
+            )
+        )
+
+    if args.cmd == "xnat-emit":
+        from .xnat_events import fake_session_event, post_event
+
+        status, body = post_event(
+            args.url, fake_session_event(args.project, args.label)
+        )
+        print(f"{status}\t{body}")
+        return 0 if status < 300 else 1
+
+    if args.cmd == "recheck":
+        import sqlite3
+
+        from .email_latest_flip import load_reporting_config, rebuild_templates
+        from .recheck import recheck
+        from .template_checker import compile_comparators
+
+        settings = load_reporting_config(Path(args.reporting))
+        sql = sqlite3.connect(args.db)
+        if args.rebuild:
+            rebuild_templates(sql)
+        stats = recheck(
+            sql,
+            compile_comparators(
+                settings.get("float_tolerance_default"),
+                settings.get("float_tolerance_by_col"),
+            ),
+        )
+        sql.commit()
+        print(
+            f"{stats.groups} groups, {stats.params} parameter sets, "
+            f"{stats.acquisitions} acquisitions rechecked in {stats.seconds:.1f}s"
+        )
+        return 0
+
+    if args.cmd == "sidecar-ingest":
+        import sqlite3
+
+        from .acq2sqlite import DBQuery
+        from .bids_sidecar import find_sidecars, ingest_sidecars, read_sidecars
+
+        sql = sqlite3.connect(args.db)
+        paths = find_sidecars(args.paths)
+        if args.check:
+            from .template_checker import TemplateChecker
+
+            tc = TemplateChecker(db=sql, context="JSON")
+            for hdr in read_sidecars(paths, args.subid, args.acq_date):
+                res = tc.check_header(hdr)
+                errors = ",".join(sorted(res["errors"])) or "-"
+                print(
+                    f"{hdr['SeriesNumber']}\t{hdr['SequenceName']}\t{res['conforms']}\t{errors}"
+                )
+            return 0
+        db = DBQuery(sql, source=DBQuery.SOURCE_SIDECAR)
+        n = ingest_sidecars(paths, db, args.subid, args.acq_date)
+        sql.commit()
+        print(f"{n} acquisitions from {len(paths)} sidecars")
+        return 0
+
     # default: daily-email
     if args.cmd in (None, "daily-email"):
         if args.date:
             os.environ["MRQART_DATE"] = str(args.date)
+        if args.date_from:
+            os.environ["MRQART_DATE_FROM"] = str(args.date_from)
+        if args.date_to:
+            os.environ["MRQART_DATE_TO"] = str(args.date_to)
+        if args.archive_dir:
+            os.environ["MRQART_ARCHIVE_DIR"] = str(args.archive_dir)
         os.environ["MRQART_DB"] = str(args.db)
         os.environ["MRQART_REPORTING_TOML"] = str(args.reporting)
         os.environ["MRQART_EMAIL_TOML"] = str(args.email_toml)
+        os.environ["MRQART_JOBS"] = str(args.jobs)
         return int(daily_email_main(dry_run=args.print_email))
 
     parser.print_help()
@@ -3,6 +3,7 @@
 Convert ``db.txt`` into a sqlite database.
 """
 
+import json
 import logging
 import os
 import re
@@ -30,6 +31,19 @@ def none_to_null(row: Optional[sqlite3.Row]):
     return res
 
 
+def template_row(row: Optional[sqlite3.Row]) -> Optional[dict]:
+    """
+    :py:func:`none_to_null` of a ``template_by_count`` join ``acq_param`` row.
+    ``TE`` is every echo's (``multiecho_tes``) when there's more than one.
+    """
+    res = none_to_null(row)
+    if res:
+        multiecho_tes = res.get("multiecho_tes", "")
+        if multiecho_tes and "," in str(multiecho_tes):
+            res["TE"] = multiecho_tes
+    return res
+
+
 def column_names():
     """
     Column names used by dcmmeta2tsv.py and schema.sql.
@@ -94,7 +108,18 @@ class DBQuery:
         "SequenceFile",
     ]
 
-    def __init__(self, sql=None):
+    #: ``acq.Source`` for rows the realtime server (``mrqart.py``) wrote
+    SOURCE_REALTIME = "realtime"
+    #: ``acq.Source`` for rows from the nightly crawl (``mrrc_dbupdate.py``)
+    SOURCE_NIGHTLY = "nightly"
+    #: ``acq.Source`` for rows from dcm2niix sidecars (:py:mod:`bids_sidecar`)
+    SOURCE_SIDECAR = "sidecar"
+    #: realtime (ICEconfig pushed) dicoms can be missing these.
+    #: a realtime row with any of them null is re-read by the nightly crawl.
+    #: cf. :py:meth:`template_checker.TemplateChecker.allow_null`
+    RT_MAYBE_NULL = ["FoV", "TA", "BWPPE"]
+
+    def __init__(self, sql=None, source: Optional[str] = None):
         """
         Do a bunch of the query building up front:
           * find existing ``acq``
@@ -103,6 +128,9 @@ class DBQuery:
           * insert new into ``acq_param``
 
         :param sql: sql connection (None connects to ``db.sqlite`` default)
+        :param source: ``acq.Source`` for inserted rows
+            (:py:data:`SOURCE_REALTIME`, :py:data:`SOURCE_NIGHTLY`, :py:data:`SOURCE_SIDECAR`).
+            None leaves it null and doesn't need the column
         """
         self.all_columns = column_names()
         if sql:
@@ -146,7 +174,20 @@ class DBQuery:
         self.acq_insert_columns = ["param_id"] + list(acq_uniq_col)
         acq_col_csv = ",".join(self.acq_insert_columns)
         acq_q = ",".join(["?" for _ in self.acq_insert_columns])
-        self.acq_insert = f"INSERT INTO acq({acq_col_csv}) VALUES({acq_q});"
+        #: see :py:data:`SOURCE_REALTIME`
+        self.source = source
+        if source:
+            self.ensure_source_column()
+            acq_col_csv += ",Source"
+            acq_q += ",?"
+        # explicit 'main.' so inserts skip the temp 'acq' view from archive.attach_archives
+        self.acq_insert = f"INSERT INTO main.acq({acq_col_csv}) VALUES({acq_q});"
+
+    def ensure_source_column(self):
+        "add ``acq.Source`` to databases made before it was in ``schema.sql``"
+        cols = [r[1] for r in self.sql.execute("PRAGMA main.table_info(acq)")]
+        if cols and "Source" not in cols:
+            self.sql.execute("ALTER TABLE main.acq ADD COLUMN Source text")
 
     def check_acq(self, d: TagValues) -> bool:
         """
@@ -256,10 +297,55 @@ class DBQuery:
             d[k] = str(v)
 
         acq_insert_vals = [d[k] for k in self.acq_insert_columns]
+        if self.source:
+            acq_insert_vals.append(self.source)
         cur = self.sql.execute(self.acq_insert, acq_insert_vals)
         logging.debug("new acq created: %d", cur.lastrowid)
         return True
 
+    def _acq_key(self, d: TagValues) -> list[str]:
+        "values for the ``acq`` columns in :py:attr:`find_acq`"
+        return [str(d[k]) for k in ("AcqTime", "AcqDate", "SubID", "SeriesNumber")]
+
+    def captured_live(self, d: TagValues) -> bool:
+        """
+        Did the realtime server already record this acquisition completely?
+        The nightly crawl can skip reading the rest of its files.
+
+        :param d: header of the acquisition's first dicom
+        :return: True if a :py:data:`SOURCE_REALTIME` row exists
+            with none of :py:data:`RT_MAYBE_NULL` null
+        """
+        complete = " and ".join(
+            f"coalesce(p.{c}, 'null') != 'null'" for c in self.RT_MAYBE_NULL
+        )
+        cur = self.sql.execute(
+            f"""
+            select 1 from main.acq a join acq_param p on a.param_id = p.rowid
+            where a.AcqTime like ? and a.AcqDate like ? and a.SubID = ?
+              and a.SeriesNumber = ? and a.Source = ? and {complete}
+            """,
+            self._acq_key(d) + [self.SOURCE_REALTIME],
+        )
+        return cur.fetchone() is not None
+
+    def drop_live(self, d: TagValues) -> int:
+        """
+        Remove a realtime or sidecar row for this acquisition
+        so a complete (nightly) one can replace it.
+        Otherwise :py:meth:`check_acq` finds the incomplete row and skips the insert.
+
+        :return: rows deleted
+        """
+        cur = self.sql.execute(
+            """
+            delete from main.acq where AcqTime like ? and AcqDate like ?
+              and SubID = ? and SeriesNumber = ? and Source in (?, ?)
+            """,
+            self._acq_key(d) + [self.SOURCE_REALTIME, self.SOURCE_SIDECAR],
+        )
+        return cur.rowcount
+
     def tsv_to_dict(self, line: str) -> TagValues:
         """
         Read a tsv line into dictionary.
@@ -300,16 +386,56 @@ class DBQuery:
             """,
             (pname, seqname),
         )
-        res = cur.fetchone()
-        res = none_to_null(res)
-        if res is not None:
-            res = dict(res)
-            multiecho_tes = res.get("multiecho_tes", "")
-            if multiecho_tes and "," in str(multiecho_tes):
-                res["TE"] = multiecho_tes
+        res = template_row(cur.fetchone())
         logging.debug("found template: %s", res)
         return res
 
+    def get_templates(
+        self, keys: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], Optional[dict]]:
+        """
+        :py:meth:`get_template` for many ``(Project, SequenceName)`` pairs in one query.
+
+        :param keys: ``(pname, seqname)`` pairs
+        :returns: pair -> template (same as :py:meth:`get_template`) or None
+        """
+        found: dict[tuple[str, str], Optional[dict]] = {k: None for k in keys}
+        if not keys:
+            return found
+        # keys travel as one JSON parameter: no temp table, works read-only
+        cur = self.sql.execute(
+            """
+            with k as (
+              select key as i, json_extract(value, '$[0]') as kp,
+                     json_extract(value, '$[1]') as ks
+              from json_each(?))
+            select k.i as key_index, t.*, p.* from k
+            join template_by_count t
+              on t.Project like k.kp and t.SequenceName like k.ks
+            join acq_param p on t.param_id = p.rowid
+            order by k.i, t.rowid
+            """,
+            (json.dumps([list(k) for k in keys]),),
+        )
+        for row in cur:
+            key = keys[row["key_index"]]
+            if found[key] is not None:
+                continue  # get_template's fetchone: first match only
+            res = template_row(row)
+            del res["key_index"]
+            found[key] = res
+        return found
+
+    def get_all_templates(self) -> list[dict]:
+        "every template in ``template_by_count``, as :py:meth:`get_template` returns them"
+        cur = self.sql.execute(
+            """
+            select * from template_by_count t
+            join acq_param p on t.param_id = p.rowid
+            """
+        )
+        return [template_row(r) for r in cur]
+
     def get_param_value_counts(self, project: str, seqname: str, col: str) -> dict:
         """
         Count how many times each distinct value has been seen
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Roll old years of ``acq`` out of ``db.sqlite`` into per-year databases.
+
+Layout in ``archive_dir``::
+
+    acq_2022.sqlite   # only an ``acq`` table, AcqDate 20220101..20221231
+    acq_2023.sqlite
+    ...
+
+``acq_param`` (and ``template_by_count``, ``project``) stay in the hot database.
+They are small and every partition's ``param_id`` points into them.
+
+:py:func:`attach_archives` ATTACHes the partitions and creates a ``TEMP VIEW acq``
+(``UNION ALL`` of ``main.acq`` and every attached year).
+SQLite resolves unqualified names in the ``temp`` schema first,
+so every existing ``... from acq a join acq_param p ...`` query
+(:py:class:`acq2sqlite.DBQuery`, ``email_latest_flip``, ``make_template_by_count.sql``)
+sees the full history without changes.
+Writes go to ``main.acq`` (see :py:attr:`acq2sqlite.DBQuery.acq_insert`).
+
+``acq`` has no AUTOINCREMENT: SQLite gives a new row ``max(rowid) + 1`` of
+``main.acq``. When the newest rows are archived (an old session ingested late)
+that would hand their rowids out again and ``acq_id`` (``qa_result``) would
+point at two acquisitions. :py:func:`archive_before` records the highest archived
+rowid in ``acq_rowid_floor`` and a trigger moves any new row at or below it past it.
+
+Each view arm carries its year's ``AcqDate`` range and every partition has an
+``AcqDate`` index, so a date predicate is an index probe per partition.
+Pass ``years=`` to :py:func:`attach_archives` to skip partitions entirely.
+The history a sequence's first-seen date needs is then missing, so
+:py:func:`archive_before` also keeps ``acq_first_seen`` in the hot database:
+the earliest archived ``AcqDate`` of every (Project, SequenceName).
+"""
+
+import logging
+import os
+import re
+import sqlite3
+from glob import glob
+from typing import Iterable, Optional
+
+#: archive file name pattern. ``{year}`` is 4 digits
+PARTITION_FMT = "acq_{year}.sqlite"
+#: schema alias pattern used for ATTACH
+ALIAS_FMT = "acq_{year}"
+
+
+def partition_path(archive_dir: os.PathLike, year: int) -> str:
+    """
+    :param archive_dir: directory holding per-year archives
+    :param year: 4 digit year
+    :return: path to that year's archive database
+
+    >>> partition_path('/tmp/arch', 2023)
+    '/tmp/arch/acq_2023.sqlite'
+    """
+    return os.path.join(archive_dir, PARTITION_FMT.format(year=year))
+
+
+def archived_years(archive_dir: os.PathLike) -> list[int]:
+    """
+    :param archive_dir: directory holding per-year archives
+    :return: sorted years with an archive file
+    """
+    years = []
+    for fname in glob(os.path.join(archive_dir, PARTITION_FMT.format(year="*"))):
+        m = re.search(r"acq_([0-9]{4})\.sqlite$", fname)
+        if m:
+            years.append(int(m.group(1)))
+    return sorted(years)
+
+
+#: highest rowid in any archive, and the trigger keeping new ``main.acq`` rows above it
+ROWID_FLOOR_SCHEMA = [
+    "create table if not exists main.acq_rowid_floor (last integer)",
+    """
+    create trigger if not exists main.acq_rowid_floor after insert on acq
+    when new.rowid <= (select max(last) from acq_rowid_floor)
+    begin
+      update acq set rowid = (select max(last) from acq_rowid_floor) + 1
+      where rowid = new.rowid;
+    end
+    """,
+]
+
+
+#: earliest archived AcqDate per sequence. see :py:func:`record_first_seen`
+FIRST_SEEN_SCHEMA = """
+create table if not exists main.acq_first_seen (
+  Project text,
+  SequenceName text,
+  "first" text,
+  primary key (Project, SequenceName)
+)
+"""
+
+
+def record_first_seen(sql: sqlite3.Connection, alias: str) -> None:
+    "fold an attached partition's earliest AcqDate per sequence into ``acq_first_seen``"
+    sql.execute(
+        f"""
+        insert into main.acq_first_seen (Project, SequenceName, "first")
+        select p.Project, p.SequenceName, min(a.AcqDate)
+        from {alias}.acq a join main.acq_param p on a.param_id = p.rowid
+        where a.AcqDate is not null
+        group by p.Project, p.SequenceName
+        on conflict (Project, SequenceName)
+        do update set "first" = min("first", excluded."first")
+        """
+    )
+
+
+def _acq_columns(sql: sqlite3.Connection, schema: str = "main") -> list[str]:
+    "column names of ``schema.acq`` in table order"
+    return [r[1] for r in sql.execute(f"PRAGMA {schema}.table_info(acq)")]
+
+
+def _year_range(year: int) -> tuple[str, str]:
+    "AcqDate bounds (inclusive) for a year. AcqDate is stored as YYYYMMDD"
+    return (f"{year}0101", f"{year}1231")
+
+
+def _attach(sql: sqlite3.Connection, archive_dir: os.PathLike, year: int) -> str:
+    "attach a year (creating the file and table if needed). return schema alias"
+    alias = ALIAS_FMT.format(year=year)
+    attached = {r[1] for r in sql.execute("PRAGMA database_list")}
+    if alias not in attached:
+        sql.execute(
+            "ATTACH DATABASE ? AS " + alias, (partition_path(archive_dir, year),)
+        )
+
+    create_acq = sql.execute(
+        "select sql from main.sqlite_master where type='table' and name='acq'"
+    ).fetchone()[0]
+    # 'create table acq (' -> 'create table if not exists acq_2023.acq ('
+    create_acq = re.sub(
+        r"^\s*create\s+table\s+acq\b",
+        f"CREATE TABLE IF NOT EXISTS {alias}.acq",
+        create_acq,
+        flags=re.I,
+    )
+    sql.execute(create_acq)
+    # columns added to main.acq after the archive was made (e.g. Source)
+    have = set(_acq_columns(sql, alias))
+    for col in _acq_columns(sql):
+        if col not in have:
+            sql.execute(f"ALTER TABLE {alias}.acq ADD COLUMN {col}")
+    sql.execute(f"CREATE INDEX IF NOT EXISTS {alias}.acq_acqdate ON acq(AcqDate)")
+    return alias
+
+
+def hot_years(sql: sqlite3.Connection) -> list[int]:
+    """
+    :param sql: connection to the hot database
+    :return: years present in ``main.acq`` (rows with unparsable AcqDate ignored)
+    """
+    rows = sql.execute(
+        """
+        select distinct substr(AcqDate, 1, 4) from main.acq
+        where AcqDate glob '[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]'
+        """
+    ).fetchall()
+    return sorted(int(r[0]) for r in rows)
+
+
+def archive_before(
+    sql: sqlite3.Connection,
+    archive_dir: os.PathLike,
+    before_year: int,
+    vacuum: bool = False,
+) -> dict[int, int]:
+    """
+    Move every ``main.acq`` row older than ``before_year`` into its year's archive.
+    Original rowids are kept, and new ``main.acq`` rows get rowids above every
+    archived one (``acq_rowid_floor``), so ``acq_id`` stays unique across partitions.
+    ``acq_first_seen`` is refreshed from every partition, older archives included.
+
+    :param sql: connection to the hot ``db.sqlite``. No archives should be attached
+                (the temp ``acq`` view would otherwise be in the way of :py:func:`hot_years`)
+    :param archive_dir: where ``acq_YYYY.sqlite`` files live (created if missing)
+    :param before_year: first year to keep in the hot database
+    :param vacuum: run ``VACUUM`` on the hot database afterwards
+    :return: {year: rows moved}
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    cols = ",".join(_acq_columns(sql))
+    with sql:
+        for stmt in ROWID_FLOOR_SCHEMA:
+            sql.execute(stmt)
+        sql.execute(FIRST_SEEN_SCHEMA)
+    moved = {}
+    for year in hot_years(sql):
+        if year >= before_year:
+            continue
+        alias = _attach(sql, archive_dir, year)
+        lo, hi = _year_range(year)
+        with sql:
+            cur = sql.execute(
+                f"""
+                INSERT INTO {alias}.acq(rowid, {cols})
+                SELECT rowid, {cols} FROM main.acq WHERE AcqDate BETWEEN ? AND ?
+                """,
+                (lo, hi),
+            )
+            moved[year] = cur.rowcount
+            # before the delete frees them: archived rowids are never handed out again
+            sql.execute(
+                f"""
+                INSERT INTO main.acq_rowid_floor SELECT max(rowid) FROM {alias}.acq
+                """
+            )
+            sql.execute("DELETE FROM main.acq WHERE AcqDate BETWEEN ? AND ?", (lo, hi))
+        sql.execute(f"DETACH DATABASE {alias}")
+        logging.info("archived %d acq rows from %d", moved[year], year)
+
+    for year in archived_years(archive_dir):
+        alias = _attach(sql, archive_dir, year)
+        with sql:
+            record_first_seen(sql, alias)
+        sql.execute(f"DETACH DATABASE {alias}")
+
+    if vacuum and moved:
+        sql.execute("VACUUM main")
+    return moved
+
+
+def attach_archives(
+    sql: sqlite3.Connection,
+    archive_dir: os.PathLike,
+    years: Optional[Iterable[int]] = None,
+) -> list[int]:
+    """
+    ATTACH year archives and shadow ``acq`` with a ``UNION ALL`` temp view.
+
+    The view exposes ``rowid`` as a real column so ``a.rowid`` still works.
+    The side effect is that ``select * from acq`` has an extra leading ``rowid`` column.
+
+    :param sql: connection to the hot ``db.sqlite``
+    :param archive_dir: where ``acq_YYYY.sqlite`` files live
+    :param years: only attach these years (default: all archived years)
+    :return: years attached
+    """
+    available = archived_years(archive_dir)
+    if years is not None:
+        want = set(years)
+        available = [y for y in available if y in want]
+
+    cols = _acq_columns(sql)
+    col_csv = ",".join(cols)
+    arms = [f"SELECT rowid AS rowid, {col_csv} FROM main.acq"]
+    for year in available:
+        alias = _attach(sql, archive_dir, year)
+        lo, hi = _year_range(year)
+        arms.append(
+            f"SELECT rowid, {col_csv} FROM {alias}.acq"
+            f" WHERE AcqDate BETWEEN '{lo}' AND '{hi}'"
+        )
+
+    sql.execute("DROP VIEW IF EXISTS temp.acq")
+    sql.execute("CREATE TEMP VIEW acq AS " + "\nUNION ALL\n".join(arms))
+    logging.debug("acq view over main + %s", available)
+    return available
+
+
+def years_for_range(start: str, end: str) -> list[int]:
+    """
+    Years a ``YYYYMMDD`` date range touches. Useful for ``attach_archives(years=...)``
+
+    >>> years_for_range('20231215', '20250102')
+    [2023, 2024, 2025]
+    """
+    return list(range(int(start[:4]), int(end[:4]) + 1))
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Header values from dcm2niix BIDS sidecars (``dcm2niix -b o``, see ``dcm2nii_check.bash``)
+instead of dicoms.
+
+:py:func:`sidecar_to_tags` gives the same :py:data:`dcmmeta2tsv.TagValues`
+(``taglist.txt`` names, dicom units and text) that
+:py:meth:`dcmmeta2tsv.DicomTagReader.read_dicom_tags` would for the series,
+so :py:class:`acq2sqlite.DBQuery` and :py:class:`template_checker.TemplateChecker`
+take either. Reading a few kB of JSON beats reading dicoms over NFS.
+
+Sidecars don't have everything. :py:data:`SIDECAR_NULL` are always ``null``
+(TemplateChecker ``context="JSON"`` doesn't count them as errors).
+``SubID`` and ``AcqDate`` are only there when dcm2niix didn't anonymize
+(``-ba n``); otherwise pass them in, or ``AcqDate`` is taken from a
+``%t`` (``yyyymmddhhmmss``) file name prefix.
+"""
+
+import json
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from .dcmmeta2tsv import NULLVAL, TagValues, read_known_tags
+
+#: ``taglist.txt`` names dcm2niix doesn't write
+SIDECAR_NULL = ["TA", "FoV", "PixelResol", "Operator"]
+
+
+@lru_cache(maxsize=1)
+def _tag_names() -> tuple[str, ...]:
+    "``taglist.txt`` names, read once"
+    return tuple(t["name"] for t in read_known_tags())
+
+
+def _num(value, scale: float = 1) -> str:
+    """
+    Number as the dicom decimal string would have it.
+
+    >>> _num(3.23, 1000), _num(0.0892, 1000), _num(78), _num(10.352)
+    ('3230', '89.2', '78', '10.352')
+    """
+    s = repr(round(float(value) * scale, 6))
+    return s[:-2] if s.endswith(".0") else s
+
+
+def dicom_time(bids_time: str) -> str:
+    """
+    :param bids_time: ``AcquisitionTime`` like ``15:35:2.115000`` (dcm2niix doesn't pad seconds)
+    :return: dicom TM like ``153502.115000``
+
+    >>> dicom_time("15:35:2.115000"), dicom_time("9:05:18.265")
+    ('153502.115000', '090518.265')
+    """
+    hh, mm, ss = bids_time.split(":")
+    sec, _, frac = ss.partition(".")
+    out = f"{int(hh):02d}{int(mm):02d}{int(sec):02d}"
+    return f"{out}.{frac}" if frac else out
+
+
+def phase_positive(ped: Optional[str], inplane: Optional[str]) -> str:
+    """
+    CSA ``PhaseEncodingDirectionPositive`` from the BIDS direction.
+    dcm2niix flips the row axis, so positive ``COL`` is written ``j-``.
+
+    >>> phase_positive("j-", "COL"), phase_positive("j", "COL"), phase_positive("i", "ROW")
+    ('1', '0', '1')
+    >>> phase_positive(None, "COL")
+    'null'
+    """
+    if not ped or inplane not in ("ROW", "COL"):
+        return NULLVAL.value
+    negative = ped.endswith("-")
+    if inplane == "COL":
+        return "1" if negative else "0"
+    return "0" if negative else "1"
+
+
+def sidecar_to_tags(
+    sidecar: dict,
+    json_path: Optional[str] = None,
+    subid: Optional[str] = None,
+    acq_date: Optional[str] = None,
+) -> TagValues:
+    """
+    :param sidecar: parsed dcm2niix JSON
+    :param json_path: file it came from. stored where dicoms have ``dcm_path``
+    :param subid: ``SubID`` when the sidecar has no ``PatientName``
+    :param acq_date: ``AcqDate`` (``yyyymmdd``) when the sidecar has no ``AcquisitionDateTime``
+    :return: values for every ``taglist.txt`` name, in its order
+    """
+    s = sidecar
+    null = NULLVAL.value
+
+    def get(key, fmt=str):
+        return fmt(s[key]) if s.get(key) is not None else null
+
+    if s.get("AcquisitionDateTime"):
+        date, _, time_ = s["AcquisitionDateTime"].partition("T")
+        acq_date = acq_date or date.replace("-", "")
+        acq_time = dicom_time(time_)
+    else:
+        if not acq_date and json_path:
+            m = re.match(r"(\d{8})\d{6}", os.path.basename(json_path))
+            acq_date = m.group(1) if m else None
+        acq_time = get("AcquisitionTime", dicom_time)
+
+    base, pe = s.get("BaseResolution"), s.get("AcquisitionMatrixPE")
+    matrix = str([base, 0, 0, pe]) if base and pe else null
+
+    freq = s.get("ImagingFrequency")
+    shims = s.get("ShimSetting")
+    if shims and freq:
+        # read_shims order. sAdjData.uiAdjShimMode (last) isn't in the sidecar
+        shims = ",".join([str(x) for x in shims] + [str(round(freq * 1e6)), null])
+    else:
+        shims = null
+
+    ipat = s.get("ParallelReductionFactorInPlane")
+    values = {
+        "Phase": phase_positive(
+            s.get("PhaseEncodingDirection"), s.get("InPlanePhaseEncodingDirectionDICOM")
+        ),
+        "iPAT": f"p{ipat}" if ipat else null,
+        "AcqTime": acq_time,
+        "AcqDate": acq_date or null,
+        "SeriesNumber": get("SeriesNumber"),
+        "SubID": s.get("PatientName") or subid or null,
+        "Comments": get("ImageComments"),
+        "Station": get("StationName"),
+        "Project": s.get("StudyDescription") or get("ProcedureStepDescription"),
+        "SequenceName": get("SeriesDescription"),
+        # dicom SequenceName (0018,0024). dcm2niix drops the leading '*'
+        "SequenceType": get("SequenceName"),
+        "PED_major": get("InPlanePhaseEncodingDirectionDICOM"),
+        "TR": get("RepetitionTime", lambda v: _num(v, 1000)),
+        "TE": get("EchoTime", lambda v: _num(v, 1000)),
+        "Matrix": matrix,
+        "BWP": get("PixelBandwidth", _num),
+        "BWPPE": get("BandwidthPerPixelPhaseEncode", _num),
+        "FA": get("FlipAngle", _num),
+        "Shims": shims,
+        "SequenceFile": get("PulseSequenceDetails").replace("\\", "/"),
+    }
+    out = {name: values.get(name, null) for name in _tag_names()}
+    for k, v in out.items():
+        # same cleanup as dcmmeta2tsv.read_tags
+        out[k] = v.replace("\t", " ").replace("\n", " ")
+    out["dcm_path"] = json_path or null
+    return out
+
+
+def read_sidecar(
+    json_path: str, subid: Optional[str] = None, acq_date: Optional[str] = None
+) -> TagValues:
+    """
+    :py:func:`sidecar_to_tags` of a file.
+
+    >>> hdr = read_sidecar('example_jsons/20220823142419-31-dMRI_b0_AP-ep_b5#1.json')
+    >>> [hdr[k] for k in ("AcqDate", "AcqTime", "TR", "TE", "Phase", "SequenceType")]
+    ['20220823', '153518.265000', '3230', '89.2', '1', 'ep_b5#1']
+    """
+    with open(json_path) as f:
+        return sidecar_to_tags(json.load(f), json_path, subid, acq_date)
+
+
+def read_sidecars(
+    json_paths: Iterable[str],
+    subid: Optional[str] = None,
+    acq_date: Optional[str] = None,
+) -> list[TagValues]:
+    """
+    One header per acquisition. dcm2niix writes a sidecar per echo (``_e2``, ...);
+    like :py:meth:`dcmmeta2tsv.DicomTagReader.read_many_dicom_tags`,
+    those are merged with the TEs comma separated.
+
+    :return: headers in file order of each acquisition's first sidecar
+    """
+    acqs: dict[tuple, TagValues] = {}
+    for path in json_paths:
+        try:
+            hdr = read_sidecar(path, subid, acq_date)
+        except (OSError, ValueError) as err:
+            logging.warning("skipping sidecar %s: %s", path, err)
+            continue
+        key = (hdr["SubID"], hdr["AcqDate"], hdr["SeriesNumber"])
+        if key not in acqs:
+            acqs[key] = hdr
+        elif hdr["TE"] not in acqs[key]["TE"].split(","):
+            acqs[key]["TE"] += "," + hdr["TE"]
+    return list(acqs.values())
+
+
+def find_sidecars(paths: Iterable[str]) -> list[str]:
+    "``*.json`` in each directory (recursively), files as given. sorted"
+    found = []
+    for path in paths:
+        if not os.path.isdir(path):
+            found.append(path)
+            continue
+        for root, _, files in os.walk(path):
+            found += [os.path.join(root, f) for f in files if f.endswith(".json")]
+    return sorted(found)
+
+
+def ingest_sidecars(
+    json_paths: Iterable[str],
+    db,
+    subid: Optional[str] = None,
+    acq_date: Optional[str] = None,
+) -> int:
+    """
+    Add the acquisitions described by ``json_paths`` to the DB. Doesn't commit.
+
+    :param db: :py:class:`acq2sqlite.DBQuery`, likely with ``source=DBQuery.SOURCE_SIDECAR``
+    :return: acquisitions added (or already in the DB)
+    """
+    added = 0
+    for hdr in read_sidecars(json_paths, subid, acq_date):
+        if hdr["SubID"] == NULLVAL.value or hdr["AcqDate"] == NULLVAL.value:
+            logging.warning("no SubID or AcqDate for %s. not added", hdr["dcm_path"])
+            continue
+        added += bool(db.dict_to_db_row(hdr))
+    return added
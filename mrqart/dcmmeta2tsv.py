@@ -271,11 +271,14 @@ class DicomTagReader:
     def __init__(self):
         self.tags = read_known_tags()
 
-    def read_many_dicom_tags(self, dcm_paths: list[os.PathLike]) -> TagValues:
+    def read_many_dicom_tags(
+        self, dcm_paths: list[os.PathLike], first: Optional[TagValues] = None
+    ) -> TagValues:
         """
         Read tags for multiple dicoms, likely from the same acquisition.
         Combined TE when changing within protocol.
         :param dcm_paths: a list of files likely sorted by AcqTime
+        :param first: already read tags of ``dcm_paths[0]``
         :return: acquisition summary. multiple TE's separated by commas
         """
         all_tags: list[TagValues] = (
@@ -283,7 +286,10 @@ class DicomTagReader:
         )  # not needed. Maybe useful later to walk backwards
         tag = {}  # what to return
         for i, dcm in enumerate(dcm_paths):
-            all_tags.append(self.read_dicom_tags(dcm))
+            if i == 0 and first is not None:
+                all_tags.append(first)
+            else:
+                all_tags.append(self.read_dicom_tags(dcm))
             # nothing to compare on first iteration. use as template
             if i == 0:
                 tag = all_tags[0]
@@ -7,11 +7,15 @@ Refactor note:
 - Core logic is split into testable helpers:
   - get_report_date()
   - fetch_acquisitions()
+  - fetch_session_acquisitions()  <-- one session, for session_ingest
   - select_eligible_rows()
+  - select_eligible()       <-- same filter as SQL predicates, by AcqDate (main, backfill)
   - _evaluate_row()         <-- per-row logic, extracted for testability
   - evaluate_rows()
+  - evaluate_rows_parallel() <-- same, sharded by Project over processes
   - format_seq_result()     <-- renders a single SeqSummary entry to lines
   - build_email()
+  - check_day()             <-- one day's rows to a DayReport (main, backfill)
   - send_all()
 
 Behavior should be identical to the previous version.
@@ -19,17 +23,22 @@ Behavior should be identical to the previous version.
 
 from __future__ import annotations
 
+import json
 import os
 import re
 import sqlite3
 import subprocess
 import sys
 from collections import defaultdict
-from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
 from datetime import datetime, timedelta
+from functools import lru_cache, partial
 from pathlib import Path
 from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
 
+from . import qa_result
+from .acq2sqlite import DBQuery
 from .template_checker import TemplateChecker
 
 try:
@@ -142,6 +151,8 @@ def load_reporting_config(toml_path: Path) -> FilterSettings:
 
       [compare]
       marquee_cols = [...]
+      float_tolerance_default = 1e-3
+      float_tolerance_by_col = { TE = 0.05, TR = 1.0 }
 
     Note: SequenceType is always added to marquee_set at evaluation time
     (in evaluate_rows) regardless of what is listed here.
@@ -185,6 +196,9 @@ def load_reporting_config(toml_path: Path) -> FilterSettings:
     settings["marquee_cols"] = list(
         comp.get("marquee_cols", default_filter["marquee_cols"])
     )
+    # None -> TemplateChecker defaults (template_checker.FLOAT_TOLERANCE_*)
+    settings["float_tolerance_default"] = comp.get("float_tolerance_default")
+    settings["float_tolerance_by_col"] = dict(comp.get("float_tolerance_by_col", {}))
 
     return settings
 
@@ -316,38 +330,130 @@ def is_interesting_sequence_with_blacklist(
 ) -> bool:
     """
     Rules:
+      0) If SequenceName contains any deny substring, exclude.
       1) If SequenceName contains any interesting substring, include.
       2) Else if disable_blacklist is True, include.
       3) Else if SequenceType prefix is in blacklist, exclude.
       4) Else include.
     """
+    return compile_filter(settings).sequence_ok(seqname, seqtype)
 
-    interesting_substrings = settings.get("interesting_substrings")
-    deny_substrings = settings.get("deny_substrings")
-    blacklist_seqtype_prefixes = settings.get("blacklist_seqtype_prefixes")
-    disable_blacklist = settings.get("disable_blacklist")
 
-    sname = (seqname or "").lower()
+#: SQL for "not series_is_posthoc(SeriesNumber)". Format with the column.
+#: Only all-digit numbers can be >= 100; anything else is kept, like series_int()
+SERIES_NOT_POSTHOC_SQL = (
+    "({s} IS NULL OR trim({s}) = '' OR trim({s}) GLOB '*[^0-9]*'"
+    " OR CAST(trim({s}) AS INTEGER) < 100)"
+)
 
-    if deny_substrings and any(d.lower() in sname for d in deny_substrings):
-        return False
+# blacklist_study_regex that are a plain prefix ('^Body') become GLOB predicates
+_LITERAL_PREFIX = re.compile(r"\^([\w -]+)")
 
-    if interesting_substrings and any(
-        sub.lower() in sname for sub in interesting_substrings
-    ):
-        return True
 
-    if disable_blacklist:
-        return True
+def _substring_re(subs: Iterable[str] | None) -> Optional[re.Pattern]:
+    "one regex for 'any of subs in the lowercased name'"
+    subs = list(subs or [])
+    if not subs:
+        return None
+    return re.compile("|".join(re.escape(sub.lower()) for sub in subs))
+
+
+@dataclass(frozen=True)
+class RowFilter:
+    """
+    reporting.toml [filter] compiled once by compile_filter():
+    substring lists as one regex each, blacklist_study_regex as GLOB
+    prefixes plus one combined regex.
+    """
 
-    stype = (seqtype or "").lower()
-    if stype and blacklist_seqtype_prefixes:
-        prefix = stype.split("_", 1)[0]
-        blk = {p.lower() for p in blacklist_seqtype_prefixes}
-        if prefix in blk:
+    deny: Optional[re.Pattern] = None
+    interesting: Optional[re.Pattern] = None
+    blacklist_prefixes: frozenset = frozenset()
+    disable_blacklist: bool = False
+    study_prefixes: Tuple[str, ...] = ()
+    study_regex: Tuple[re.Pattern, ...] = ()
+
+    def study_skipped(self, project: str | None) -> bool:
+        project = project or ""
+        if project.startswith(self.study_prefixes):
+            return True
+        return any(r.search(project) for r in self.study_regex)
+
+    def study_regex_skipped(self, project: str | None) -> bool:
+        "just the regexes not in study_sql()"
+        return any(r.search(project or "") for r in self.study_regex)
+
+    def sequence_ok(self, seqname: str | None, seqtype: str | None) -> bool:
+        "is_interesting_sequence_with_blacklist()"
+        sname = (seqname or "").lower()
+        if self.deny and self.deny.search(sname):
             return False
+        if self.interesting and self.interesting.search(sname):
+            return True
+        if self.disable_blacklist:
+            return True
+        stype = (seqtype or "").lower()
+        if stype and self.blacklist_prefixes:
+            return stype.split("_", 1)[0] not in self.blacklist_prefixes
+        return True
+
+    def register(self, sql: sqlite3.Connection) -> None:
+        """
+        mrqart_study_skip(Project) and mrqart_seq_ok(SequenceName, SequenceType)
+        for study_sql() and select_eligible()
+        """
+        sql.create_function(
+            "mrqart_study_skip",
+            1,
+            lambda project: int(self.study_regex_skipped(project)),
+            deterministic=True,
+        )
+        seq_ok = lru_cache(maxsize=None)(self.sequence_ok)
+        sql.create_function(
+            "mrqart_seq_ok",
+            2,
+            lambda name, stype: int(seq_ok(name, stype)),
+            deterministic=True,
+        )
 
-    return True
+    def study_sql(self, col: str = "p.Project") -> str:
+        "SQL for 'not study_skipped(col)'. needs register() for the regexes"
+        skip = [f"coalesce({col}, '') GLOB '{pre}*'" for pre in self.study_prefixes]
+        if self.study_regex:
+            skip.append(f"mrqart_study_skip({col})")
+        return f"NOT ({' OR '.join(skip)})" if skip else "1"
+
+
+def compile_filter(settings: FilterSettings) -> RowFilter:
+    """
+    >>> f = compile_filter({"deny_substrings": ["Scout"], "blacklist_study_regex": ["^7T", "X$"]})
+    >>> f.sequence_ok("AAScout_x", None), f.study_prefixes, f.study_skipped("Brain^X")
+    (False, ('7T',), True)
+    """
+    prefixes, regexes = [], []
+    for pattern in settings.get("blacklist_study_regex") or []:
+        m = _LITERAL_PREFIX.fullmatch(pattern)
+        if m:
+            prefixes.append(m.group(1))
+        else:
+            regexes.append(pattern)
+    compiled = [re.compile(r) for r in regexes]
+    if len(compiled) > 1 and not any(r.groups for r in compiled):
+        # one search instead of one per pattern. groups would renumber backreferences
+        try:
+            compiled = [re.compile("|".join(f"(?:{r})" for r in regexes))]
+        except re.error:  # e.g. a global flag like (?i) no longer at the start
+            pass
+    return RowFilter(
+        deny=_substring_re(settings.get("deny_substrings")),
+        interesting=_substring_re(settings.get("interesting_substrings")),
+        blacklist_prefixes=frozenset(
+            p.lower() for p in settings.get("blacklist_seqtype_prefixes") or []
+        ),
+        disable_blacklist=bool(settings.get("disable_blacklist")),
+        study_prefixes=tuple(prefixes),
+        study_regex=tuple(compiled),
+    )
 
 
 # -----------------------------
@@ -378,6 +484,35 @@ def first_seen_from_template_by_count(
     return yyyymmdd_to_iso(row[0])
 
 
+def archived_first_seen(
+    sql: sqlite3.Connection, keys: Iterable[Tuple[str, str]]
+) -> Dict[Tuple[str, str], str]:
+    """
+    (Project, SequenceName) -> earliest archived AcqDate (YYYYMMDD), from
+    acq_first_seen (archive.archive_before). Archived years need not be attached.
+    Empty without archives.
+    """
+    has_table = sql.execute(
+        "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'acq_first_seen'"
+    ).fetchone()
+    if not has_table:
+        return {}
+    found: Dict[Tuple[str, str], str] = {}
+    for row in sql.execute(
+        """
+        SELECT f.Project, f.SequenceName, f."first"
+        FROM json_each(?) k
+        JOIN main.acq_first_seen f
+          ON f.Project = json_extract(k.value, '$[0]')
+         AND f.SequenceName = json_extract(k.value, '$[1]')
+        """,
+        (_json_param(keys),),
+    ):
+        if row[2]:
+            found[(row[0], row[1])] = row[2]
+    return found
+
+
 def first_seen_date_for_seq(
     sql: sqlite3.Connection, project: str, seqname: str
 ) -> str | None:
@@ -390,15 +525,18 @@ def first_seen_date_for_seq(
         """,
         (project, seqname),
     ).fetchone()
-    if not row or not row[0]:
+    dates = [d for d in (row and row[0],) if d]
+    dates += archived_first_seen(sql, [(project, seqname)]).values()
+    if not dates:
         return None
-    return yyyymmdd_to_iso(row[0])
+    return yyyymmdd_to_iso(min(dates))
 
 
 def rebuild_templates(sql: sqlite3.Connection) -> None:
     if not TEMPLATE_SQL.exists():
         raise FileNotFoundError(f"Missing SQL: {TEMPLATE_SQL}")
     dbg(f"rebuilding template_by_count from {TEMPLATE_SQL.name}")
+    DBQuery(sql).ensure_source_column()  # the sql skips sidecar rows
     for stmt in TEMPLATE_SQL.read_text().split(";"):
         stmt = stmt.strip()
         if stmt:
@@ -435,6 +573,127 @@ def get_physicist_for_project(sql: sqlite3.Connection, project: str) -> Optional
     return str(row[0]).strip()
 
 
+# -----------------------------
+# Set-based lookups (one query per kind, not per row)
+# -----------------------------
+def _json_param(values: Iterable[Any]) -> str:
+    "keys as one JSON parameter for json_each(): no temp table, works read-only"
+    return json.dumps([list(v) if isinstance(v, tuple) else v for v in values])
+
+
+def study_has_templates_many(
+    sql: sqlite3.Connection, projects: Iterable[str]
+) -> Dict[str, bool]:
+    """
+    study_has_any_templates() for every project at once.
+    """
+    projects = list(dict.fromkeys(projects))
+    if not projects:
+        return {}
+    have = {
+        r[0]
+        for r in sql.execute(
+            """
+            SELECT DISTINCT t.Project
+            FROM template_by_count t
+            JOIN json_each(?) k ON t.Project = k.value
+            """,
+            (_json_param(projects),),
+        )
+    }
+    return {p: p in have for p in projects}
+
+
+def first_seen_many(
+    sql: sqlite3.Connection, keys: Iterable[Tuple[str, str]]
+) -> Dict[Tuple[str, str], Optional[str]]:
+    """
+    first_seen_from_template_by_count(), falling back to first_seen_date_for_seq(),
+    for every (Project, SequenceName) at once. Two queries.
+    """
+    keys = list(dict.fromkeys(keys))
+    found: Dict[Tuple[str, str], Optional[str]] = {k: None for k in keys}
+    if not keys:
+        return found
+    seen = set()
+    pairs = """
+        WITH k AS (
+          SELECT json_extract(value, '$[0]') AS Project,
+                 json_extract(value, '$[1]') AS SequenceName
+          FROM json_each(?))
+    """
+    for row in sql.execute(
+        pairs
+        + """
+        SELECT k.Project, k.SequenceName, t."first"
+        FROM k
+        JOIN template_by_count t
+          ON t.Project = k.Project AND t.SequenceName = k.SequenceName
+        ORDER BY t.rowid
+        """,
+        (_json_param(keys),),
+    ):
+        key = (row[0], row[1])
+        if key in seen:
+            continue  # first row only, like fetchone()
+        seen.add(key)
+        if row[2] is not None:
+            found[key] = yyyymmdd_to_iso(row[2])
+
+    rest = [k for k in keys if not found[k]]
+    if not rest:
+        return found
+    # history not attached (SKIP_REBUILD with an archive) is in acq_first_seen
+    first = archived_first_seen(sql, rest)
+    for row in sql.execute(
+        pairs
+        + """
+        SELECT k.Project, k.SequenceName, MIN(a.AcqDate)
+        FROM k
+        JOIN acq_param p
+          ON p.Project = k.Project AND p.SequenceName = k.SequenceName
+        JOIN acq a ON a.param_id = p.rowid
+        GROUP BY k.Project, k.SequenceName
+        """,
+        (_json_param(rest),),
+    ):
+        key = (row[0], row[1])
+        if row[2]:
+            first[key] = min(first.get(key, row[2]), row[2])
+    for key, date in first.items():
+        found[key] = yyyymmdd_to_iso(date)
+    return found
+
+
+def physicists_for_projects(
+    sql: sqlite3.Connection, projects: Iterable[str]
+) -> Dict[str, Optional[str]]:
+    """
+    get_physicist_for_project() for every project at once.
+    """
+    projects = list(dict.fromkeys(projects))
+    found: Dict[str, Optional[str]] = {p: None for p in projects}
+    if not projects:
+        return found
+    seen = set()
+    for row in sql.execute(
+        """
+        SELECT k.value, pr.Physicist
+        FROM json_each(?) k
+        JOIN project pr
+          ON UPPER(pr.Project) = UPPER(SUBSTR(k.value, INSTR(k.value, '^') + 1))
+        ORDER BY k.key, pr.rowid
+        """,
+        (_json_param(projects),),
+    ):
+        if row[0] in seen:
+            continue  # first match only, like LIMIT 1
+        seen.add(row[0])
+        if row[1] and str(row[1]).strip():
+            found[row[0]] = str(row[1]).strip()
+    return found
+
+
 @dataclass(frozen=True)
 class ReportDate:
     report_date: datetime
@@ -463,6 +722,8 @@ class RowResult:
     errors_dict: Dict[str, Dict[str, str]] = field(default_factory=dict)
     first_seen: Optional[str] = None
     study_has_templates: bool = False
+    #: closest template when missing_template (see TemplateChecker.nearest_template)
+    nearest: Optional[Dict[str, Any]] = None
 
 
 @dataclass
@@ -564,11 +825,37 @@ def get_report_date(env: Mapping[str, str], now: datetime | None = None) -> Repo
     )
 
 
+def get_report_range(
+    env: Mapping[str, str], now: datetime | None = None
+) -> Optional[List[ReportDate]]:
+    """
+    Backfill dates, inclusive:
+      - MRQART_DATE_FROM (YYYYMMDD or YYYY-MM-DD). None if not set
+      - MRQART_DATE_TO, same format. default: yesterday
+    """
+    start = env.get("MRQART_DATE_FROM")
+    if not start:
+        return None
+    first = get_report_date({"MRQART_DATE": start}, now)
+    last = get_report_date({"MRQART_DATE": env.get("MRQART_DATE_TO", "")}, now)
+    if last.report_date < first.report_date:
+        raise ValueError(
+            f"date range ends before it starts: {start} to {last.yday_str}"
+        )
+    days = []
+    day = first.report_date
+    while day <= last.report_date:
+        days.append(get_report_date({"MRQART_DATE": day.strftime("%Y%m%d")}))
+        day += timedelta(days=1)
+    return days
+
+
 def fetch_acquisitions(sql: sqlite3.Connection, yday_str: str) -> List[sqlite3.Row]:
+    DBQuery(sql).ensure_source_column()
     return sql.execute(
         """
         SELECT a.rowid AS acq_id,
-               a.AcqDate, a.AcqTime, a.Station, a.SubID, a.SeriesNumber,
+               a.AcqDate, a.AcqTime, a.Station, a.SubID, a.SeriesNumber, a.Source,
                p.*
         FROM acq a
         JOIN acq_param p ON a.param_id = p.rowid
@@ -579,6 +866,44 @@ def fetch_acquisitions(sql: sqlite3.Connection, yday_str: str) -> List[sqlite3.R
     ).fetchall()
 
 
+def fetch_session_acquisitions(
+    sql: sqlite3.Connection, subid: str, acq_date: str
+) -> List[sqlite3.Row]:
+    """
+    fetch_acquisitions() scoped to one session (``mrqart session-watch``).
+    """
+    DBQuery(sql).ensure_source_column()
+    return sql.execute(
+        """
+        SELECT a.rowid AS acq_id,
+               a.AcqDate, a.AcqTime, a.Station, a.SubID, a.SeriesNumber, a.Source,
+               p.*
+        FROM acq a
+        JOIN acq_param p ON a.param_id = p.rowid
+        WHERE a.AcqDate = ? AND a.SubID = ?
+        ORDER BY a.AcqDate, a.AcqTime, p.Project, p.SequenceName
+        """,
+        (acq_date, subid),
+    ).fetchall()
+
+
+def _eligible_counts(
+    eligible: Iterable[sqlite3.Row],
+) -> Tuple[Dict[str, int], Dict[SeqKey, int], Dict[str, set]]:
+    "study_counts_today, seq_counts_today, study_subids_today of eligible rows"
+    study_counts_today: Dict[str, int] = defaultdict(int)
+    seq_counts_today: Dict[SeqKey, int] = defaultdict(int)
+    study_subids_today: Dict[str, set] = defaultdict(set)
+    for row in eligible:
+        project = row["Project"]
+        subid = row["SubID"]
+        key: SeqKey = (project, subid, row["SequenceName"])
+        study_counts_today[project] += 1
+        seq_counts_today[key] += 1
+        study_subids_today[project].add(subid)
+    return study_counts_today, seq_counts_today, study_subids_today
+
+
 def select_eligible_rows(
     acq_rows: Iterable[sqlite3.Row], settings: FilterSettings
 ) -> Tuple[List[sqlite3.Row], Dict[str, int], Dict[SeqKey, int], Dict[str, set], set]:
@@ -598,11 +923,10 @@ def select_eligible_rows(
       - seq_counts_today: total eligible rows per (project, subid, seqname)
       - study_subids_today:
              set of unique SubIDs seen per project (for session count)
+    See select_eligible() to filter in the DB instead.
     """
+    flt = compile_filter(settings)
     eligible: List[sqlite3.Row] = []
-    study_counts_today: Dict[str, int] = defaultdict(int)
-    seq_counts_today: Dict[SeqKey, int] = defaultdict(int)
-    study_subids_today: Dict[str, set] = defaultdict(set)
     excluded_by_deny: set = set()
 
     for row in acq_rows:
@@ -610,36 +934,95 @@ def select_eligible_rows(
             continue
 
         project = row["Project"]
-        subid = row["SubID"]
         seqname = row["SequenceName"]
-        seqtype = row["SequenceType"]
 
         # skip blacklisted projects by regular expression
-        skip = False
-        for ignore_study_regex in settings.get("blacklist_study_regex", []):
-            if re.search(ignore_study_regex, project):
-                skip = True
-                break
-        if skip:
+        if flt.study_skipped(project):
             continue
 
-        if not is_interesting_sequence_with_blacklist(seqname, seqtype, settings):
+        if not flt.sequence_ok(seqname, row["SequenceType"]):
             excluded_by_deny.add((project, seqname))
             continue
 
         eligible.append(row)
-        key: SeqKey = (project, subid, seqname)
-        study_counts_today[project] += 1
-        seq_counts_today[key] += 1
-        study_subids_today[project].add(subid)
 
-    return (
-        eligible,
-        study_counts_today,
-        seq_counts_today,
-        study_subids_today,
-        excluded_by_deny,
-    )
+    return (eligible, *_eligible_counts(eligible), excluded_by_deny)
+
+
+@dataclass
+class Selection:
+    """select_eligible_rows() results for one day, and how many rows it saw."""
+
+    eligible: List[sqlite3.Row] = field(default_factory=list)
+    study_counts_today: Dict[str, int] = field(default_factory=dict)
+    seq_counts_today: Dict[SeqKey, int] = field(default_factory=dict)
+    study_subids_today: Dict[str, set] = field(default_factory=dict)
+    excluded_by_deny: set = field(default_factory=set)
+    total_seen: int = 0
+
+
+def select_eligible(
+    sql: sqlite3.Connection,
+    settings: FilterSettings,
+    where: str = "1",
+    args: Iterable[Any] = (),
+) -> Dict[str, Selection]:
+    """
+    select_eligible_rows() in the DB, by AcqDate. Ineligible rows are only
+    counted (total_seen) and listed in excluded_by_deny; they never leave SQLite.
+
+    @param where  on 'acq a JOIN acq_param p', like "a.AcqDate = ?"
+    @param args   for where's placeholders
+    Eligible rows are in fetch_acquisitions() order.
+    Needs acq.Source (DBQuery.ensure_source_column, done by main()).
+    """
+    flt = compile_filter(settings)
+    flt.register(sql)
+    args = tuple(args)
+    keep = f"{SERIES_NOT_POSTHOC_SQL.format(s='a.SeriesNumber')} AND {flt.study_sql()}"
+    seq_ok = "mrqart_seq_ok(p.SequenceName, p.SequenceType)"
+
+    by_date: Dict[str, Selection] = {}
+    for row in sql.execute(
+        f"""
+        SELECT a.AcqDate, p.Project, p.SequenceName, count(*),
+               max({keep} AND NOT {seq_ok})
+        FROM acq a
+        JOIN acq_param p ON a.param_id = p.rowid
+        WHERE {where}
+        GROUP BY 1, 2, 3
+        """,
+        args,
+    ):
+        day = by_date.setdefault(row[0], Selection())
+        day.total_seen += row[3]
+        if row[4]:
+            day.excluded_by_deny.add((row[1], row[2]))
+
+    eligible: Dict[str, List[sqlite3.Row]] = defaultdict(list)
+    for row in sql.execute(
+        f"""
+        SELECT a.rowid AS acq_id,
+               a.AcqDate, a.AcqTime, a.Station, a.SubID, a.SeriesNumber, a.Source,
+               p.*
+        FROM acq a
+        JOIN acq_param p ON a.param_id = p.rowid
+        WHERE ({where}) AND {keep} AND {seq_ok}
+        ORDER BY a.AcqDate, a.AcqTime, p.Project, p.SequenceName
+        """,
+        args,
+    ):
+        eligible[row[1]].append(row)
+
+    for date, rows in eligible.items():
+        day = by_date[date]
+        day.eligible = rows
+        (
+            day.study_counts_today,
+            day.seq_counts_today,
+            day.study_subids_today,
+        ) = _eligible_counts(rows)
+    return by_date
 
 
 def _evaluate_row(
@@ -652,20 +1035,25 @@ def _evaluate_row(
     first_seen_from_templates_fn: Callable[[sqlite3.Connection, str, str], str | None],
     first_seen_from_acq_fn: Callable[[sqlite3.Connection, str, str], str | None],
     templates_in_study_cache: Dict[str, bool],
+    res: Optional[Dict[str, Any]] = None,
+    first_seen_cache: Optional[Dict[Tuple[str, str], Optional[str]]] = None,
 ) -> RowResult:
     """
     Evaluate a single acquisition row against its template.
     Returns a RowResult describing what was found.
     RowResult wraps what TemplateChecker returns — no logic is duplicated,
     just structured for aggregation.
+    res is an already computed check_header result (from the batch
+    TemplateChecker.check_headers in evaluate_rows); checked here if None.
+    first_seen_cache keeps first_seen lookups to one per (project, seqname).
     """
     project = row["Project"]
     subid = row["SubID"]
     seqname = row["SequenceName"]
     key: SeqKey = (project, subid, seqname)
 
-    hdr = dict(row)
-    res = tc.check_header(hdr)
+    if res is None:
+        res = tc.check_header(dict(row))
 
     # Missing template
     if not res.get("template"):
@@ -675,15 +1063,20 @@ def _evaluate_row(
             )
         study_has_tmpl = bool(templates_in_study_cache[project])
 
-        fs = first_seen_from_templates_fn(sql, project, seqname)
-        if not fs:
-            fs = first_seen_from_acq_fn(sql, project, seqname)
+        if first_seen_cache is None:
+            first_seen_cache = {}
+        if (project, seqname) not in first_seen_cache:
+            fs = first_seen_from_templates_fn(sql, project, seqname)
+            if not fs:
+                fs = first_seen_from_acq_fn(sql, project, seqname)
+            first_seen_cache[(project, seqname)] = fs
 
         return RowResult(
             key=key,
             missing_template=True,
             study_has_templates=study_has_tmpl,
-            first_seen=fs,
+            first_seen=first_seen_cache[(project, seqname)],
+            nearest=res.get("nearest"),
         )
 
     errors_dict: Dict[str, Dict[str, str]] = res.get("errors") or {}
@@ -716,11 +1109,15 @@ def evaluate_rows(
     first_seen_from_acq_fn: Callable[
         [sqlite3.Connection, str, str], str | None
     ] = first_seen_date_for_seq,
+    qa_rows: Optional[List[tuple]] = None,
 ) -> Tuple[Dict[SeqKey, SeqSummary], Dict[SeqKey, Dict[str, Any]], Totals]:
     """
     Core evaluation engine — calls _evaluate_row for each eligible row
     and aggregates results into seq_summary, missing_templates, and totals.
 
+    qa_rows, when given, gets a qa_result.result_row for every checked row
+    (rows need acq_id, as from fetch_acquisitions) for the caller to store.
+
     SequenceType is always added to marquee_set here regardless of what is
     in reporting.toml, so SequenceType changes are always caught as nonconforming.
     """
@@ -734,6 +1131,7 @@ def evaluate_rows(
             "study_has_templates": False,
             "study_count_today": 0,
             "seq_count_today": 0,
+            "closest": None,
         }
     )
 
@@ -744,14 +1142,44 @@ def evaluate_rows(
     marquee_set = set(marquee_cols) | {"SequenceType"}
 
     templates_in_study_cache: Dict[str, bool] = {}
+    first_seen_cache: Dict[Tuple[str, str], Optional[str]] = {}
+
+    # one batch check (all templates in one query)
+    # when the checker supports it. test stubs may only have check_header
+    eligible_rows = list(eligible_rows)
+    checked: List[Optional[Dict[str, Any]]] = [None] * len(eligible_rows)
+    if hasattr(tc, "check_headers"):
+        checked = tc.check_headers(dict(row) for row in eligible_rows)
+
+    # prefetch lookups for missing templates in a few set-based queries
+    # (not per row). skipped when tests pass their own lookup functions
+    missing_keys = [
+        (row["Project"], row["SequenceName"])
+        for row, res in zip(eligible_rows, checked)
+        if res is None or not res.get("template")
+    ]
+    if missing_keys and study_has_templates_fn is study_has_any_templates:
+        templates_in_study_cache.update(
+            study_has_templates_many(sql, (k[0] for k in missing_keys))
+        )
+    if (
+        missing_keys
+        and first_seen_from_templates_fn is first_seen_from_template_by_count
+        and first_seen_from_acq_fn is first_seen_date_for_seq
+    ):
+        first_seen_cache.update(first_seen_many(sql, missing_keys))
 
-    for row in eligible_rows:
+    for row, res in zip(eligible_rows, checked):
         project = row["Project"]
         subid = row["SubID"]
         seqname = row["SequenceName"]
         key: SeqKey = (project, subid, seqname)
 
         totals.total_checked += 1
+        if qa_rows is not None:
+            if res is None:
+                res = tc.check_header(dict(row))
+            qa_rows.append(qa_result.result_row(row, res))
 
         if key not in seq_summary:
             seq_summary[key] = SeqSummary(key=key)
@@ -766,6 +1194,8 @@ def evaluate_rows(
             first_seen_from_templates_fn=first_seen_from_templates_fn,
             first_seen_from_acq_fn=first_seen_from_acq_fn,
             templates_in_study_cache=templates_in_study_cache,
+            res=res,
+            first_seen_cache=first_seen_cache,
         )
 
         if result.missing_template:
@@ -780,6 +1210,11 @@ def evaluate_rows(
             )
             if not missing_templates[key].get("first_seen"):
                 missing_templates[key]["first_seen"] = result.first_seen
+            if result.nearest and not missing_templates[key].get("closest"):
+                missing_templates[key]["closest"] = {
+                    "sequence": result.nearest["template"].get("SequenceName"),
+                    "diffs": sorted(result.nearest["errors"].keys()),
+                }
             if len(missing_templates[key]["examples"]) < 3:
                 s3 = format_series_003(row["SeriesNumber"])
                 missing_templates[key]["examples"].append(
@@ -815,6 +1250,155 @@ def evaluate_rows(
     return seq_summary, missing_templates, totals
 
 
+def connect_readonly(
+    db_path: Path | str,
+    archive_dir: Optional[str] = None,
+    archive_years: Optional[Iterable[int]] = None,
+) -> sqlite3.Connection:
+    """
+    Read-only connection for a worker process. Many can read at once.
+    archive_dir and archive_years are passed on to archive.attach_archives
+    so workers see the same acq as the parent.
+    """
+    sql = sqlite3.connect(f"file:{Path(db_path).resolve()}?mode=ro", uri=True)
+    sql.row_factory = sqlite3.Row
+    if archive_dir:
+        from .archive import attach_archives
+
+        attach_archives(sql, archive_dir, years=archive_years)
+    # archive files are attached read-write. nothing below should change them
+    sql.execute("PRAGMA query_only = ON")
+    return sql
+
+
+def _evaluate_shard(
+    rows: List[Dict[str, Any]],
+    db_path: str,
+    checker_kwargs: Dict[str, Any],
+    archive_dir: Optional[str],
+    archive_years: Optional[List[int]],
+    marquee_cols: List[str],
+    study_counts_today: Dict[str, int],
+    seq_counts_today: Dict[SeqKey, int],
+) -> Tuple[Dict[SeqKey, SeqSummary], Dict[SeqKey, Dict[str, Any]], Totals, List[tuple]]:
+    """
+    evaluate_rows for one project's rows in a worker process (results must pickle).
+    qa_result rows are returned for the parent to write: workers are read-only
+    """
+    sql = connect_readonly(db_path, archive_dir, archive_years)
+    qa_rows: List[tuple] = []
+    try:
+        tc = TemplateChecker(db=sql, context="DB", **checker_kwargs)
+        seq_summary, missing_templates, totals = evaluate_rows(
+            rows,
+            sql=sql,
+            tc=tc,
+            marquee_cols=marquee_cols,
+            study_counts_today=study_counts_today,
+            seq_counts_today=seq_counts_today,
+            qa_rows=qa_rows,
+        )
+    finally:
+        sql.close()
+    # defaultdict with a lambda factory doesn't pickle
+    return seq_summary, dict(missing_templates), totals, qa_rows
+
+
+def evaluate_rows_parallel(
+    eligible_rows: Iterable[sqlite3.Row],
+    *,
+    db_path: Path | str,
+    jobs: int,
+    marquee_cols: List[str],
+    study_counts_today: Mapping[str, int],
+    seq_counts_today: Mapping[SeqKey, int],
+    float_tolerance_default: Optional[float] = None,
+    float_tolerance_by_col: Optional[Mapping[str, float]] = None,
+    archive_dir: Optional[str] = None,
+    archive_years: Optional[Iterable[int]] = None,
+    qa_rows: Optional[List[tuple]] = None,
+) -> Tuple[Dict[SeqKey, SeqSummary], Dict[SeqKey, Dict[str, Any]], Totals]:
+    """
+    evaluate_rows with the rows sharded by Project across up to jobs processes,
+    each with its own read-only connection (connect_readonly) to db_path.
+
+    Every (project, subid, seqname) key is in exactly one shard, so merging is
+    putting the keys back in the order evaluate_rows would have (first eligible
+    row with the key) and summing Totals. Output is the same as the serial path.
+    template_by_count must be committed before this is called.
+    """
+    eligible_rows = [dict(row) for row in eligible_rows]
+    shards: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in eligible_rows:
+        shards[row["Project"]].append(row)
+
+    checker_kwargs = {
+        "float_tolerance_default": float_tolerance_default,
+        "float_tolerance_by_col": float_tolerance_by_col,
+    }
+    years = list(archive_years) if archive_years is not None else None
+    args = [
+        (
+            rows,
+            str(db_path),
+            checker_kwargs,
+            archive_dir,
+            years,
+            list(marquee_cols),
+            {project: int(study_counts_today.get(project, 0))},
+            {k: v for k, v in seq_counts_today.items() if k[0] == project},
+        )
+        for project, rows in shards.items()
+    ]
+    # biggest projects first so one isn't left running alone at the end
+    args.sort(key=lambda a: len(a[0]), reverse=True)
+
+    if jobs <= 1 or len(args) <= 1:
+        results = [_evaluate_shard(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(args))) as pool:
+            results = list(pool.map(_evaluate_shard, *zip(*args)))
+
+    by_key_summary: Dict[SeqKey, SeqSummary] = {}
+    by_key_missing: Dict[SeqKey, Dict[str, Any]] = {}
+    totals = Totals()
+    for shard_summary, shard_missing, shard_totals, shard_qa in results:
+        by_key_summary.update(shard_summary)
+        by_key_missing.update(shard_missing)
+        if qa_rows is not None:
+            qa_rows.extend(shard_qa)
+        for f in fields(Totals):
+            setattr(
+                totals, f.name, getattr(totals, f.name) + getattr(shard_totals, f.name)
+            )
+
+    seq_summary: Dict[SeqKey, SeqSummary] = {}
+    missing_templates: Dict[SeqKey, Dict[str, Any]] = {}
+    for row in eligible_rows:
+        key: SeqKey = (row["Project"], row["SubID"], row["SequenceName"])
+        if key in by_key_summary and key not in seq_summary:
+            seq_summary[key] = by_key_summary[key]
+        if key in by_key_missing and key not in missing_templates:
+            missing_templates[key] = by_key_missing[key]
+    return seq_summary, missing_templates, totals
+
+
+def format_closest(closest: Optional[Mapping[str, Any]]) -> Optional[str]:
+    """
+    One line for the closest template of a missing-template key.
+
+    >>> format_closest({"sequence": "T2w_FLAIR", "diffs": ["TA"]})
+    'closest template: T2w_FLAIR (diffs: TA)'
+    >>> format_closest({"sequence": "T2w_FLAIR", "diffs": []})
+    'closest template: T2w_FLAIR (same parameters)'
+    """
+    if not closest:
+        return None
+    diffs = closest.get("diffs") or []
+    what = f"diffs: {', '.join(diffs)}" if diffs else "same parameters"
+    return f"closest template: {closest.get('sequence')} ({what})"
+
+
 def build_email(
     *,
     date_label: str,
@@ -911,6 +1495,9 @@ def build_email(
                 )
                 for ex in info["examples"]:
                     lines.append(f"     - {ex}")
+                closest = format_closest(info.get("closest"))
+                if closest:
+                    lines.append(f"     ~ {closest}")
             lines.append("")
 
         if mia_no_study_templates:
@@ -927,6 +1514,9 @@ def build_email(
                 )
                 for ex in info["examples"]:
                     lines.append(f"     - {ex}")
+                closest = format_closest(info.get("closest"))
+                if closest:
+                    lines.append(f"     ~ {closest}")
             lines.append("")
     else:
         lines.append("✅ MIA:")
@@ -1058,6 +1648,158 @@ def send_all(
     return any_fail
 
 
+@dataclass
+class DayReport:
+    """Everything rendered for one report date."""
+
+    rd: ReportDate
+    subject: str
+    body: str
+    seq_summary: Dict[SeqKey, SeqSummary] = field(default_factory=dict)
+    missing_templates: Dict[SeqKey, Dict[str, Any]] = field(default_factory=dict)
+    totals: Totals = field(default_factory=Totals)
+    physicist_by_project: Dict[str, Optional[str]] = field(default_factory=dict)
+    excluded_by_deny: Any = None
+
+
+def no_data_email(date_label: str) -> Tuple[str, str]:
+    subject = "[MRQA] ✅ 0/0 (0); 0 MIA"
+    body = (
+        f"MRQART header compliance summary for {date_label}\n\n"
+        "No acquisitions were found in the DB for this date.\n"
+        "— MRQART\n"
+    )
+    return subject, body
+
+
+def check_day(
+    sql: sqlite3.Connection,
+    rd: ReportDate,
+    acq_rows: List[sqlite3.Row] | Selection,
+    settings: FilterSettings,
+    *,
+    tc: Optional[TemplateChecker] = None,
+    evaluate: Optional[Callable[..., Tuple[Any, Any, Totals]]] = None,
+    store: bool = False,
+) -> DayReport:
+    """
+    Filter, check, and render one day's acquisitions.
+
+    acq_rows are filtered with select_eligible_rows(), or were already
+    filtered by select_eligible().
+
+    tc is reused across days by backfill() (comparators and the
+    template index are built once). evaluate replaces evaluate_rows, e.g.
+    evaluate_rows_parallel with everything but the rows and counts bound.
+    store writes every check to qa_result (not committed).
+    """
+    if isinstance(acq_rows, Selection):
+        selection = acq_rows
+    else:
+        selection = Selection(
+            *select_eligible_rows(acq_rows, settings), total_seen=len(acq_rows)
+        )
+    if not selection.total_seen:
+        subject, body = no_data_email(rd.date_label)
+        return DayReport(rd=rd, subject=subject, body=body)
+
+    eligible_rows = selection.eligible
+    study_counts_today = selection.study_counts_today
+    seq_counts_today = selection.seq_counts_today
+
+    qa_rows: Optional[List[tuple]] = [] if store else None
+    if evaluate is None:
+        if tc is None:
+            tc = TemplateChecker(
+                db=sql,
+                context="DB",
+                float_tolerance_default=settings.get("float_tolerance_default"),
+                float_tolerance_by_col=settings.get("float_tolerance_by_col"),
+            )
+        seq_summary, missing_templates, totals = evaluate_rows(
+            eligible_rows,
+            sql=sql,
+            tc=tc,
+            marquee_cols=settings["marquee_cols"],
+            study_counts_today=study_counts_today,
+            seq_counts_today=seq_counts_today,
+            qa_rows=qa_rows,
+        )
+    else:
+        seq_summary, missing_templates, totals = evaluate(
+            eligible_rows,
+            study_counts_today=study_counts_today,
+            seq_counts_today=seq_counts_today,
+            qa_rows=qa_rows,
+        )
+    totals.total_seen_today = selection.total_seen
+    if qa_rows:
+        qa_result.store_results(sql, qa_rows)
+
+    physicist_by_project = physicists_for_projects(sql, (key[0] for key in seq_summary))
+
+    subject, body = build_email(
+        date_label=rd.date_label,
+        marquee_cols=settings["marquee_cols"],
+        total_seen_today=selection.total_seen,
+        seq_summary=seq_summary,
+        missing_templates=missing_templates,
+        totals=totals,
+        study_subids_today=selection.study_subids_today,
+        physicist_by_project=physicist_by_project,
+    )
+    return DayReport(
+        rd=rd,
+        subject=subject,
+        body=body,
+        seq_summary=seq_summary,
+        missing_templates=missing_templates,
+        totals=totals,
+        physicist_by_project=physicist_by_project,
+        excluded_by_deny=selection.excluded_by_deny,
+    )
+
+
+def backfill(
+    sql: sqlite3.Connection,
+    days: List[ReportDate],
+    settings: FilterSettings,
+    *,
+    evaluate: Optional[Callable[..., Tuple[Any, Any, Totals]]] = None,
+    store: bool = False,
+) -> List[DayReport]:
+    """
+    check_day() for every day in one pass: one select_eligible() for the
+    whole range and one TemplateChecker. Templates are rebuilt (once) by the caller.
+    """
+    if not days:
+        return []
+    by_date = select_eligible(
+        sql,
+        settings,
+        "a.AcqDate BETWEEN ? AND ?",
+        (days[0].yday_str, days[-1].yday_str),
+    )
+    tc = TemplateChecker(
+        db=sql,
+        context="DB",
+        float_tolerance_default=settings.get("float_tolerance_default"),
+        float_tolerance_by_col=settings.get("float_tolerance_by_col"),
+    )
+    return [
+        check_day(
+            sql,
+            rd,
+            by_date.get(rd.yday_str, Selection()),
+            settings,
+            tc=tc,
+            evaluate=evaluate,
+            store=store,
+        )
+        for rd in days
+    ]
+
+
 def main(*, dry_run: bool = False) -> int:
     env = os.environ
 
@@ -1066,9 +1808,30 @@ def main(*, dry_run: bool = False) -> int:
     reporting_path = Path(env.get("MRQART_REPORTING_TOML", str(REPORTING_TOML)))
     email_toml_path = Path(env.get("MRQART_EMAIL_TOML", str(EMAIL_TOML)))
 
+    # date, or a range of them (backfill: print and log, never mail)
+    rd = get_report_date(env)
+    try:
+        days = get_report_range(env)
+    except ValueError as e:
+        print(f"[error] {e}", file=sys.stderr)
+        return 2
+    first, last = (days[0], days[-1]) if days else (rd, rd)
+
     # db connect
     sql = sqlite3.connect(str(db_path))
     sql.row_factory = sqlite3.Row
+    # rows are selected with their Source. before attach so archives get it too
+    DBQuery(sql).ensure_source_column()
+
+    # older years rolled out by 'mrqart archive'. template rebuild needs all of them
+    archive_dir = env.get("MRQART_ARCHIVE_DIR", "").strip()
+    years = None
+    if archive_dir:
+        from .archive import attach_archives, years_for_range
+
+        if os.environ.get("SKIP_REBUILD"):
+            years = years_for_range(first.yday_str, last.yday_str)
+        attach_archives(sql, archive_dir, years=years)
 
     # templates. modifies DB. use SKIP_REBUILD to avoid
     if not os.environ.get("SKIP_REBUILD"):
@@ -1085,7 +1848,7 @@ def main(*, dry_run: bool = False) -> int:
         print("[error] reporting.toml: compare.marquee_cols is empty", file=sys.stderr)
         return 2
 
-    if not dry_run:
+    if not dry_run and days is None:
         try:
             email_entries = load_email_entries(email_toml_path)
         except Exception as e:
@@ -1097,21 +1860,72 @@ def main(*, dry_run: bool = False) -> int:
     else:
         email_entries = []
 
-    # date
-    rd = get_report_date(env)
+    # engine. MRQART_JOBS > 1 shards projects across processes
+    jobs = int(env.get("MRQART_JOBS", "1") or 1)
+    evaluate = None
+    if jobs > 1:
+        evaluate = partial(
+            evaluate_rows_parallel,
+            db_path=db_path,
+            jobs=jobs,
+            marquee_cols=settings["marquee_cols"],
+            float_tolerance_default=settings.get("float_tolerance_default"),
+            float_tolerance_by_col=settings.get("float_tolerance_by_col"),
+            archive_dir=archive_dir or None,
+            archive_years=years,
+        )
+
+    web_log = Path(env.get("MRQART_WEB_LOG", ""))
+    web_html = Path(env.get("MRQART_WEB_HTML", ""))
+    web_title = env.get("MRQART_WEB_TITLE", "MRQART QA — Feed")
+
+    if days is not None:
+        # dry run: leave the DB (qa_result) as it was
+        reports = backfill(sql, days, settings, evaluate=evaluate, store=not dry_run)
+        if not dry_run:
+            sql.commit()
+        for report in reports:
+            print(f"Subject: {report.subject}\n")
+            print(report.body)
+            t = report.totals
+            log_line(
+                f"backfill date={report.rd.date_label} seen={t.total_seen_today} "
+                f"checked={t.total_checked} nonconf={t.total_nonconforming} "
+                f"subject={report.subject!r}"
+            )
+        if web_log and web_log.name:
+            from .web_report import append_entries, render_html
+
+            for report in reports:
+                append_entries(
+                    build_jsonl_entries(
+                        date_label=report.rd.date_label,
+                        seq_summary=report.seq_summary,
+                        missing_templates=report.missing_templates,
+                        marquee_cols=settings["marquee_cols"],
+                        physicist_by_project=report.physicist_by_project,
+                    ),
+                    web_log,
+                )
+            if web_html and web_html.name:
+                render_html(web_log, web_html, title=web_title)
+        sql.close()
+        return 0
 
-    # query
-    acq_rows = fetch_acquisitions(sql, rd.yday_str)
-    total_seen_today = len(acq_rows)
+    # query. only eligible rows are fetched
+    selection = select_eligible(sql, settings, "a.AcqDate = ?", (rd.yday_str,)).get(
+        rd.yday_str, Selection()
+    )
+    total_seen_today = selection.total_seen
+    report = check_day(
+        sql, rd, selection, settings, evaluate=evaluate, store=not dry_run
+    )
+    if not dry_run:
+        sql.commit()
+    subject, body, totals = report.subject, report.body, report.totals
 
     # no data case
-    if not acq_rows:
-        subject = "[MRQA] ✅ 0/0 (0); 0 MIA"
-        body = (
-            f"MRQART header compliance summary for {rd.date_label}\n\n"
-            "No acquisitions were found in the DB for this date.\n"
-            "— MRQART\n"
-        )
+    if not total_seen_today:
         if dry_run:
             print(f"Subject: {subject}\n")
             print(body)
@@ -1122,61 +1936,20 @@ def main(*, dry_run: bool = False) -> int:
         )
         return 0 if not any_fail else 7
 
-    # filter
-    (
-        eligible_rows,
-        study_counts_today,
-        seq_counts_today,
-        study_subids_today,
-        excluded_by_deny,
-    ) = select_eligible_rows(acq_rows, settings)
-
-    # engine
-    tc = TemplateChecker(db=sql, context="DB")
-    seq_summary, missing_templates, totals = evaluate_rows(
-        eligible_rows,
-        sql=sql,
-        tc=tc,
-        marquee_cols=settings["marquee_cols"],
-        study_counts_today=study_counts_today,
-        seq_counts_today=seq_counts_today,
-    )
-    totals.total_seen_today = total_seen_today
-
-    physicist_by_project = {
-        key[0]: get_physicist_for_project(sql, key[0]) for key in seq_summary
-    }
-
-    # render
-    subject, body = build_email(
-        date_label=rd.date_label,
-        marquee_cols=settings["marquee_cols"],
-        total_seen_today=total_seen_today,
-        seq_summary=seq_summary,
-        missing_templates=missing_templates,
-        totals=totals,
-        study_subids_today=study_subids_today,
-        physicist_by_project=physicist_by_project,
-    )
-
     # web dashboard
-    web_log = Path(env.get("MRQART_WEB_LOG", ""))
-    web_html = Path(env.get("MRQART_WEB_HTML", ""))
     if web_log and web_log.name:
         from .web_report import append_entries, render_html
 
         entries = build_jsonl_entries(
             date_label=rd.date_label,
-            seq_summary=seq_summary,
-            missing_templates=missing_templates,
+            seq_summary=report.seq_summary,
+            missing_templates=report.missing_templates,
             marquee_cols=settings["marquee_cols"],
-            physicist_by_project=physicist_by_project,
+            physicist_by_project=report.physicist_by_project,
         )
         append_entries(entries, web_log)
         if web_html and web_html.name:
-            render_html(
-                web_log, web_html, title=env.get("MRQART_WEB_TITLE", "MRQART QA — Feed")
-            )
+            render_html(web_log, web_html, title=web_title)
 
     # HTML email
     html_email_toml = Path(env.get("MRQART_HTML_EMAIL_TOML", ""))
@@ -1191,12 +1964,12 @@ def main(*, dry_run: bool = False) -> int:
             html_entries = load_html_email_entries(html_email_toml)
             html_body = build_html_body(
                 date_label=rd.date_label,
-                seq_summary=seq_summary,
-                missing_templates=missing_templates,
+                seq_summary=report.seq_summary,
+                missing_templates=report.missing_templates,
                 totals=totals,
-                physicist_by_project=physicist_by_project,
+                physicist_by_project=report.physicist_by_project,
                 marquee_cols=settings["marquee_cols"],
-                excluded_by_deny=excluded_by_deny,
+                excluded_by_deny=report.excluded_by_deny,
                 sql=sql,
             )
             smtp_host = (
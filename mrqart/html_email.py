@@ -17,6 +17,7 @@ from email.header import Header
 from pathlib import Path
 from typing import Any, Dict, List, Mapping, Optional, Tuple
 
+from . import qa_result
 from .email_latest_flip import SeqKey, SeqSummary, Totals, format_expected_got, log_line
 
 try:
@@ -123,9 +124,12 @@ def build_html_body(
     except Exception:
         xnat_urls = {}
 
-    # failure streak counts from JSONL log
+    # failure streak counts: stored check results, else the JSONL log
     web_log = Path(os.environ.get("MRQART_WEB_LOG", ""))
-    streaks = get_failure_streaks(web_log) if web_log.name else {}
+    if sql is not None and qa_result.has_table(sql):
+        streaks = qa_result.failure_days(sql, {key[0] for key in seq_summary})
+    else:
+        streaks = get_failure_streaks(web_log) if web_log.name else {}
 
     # group nonconforming by project
     by_project: Dict[str, List[SeqKey]] = defaultdict(list)
@@ -163,12 +167,15 @@ def build_html_body(
             # series conformance badges
             series_conformance = []
             if sql is not None and acqdate:
-                from .acq2sqlite import DBQuery
-
-                db_q = DBQuery(sql)
-                series_conformance = db_q.get_series_conformance(
-                    project, seqname, subid, acqdate
+                series_conformance = qa_result.series_conformance(
+                    sql, project, seqname, subid, acqdate
                 )
+                if not series_conformance:
+                    from .acq2sqlite import DBQuery
+
+                    series_conformance = DBQuery(sql).get_series_conformance(
+                        project, seqname, subid, acqdate
+                    )
 
             badges = ""
             if series_conformance:
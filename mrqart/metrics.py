@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Minimal Prometheus-style metrics for the realtime server (``/metrics`` in ``mrqart.py``).
+
+No client library: counters and histograms are a few floats each,
+an observation is a ``bisect`` into the bucket bounds,
+and gauges can be callables evaluated only when scraped.
+Output is the Prometheus text exposition format.
+
+>>> reg = Registry()
+>>> c = reg.counter("demo_total", "things seen")
+>>> c.inc()
+>>> print(reg.render())
+# HELP demo_total things seen
+# TYPE demo_total counter
+demo_total 1.0
+<BLANKLINE>
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+#: seconds. realtime steps are ms (header read) to a few hundred ms (template check)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+class Counter:
+    "monotonically increasing value"
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self.value = 0.0
+
+    def inc(self, n: float = 1):
+        self.value += n
+
+    def lines(self) -> list[str]:
+        return [f"{self.name} {self.value}"]
+
+
+class Gauge:
+    "current value. set directly or computed by ``fn`` at scrape time"
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], float]] = None):
+        self.name, self.help = name, help
+        self.fn = fn
+        self.value = 0.0
+
+    def set(self, v: float):
+        self.value = v
+
+    def lines(self) -> list[str]:
+        v = self.fn() if self.fn else self.value
+        return [f"{self.name} {float(v)}"]
+
+
+class Histogram:
+    """
+    Cumulative bucket counts, sum and count.
+
+    >>> h = Histogram("t_seconds", "", buckets=(0.1, 1))
+    >>> for x in (0.05, 0.5, 5):
+    ...     h.observe(x)
+    >>> h.lines()[:3]
+    ['t_seconds_bucket{le="0.1"} 1', 't_seconds_bucket{le="1"} 2', 't_seconds_bucket{le="+Inf"} 3']
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        self.name, self.help = name, help
+        self.bounds = list(buckets)
+        #: per bucket (not cumulative) counts. last is +Inf
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, x: float):
+        self.counts[bisect_left(self.bounds, x)] += 1
+        self.sum += x
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        "observe the seconds spent in a ``with`` block"
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def timed(self, fn: Callable) -> Callable:
+        "wrap ``fn`` so every call is observed"
+
+        def wrapper(*args, **kwargs):
+            with self.time():
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    def lines(self) -> list[str]:
+        out = []
+        running = 0
+        for bound, n in zip(self.bounds + ["+Inf"], self.counts):
+            running += n
+            out.append(f'{self.name}_bucket{{le="{bound}"}} {running}')
+        out.append(f"{self.name}_sum {self.sum}")
+        out.append(f"{self.name}_count {self.count}")
+        return out
+
+
+class Registry:
+    "named metrics rendered together"
+
+    def __init__(self):
+        self.metrics: dict[str, object] = {}
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            return self.metrics[metric.name]
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._add(Counter(name, help))
+
+    def gauge(self, name: str, help: str, fn=None) -> Gauge:
+        return self._add(Gauge(name, help, fn))
+
+    def histogram(self, name: str, help: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, buckets))
+
+    def render(self) -> str:
+        "Prometheus text exposition format (version 0.0.4)"
+        out = []
+        for m in self.metrics.values():
+            out.append(f"# HELP {m.name} {m.help}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+            out.extend(m.lines())
+        return "\n".join(out) + "\n"
+
+
+#: metrics for ``mrqart.py``. see its ``/metrics`` route
+REGISTRY = Registry()
@@ -5,19 +5,35 @@ Serve javascript over HTTP for receiving websocket messages in a browser.
 """
 
 import asyncio
-import glob
+import atexit
 import json
 import logging
 import os
 import re
-from typing import Optional
+import sqlite3
+import time
+from typing import Callable, Optional
 
-import aionotify
 from tornado.httpserver import HTTPServer
-from tornado.web import Application, RequestHandler
+from tornado.web import Application, HTTPError, RequestHandler
 from websockets.asyncio.server import broadcast, serve
 
+from .acq2sqlite import DBQuery
+from .dcmmeta2tsv import TagValues
+from .metrics import REGISTRY
+from .poll_watcher import IN_CLOSE_WRITE, IN_CREATE, IN_IGNORED, PollingWatcher
+from .series_progress import SeriesProgress, expected_files
+from .shim_drift import ShimDrift
 from .template_checker import CheckResult, TemplateChecker
+from .ws_protocol import DeltaEncoder
+
+try:
+    import aionotify
+
+    _HAS_AIONOTIFY = True
+except (ImportError, OSError):
+    # OSError: aionotify loads libc.so.6 at import (missing on macOS)
+    _HAS_AIONOTIFY = False
 
 Station = str
 Sequence = str
@@ -37,6 +53,10 @@ class CurSeqStation:
         self.count = 0
         #: set using dcm_checker.check_header
         self.hdr_check: Optional[CheckResult] = None
+        #: files, rate, and ETA of the current series. not saved by :py:class:`StateSnapshot`
+        self.progress: Optional[SeriesProgress] = None
+        #: stalled state last sent by :py:func:`watch_stalls`
+        self.stall_sent = False
 
     def update_isnew(self, series, seqname: Sequence) -> bool:
         """
@@ -55,16 +75,54 @@ class CurSeqStation:
     def __repr__(self) -> str:
         return f"{self.station} {self.series_seqname} {self.count}"
 
+    def to_dict(self) -> dict:
+        "JSON-able copy for :py:class:`StateSnapshot`"
+        return {
+            "station": self.station,
+            "series_seqname": self.series_seqname,
+            "count": self.count,
+            "hdr_check": self.hdr_check,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "CurSeqStation":
+        "inverse of :py:meth:`to_dict`"
+        cur = cls(d["station"])
+        cur.series_seqname = d.get("series_seqname", "")
+        cur.count = d.get("count", 0)
+        cur.hdr_check = d.get("hdr_check")
+        return cur
+
 
 #: Websocket port used to send updates to browser
 WS_PORT = 5000
 #: HTTP port used to serve static/index.html
 HTTP_PORT = 8080
 
-FOLLOW_FLAGS = aionotify.Flags.CLOSE_WRITE | aionotify.Flags.CREATE
+#: same as ``aionotify.Flags.CLOSE_WRITE | aionotify.Flags.CREATE``
+FOLLOW_FLAGS = IN_CLOSE_WRITE | IN_CREATE
+#: default recursion below each ``--watch`` path. 2 is ``root/session/subdir``
+WATCH_DEPTH = 2
+#: default minutes without a new file before a session directory's watch is dropped
+IDLE_MINUTES = 120
+#: default cap on "update" messages per station per second
+UPDATES_PER_SECOND = 4.0
+#: seconds between :py:func:`watch_stalls` checks
+STALL_CHECK = 5.0
+#: seconds between :py:class:`WriteBehind` transactions
+WRITE_INTERVAL = 10.0
+#: seconds without a new file before :py:class:`WriteBehind` writes an acquisition
+WRITE_SETTLE = 30.0
+#: default database for templates, ``--write-behind``, and XNAT session reports.
+#: same as :py:class:`acq2sqlite.DBQuery`'s
+DB_PATH = "db.sqlite"
 #: list of all web socket connections to broadcast to
 #: TODO: will eventually need to track station id when serving multiple scanners
 WS_CONNECTIONS = set()
+#: version 2 (delta) message encoding shared by websocket and ``/state``
+ENCODER = DeltaEncoder()
+#: permessage-deflate. repeated header keys and values compress well
+WS_COMPRESSION = "deflate"
 
 FILEDIR = os.path.dirname(__file__)
 logging.basicConfig(level=os.environ.get("LOGLEVEL", logging.INFO))
@@ -74,6 +132,594 @@ logging.basicConfig(level=os.environ.get("LOGLEVEL", logging.INFO))
 #: we can skip parsing a dicoms (and spamming the browser) if we've already seen the session
 STATE: dict[Station, CurSeqStation] = {}
 
+# served by /metrics (GetMetrics). gauges are computed when scraped
+M_EVENTS = REGISTRY.counter("mrqart_inotify_events_total", "inotify events received")
+M_DICOMS = REGISTRY.counter("mrqart_dicom_files_total", "dicom files processed")
+M_PARSE = REGISTRY.histogram(
+    "mrqart_header_parse_seconds", "time reading dicom header (read_dicom_tags)"
+)
+M_LOOKUP = REGISTRY.histogram(
+    "mrqart_template_lookup_seconds", "time finding template (DBQuery.get_template)"
+)
+M_CHECK = REGISTRY.histogram(
+    "mrqart_check_seconds", "time checking a new series (check_header, incl. lookup)"
+)
+M_SENT = REGISTRY.counter("mrqart_ws_messages_total", "websocket messages broadcast")
+M_FANOUT = REGISTRY.histogram(
+    "mrqart_broadcast_fanout",
+    "websocket connections per broadcast",
+    buckets=(0, 1, 2, 5, 10, 25, 50),
+)
+M_BROADCAST = REGISTRY.histogram(
+    "mrqart_broadcast_seconds", "time to serialize and queue one broadcast"
+)
+M_WRITTEN = REGISTRY.counter(
+    "mrqart_db_acquisitions_written_total", "acquisitions recorded by WriteBehind"
+)
+M_XNAT_EVENTS = REGISTRY.counter("mrqart_xnat_events_total", "POST /xnat/event")
+M_XNAT_DUPLICATES = REGISTRY.counter(
+    "mrqart_xnat_duplicate_events_total",
+    "XNAT events for a session already queued or recently processed",
+)
+M_STATE_REQUESTS = REGISTRY.counter("mrqart_state_requests_total", "GET /state")
+M_STATE_304 = REGISTRY.counter(
+    "mrqart_state_not_modified_total", "GET /state answered 304 (If-None-Match)"
+)
+M_STATE_BUILDS = REGISTRY.counter(
+    "mrqart_state_serializations_total", "/state bodies serialized (cache misses)"
+)
+REGISTRY.gauge(
+    "mrqart_websockets_active",
+    "open websocket connections",
+    lambda: len(WS_CONNECTIONS),
+)
+REGISTRY.gauge(
+    "mrqart_ws_send_buffer_bytes",
+    "bytes queued to websocket clients but not yet sent",
+    lambda: sum(ws.transport.get_write_buffer_size() for ws in WS_CONNECTIONS),
+)
+
+
+def make_watcher(backend: Optional[str] = None, poll_interval: float = 1.0):
+    """
+    :param backend: ``"inotify"`` or ``"poll"``. Default inotify when aionotify imports
+    :param poll_interval: seconds between polls for ``"poll"``
+    :return: ``aionotify.Watcher`` or :py:class:`poll_watcher.PollingWatcher`
+    """
+    if backend is None:
+        backend = "inotify" if _HAS_AIONOTIFY else "poll"
+    if backend == "inotify":
+        if not _HAS_AIONOTIFY:
+            raise ValueError("inotify watcher needs aionotify (linux). use 'poll'")
+        return aionotify.Watcher()
+    if backend == "poll":
+        return PollingWatcher(interval=poll_interval)
+    raise ValueError(f"unknown watcher backend '{backend}'")
+
+
+class WatchManager:
+    """
+    Own the inotify watches: recursive to ``max_depth`` below each root,
+    dropped again after ``idle_seconds`` without events.
+
+    Quacks like the ``aionotify.Watcher`` that :py:func:`monitor_dirs` uses
+    (``setup``, ``get_event``, ``watch``, ``close``).
+    Without expiry every session directory ever seen keeps a watch descriptor
+    until ``fs.inotify.max_user_watches`` is reached.
+
+    Roots never expire. An expired directory that gets a new subdirectory
+    is watched again from its parent's ``CREATE`` event.
+    """
+
+    def __init__(
+        self,
+        watcher=None,
+        max_depth: int = WATCH_DEPTH,
+        idle_seconds: Optional[float] = IDLE_MINUTES * 60,
+        flags=FOLLOW_FLAGS,
+    ):
+        """
+        :param watcher: ``aionotify.Watcher`` or :py:class:`poll_watcher.PollingWatcher`
+            (see :py:func:`make_watcher` when None)
+        :param max_depth: directories deeper than this below a root are not watched
+        :param idle_seconds: expire non-root watches idle this long. None or 0 to never expire
+        :param flags: inotify flags for every watch
+        """
+        self.watcher = watcher if watcher is not None else make_watcher()
+        self.max_depth = max_depth
+        self.idle_seconds = idle_seconds
+        self.flags = flags
+        #: watched path -> depth below its root (0 for roots)
+        self.depth: dict[str, int] = {}
+        #: watched path -> time.monotonic() of the last event in it or below it
+        self.last_seen: dict[str, float] = {}
+        self.expired_total = 0
+
+    def add_root(self, path: os.PathLike):
+        "watch ``path`` and its existing subdirectories down to :py:attr:`max_depth`"
+        self._watch_tree(os.path.normpath(path), 0)
+
+    def _watch_tree(self, path: str, depth: int):
+        if not self._watch_one(path, depth):
+            return
+        if depth >= self.max_depth:
+            return
+        try:
+            subdirs = [e.path for e in os.scandir(path) if e.is_dir()]
+        except OSError as err:
+            logging.warning("cannot list %s: %s", path, err)
+            return
+        for sub in subdirs:
+            self._watch_tree(sub, depth + 1)
+
+    def _watch_one(self, path: str, depth: int) -> bool:
+        if depth > self.max_depth:
+            return False
+        if path in self.depth:
+            return True
+        try:
+            self.watcher.watch(path=path, flags=self.flags)
+        except (IOError, OSError) as err:
+            # likely max_user_watches. don't leave a request behind
+            self.watcher.requests.pop(path, None)
+            logging.error(
+                "cannot watch %s (%d watches): %s", path, len(self.depth), err
+            )
+            return False
+        self.depth[path] = depth
+        self.last_seen[path] = time.monotonic()
+        logging.debug("watching %s at depth %d", path, depth)
+        return True
+
+    def watch(self, path: os.PathLike, flags=None):
+        """
+        Watch a newly created directory (and anything already inside it).
+        Depth is one more than its parent's. ``flags`` is ignored; see :py:attr:`flags`.
+        """
+        path = os.path.normpath(path)
+        parent_depth = self.depth.get(os.path.dirname(path))
+        depth = 0 if parent_depth is None else parent_depth + 1
+        self._watch_tree(path, depth)
+
+    def forget(self, path: str):
+        "drop a watch (and bookkeeping). Safe if the kernel already removed it"
+        try:
+            self.watcher.unwatch(path)
+        except (ValueError, IOError, OSError):
+            # directory deleted: kernel dropped the watch already
+            for d in ("requests", "descriptors"):
+                getattr(self.watcher, d, {}).pop(path, None)
+            aliases = getattr(self.watcher, "aliases", {})
+            for wd in [wd for wd, a in aliases.items() if a == path]:
+                del aliases[wd]
+        self.depth.pop(path, None)
+        self.last_seen.pop(path, None)
+
+    def touch(self, path: str, now: Optional[float] = None):
+        "mark ``path`` and its watched ancestors as active"
+        now = time.monotonic() if now is None else now
+        while path in self.depth:
+            self.last_seen[path] = now
+            if self.depth[path] == 0:
+                break
+            path = os.path.dirname(path)
+
+    def expire(self, now: Optional[float] = None) -> list[str]:
+        """
+        Drop non-root watches idle for longer than :py:attr:`idle_seconds`.
+
+        :return: paths no longer watched
+        """
+        if not self.idle_seconds:
+            return []
+        now = time.monotonic() if now is None else now
+        stale = [
+            p
+            for p, t in self.last_seen.items()
+            if self.depth[p] > 0 and now - t > self.idle_seconds
+        ]
+        for path in stale:
+            self.forget(path)
+        if stale:
+            self.expired_total += len(stale)
+            logging.info("expired %d idle watches: %s", len(stale), self.counts())
+        return stale
+
+    async def expire_forever(self, interval: float = 60):
+        "run :py:meth:`expire` every ``interval`` seconds"
+        while True:
+            await asyncio.sleep(interval)
+            self.expire()
+
+    def counts(self) -> dict:
+        """
+        :return: ``{"watches": n, "by_depth": {depth: n}, "expired": total}``
+        """
+        by_depth: dict[int, int] = {}
+        for d in self.depth.values():
+            by_depth[d] = by_depth.get(d, 0) + 1
+        return {
+            "watches": len(self.depth),
+            "by_depth": by_depth,
+            "expired": self.expired_total,
+        }
+
+    async def setup(self):
+        await self.watcher.setup()
+
+    async def get_event(self):
+        """
+        Next event from the watcher. Marks the directory active and
+        cleans up after watches the kernel removed (``IGNORED``, e.g. deleted directory).
+        """
+        while True:
+            event = await self.watcher.get_event()
+            if event is None:
+                return event
+            if event.flags & IN_IGNORED:
+                self.forget(event.alias)
+                continue
+            self.touch(event.alias)
+            return event
+
+    def close(self):
+        self.watcher.close()
+
+
+class StateCache:
+    """
+    Version counter and serialized ``/state`` bodies.
+
+    :py:attr:`version` goes up whenever a station's ``/state`` entry can change:
+    its check result (``new``) or its websocket ``seq`` (any message sent).
+    Bodies are serialized once per version and query, so a room of consoles
+    reconnecting at once costs one ``json.dumps``.
+    ETags include a per-process id: a restarted server starts over at version 0.
+
+    >>> cache = StateCache()
+    >>> cache.bump("AWP1")
+    >>> cache.changed_since(0), cache.changed_since(1)
+    (['AWP1'], [])
+    """
+
+    def __init__(self):
+        self.version = 0
+        #: station -> :py:attr:`version` it last changed at
+        self.changed: dict[Station, int] = {}
+        #: query key -> (etag, body) at current version
+        self.bodies: dict[str, tuple[str, str]] = {}
+        self.boot = f"{os.getpid():x}{int(time.time()):x}"
+
+    def bump(self, station: Station):
+        "``station``'s state changed"
+        self.version += 1
+        self.changed[station] = self.version
+        self.bodies.clear()
+
+    def changed_since(self, since: int) -> list[Station]:
+        "stations changed after version ``since``"
+        return [k for k, v in self.changed.items() if v > since]
+
+    def etag(self, key: str) -> str:
+        return f'"{self.boot}-{self.version}-{key}"'
+
+    def get(self, key: str, build: Callable[[], dict]) -> tuple[str, str]:
+        """
+        :param key: identifies the query (format, ``since``)
+        :param build: makes the JSON-able body when not cached
+        :return: (etag, serialized body)
+        """
+        if key not in self.bodies:
+            M_STATE_BUILDS.inc()
+            self.bodies[key] = (self.etag(key), json.dumps(build(), default=str))
+        return self.bodies[key]
+
+
+#: ``/state`` cache. bumped by :py:func:`ws_send` and :py:meth:`StateSnapshot.load`
+STATE_CACHE = StateCache()
+
+
+def ws_send(msg: dict):
+    """
+    send one message to every browser in :py:data:`WS_CONNECTIONS`.
+    ``msg`` is encoded by :py:data:`ENCODER` (see :py:mod:`ws_protocol`)
+    """
+    with M_BROADCAST.time():
+        data = json.dumps(ENCODER.encode(msg), default=list, separators=(",", ":"))
+        broadcast(WS_CONNECTIONS, data)
+    STATE_CACHE.bump(msg["station"])
+    M_SENT.inc()
+    M_FANOUT.observe(len(WS_CONNECTIONS))
+
+
+class UpdateCoalescer:
+    """
+    Rate limit ``"update"`` messages per station.
+
+    An EPI run writes a file per volume and each one used to be a websocket frame.
+    Here an update within ``1/max_per_second`` of the last one sent for the station
+    replaces any pending update and goes out when the interval is up.
+    The browser always ends on the latest count.
+
+    Anything else (``"new"``) is sent immediately,
+    after flushing the station's pending update so messages stay in order.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[dict], None] = ws_send,
+        max_per_second: float = UPDATES_PER_SECOND,
+    ):
+        """
+        :param send: called with each message to go out (default :py:func:`ws_send`)
+        :param max_per_second: update messages per station per second. 0 disables coalescing
+        """
+        self.send = send
+        self.interval = 1 / max_per_second if max_per_second else 0
+        self.pending: dict[Station, dict] = {}
+        self.last_sent: dict[Station, float] = {}
+        self.timers: dict[Station, asyncio.TimerHandle] = {}
+        #: updates replaced before being sent
+        self.dropped = 0
+
+    def submit(self, msg: dict):
+        "queue or send ``msg`` (a dict with ``station`` and ``type``)"
+        station = msg["station"]
+        if msg["type"] != "update" or not self.interval:
+            self.flush(station)
+            self.send(msg)
+            return
+
+        if station in self.pending:
+            self.dropped += 1
+            self.pending[station] = msg
+            return
+
+        wait = self.last_sent.get(station, float("-inf")) + self.interval
+        wait -= time.monotonic()
+        if wait <= 0:
+            self._send_update(station, msg)
+            return
+
+        self.pending[station] = msg
+        loop = asyncio.get_running_loop()
+        self.timers[station] = loop.call_later(wait, self.flush, station)
+
+    def _send_update(self, station: Station, msg: dict):
+        self.last_sent[station] = time.monotonic()
+        self.send(msg)
+
+    def flush(self, station: Station):
+        "send the pending update for ``station`` now, if there is one"
+        timer = self.timers.pop(station, None)
+        if timer:
+            timer.cancel()
+        msg = self.pending.pop(station, None)
+        if msg:
+            self._send_update(station, msg)
+
+
+def _json_default(obj):
+    "pydicom MultiValue and the like as lists, anything else as a string"
+    try:
+        return list(obj)
+    except TypeError:
+        return str(obj)
+
+
+class StateSnapshot:
+    """
+    Keep :py:data:`STATE` on disk so a restart (tornado autoreload,
+    ``sim_mrqart.bash`` SIGUSR1, a crash) doesn't blank the browser until the next series.
+
+    :py:meth:`mark_dirty` is called on every change. The write happens
+    ``debounce`` seconds later, so a run of slice updates is one write.
+    The file is replaced atomically (write to ``.tmp`` then rename).
+    """
+
+    #: bumped if the file layout changes. other versions are ignored on load
+    VERSION = 1
+
+    def __init__(
+        self,
+        path: os.PathLike,
+        state: dict[Station, CurSeqStation] = STATE,
+        debounce: float = 1.0,
+    ):
+        """
+        :param path: snapshot json file
+        :param state: dict to save and restore into (default :py:data:`STATE`)
+        :param debounce: seconds to wait after a change before writing
+        """
+        self.path = path
+        self.state = state
+        self.debounce = debounce
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self.writes = 0
+
+    def load(self) -> int:
+        """
+        Restore :py:attr:`state` from :py:attr:`path`.
+
+        :return: number of stations restored (0 if missing or unreadable)
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as err:
+            logging.warning("ignoring unreadable state snapshot %s: %s", self.path, err)
+            return 0
+        if data.get("version") != self.VERSION:
+            logging.warning("ignoring state snapshot version %s", data.get("version"))
+            return 0
+        for station, cur in data.get("stations", {}).items():
+            self.state[station] = CurSeqStation.from_dict(cur)
+            STATE_CACHE.bump(station)
+        logging.info("restored %d stations from %s", len(self.state), self.path)
+        return len(data.get("stations", {}))
+
+    def mark_dirty(self):
+        "schedule a :py:meth:`write` unless one is already pending"
+        if self._handle is None:
+            loop = asyncio.get_running_loop()
+            self._handle = loop.call_later(self.debounce, self.write)
+
+    def write(self):
+        "write now (and cancel any pending write)"
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        data = {
+            "version": self.VERSION,
+            "stations": {k: v.to_dict() for k, v in self.state.items()},
+        }
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(data, f, separators=(",", ":"), default=_json_default)
+            os.replace(tmp, self.path)
+        except OSError as err:
+            logging.error("cannot write state snapshot %s: %s", self.path, err)
+            return
+        self.writes += 1
+
+
+class WriteBehind:
+    """
+    Record the headers the realtime server reads into ``acq``/``acq_param``
+    (:py:class:`acq2sqlite.DBQuery` with ``Source = 'realtime'``).
+    ``mrrc_dbupdate.py`` then skips acquisitions already recorded
+    (:py:meth:`acq2sqlite.DBQuery.captured_live`) instead of re-reading them from NFS.
+
+    :py:meth:`observe` is called for every file and only updates a dict.
+    Multi-echo TEs are combined like :py:meth:`dcmmeta2tsv.DicomTagReader.read_many_dicom_tags`.
+    The earliest AcqTime is kept: files can arrive out of order and the nightly
+    crawl (and :py:meth:`acq2sqlite.DBQuery.check_acq`) see the series' first file's.
+    An acquisition is written once no file for it arrived in ``settle`` seconds.
+    Every ``interval`` seconds all settled acquisitions go in one transaction.
+    A locked database (nightly update, another ``--workers`` process) is retried next time.
+    Any other error writing an acquisition drops (and logs) just that acquisition.
+    """
+
+    #: written series remembered so their late files aren't a new acquisition
+    MAX_SERIES = 5000
+
+    def __init__(
+        self,
+        db: DBQuery,
+        interval: float = WRITE_INTERVAL,
+        settle: float = WRITE_SETTLE,
+    ):
+        """
+        :param db: ``DBQuery(sql, source=DBQuery.SOURCE_REALTIME)``
+        :param interval: seconds between write transactions
+        :param settle: seconds without a new file before an acquisition is final
+        """
+        self.db = db
+        self.interval = interval
+        self.settle = settle
+        #: (Station, SubID, AcqDate, SeriesNumber) -> merged header.
+        #: AcqTime changes per file, so it isn't part of the key
+        self.pending: dict[tuple, TagValues] = {}
+        #: same keys -> time.monotonic() of the latest file
+        self.last_seen: dict[tuple, float] = {}
+        #: same keys, already written. oldest first
+        self.series: dict[tuple, None] = {}
+        self.written = 0
+        self.transactions = 0
+
+    def observe(self, hdr: TagValues):
+        "another file's header. O(1)"
+        key = (
+            hdr.get("Station"),
+            hdr.get("SubID"),
+            hdr.get("AcqDate"),
+            hdr.get("SeriesNumber"),
+        )
+        if key in self.series:
+            return  # late file of a series already written
+        merged = self.pending.get(key)
+        if merged is None:
+            self.pending[key] = dict(hdr)
+        else:
+            if str(hdr.get("TE", "")) not in str(merged.get("TE", "")).split(","):
+                merged["TE"] = f"{merged['TE']},{hdr['TE']}"
+            # HHMMSS.ffffff: string order is time order
+            if str(hdr.get("AcqTime")) < str(merged.get("AcqTime")):
+                merged["AcqTime"] = hdr["AcqTime"]
+        self.last_seen[key] = time.monotonic()
+
+    def flush(self, force: bool = False) -> int:
+        """
+        Write settled acquisitions (all of them if ``force``) in one transaction.
+        Each is in its own savepoint: a bad header is rolled back and dropped,
+        the others are still committed.
+
+        :return: acquisitions written
+        """
+        now = time.monotonic()
+        ready = [
+            k for k, t in self.last_seen.items() if force or now - t >= self.settle
+        ]
+        if not ready:
+            return 0
+        dropped = 0
+        try:
+            with self.db.sql:
+                for key in ready:
+                    self.db.sql.execute("savepoint write_behind")
+                    try:
+                        # dict_to_db_row skips acquisitions already in the db
+                        self.db.dict_to_db_row(dict(self.pending[key]))
+                    except sqlite3.OperationalError:
+                        raise  # locked: the whole batch waits for next time
+                    except Exception:
+                        logging.exception("write-behind dropped acquisition %s", key)
+                        self.db.sql.execute("rollback to write_behind")
+                        dropped += 1
+                    self.db.sql.execute("release write_behind")
+        except sqlite3.OperationalError as err:
+            logging.warning(
+                "write-behind of %d acquisitions deferred: %s", len(ready), err
+            )
+            return 0
+        for key in ready:
+            del self.pending[key]
+            del self.last_seen[key]
+            # dropped too: its late files aren't retried
+            self.series[key] = None
+        if len(self.series) > 2 * self.MAX_SERIES:
+            # newest last (insertion order)
+            self.series = dict(list(self.series.items())[-self.MAX_SERIES :])
+        written = len(ready) - dropped
+        self.written += written
+        self.transactions += 1
+        M_WRITTEN.inc(written)
+        return written
+
+    async def run_forever(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                # keep writing later acquisitions
+                logging.exception("write-behind flush failed")
+
+
+#: set by :py:func:`main`. :py:class:`GetWatches` reports its counts.
+#: with ``--workers`` it's the :py:class:`supervisor.Supervisor` (workers' counts summed)
+WATCH_MANAGER = None
+#: set by :py:func:`main` with ``xnat_roots``. :py:class:`XnatEvent` queues sessions on it
+XNAT_EVENTS = None
+REGISTRY.gauge(
+    "mrqart_watches",
+    "inotify watches held",
+    lambda: WATCH_MANAGER.counts()["watches"] if WATCH_MANAGER else 0,
+)
+
 
 class WebServer(Application):
     """HTTP server (tornado request handler)
@@ -88,6 +734,9 @@ class WebServer(Application):
             (r"/", HttpIndex),
             # TODO(20250204): add GetState
             (r"/state", GetState),
+            (r"/watches", GetWatches),
+            (r"/metrics", GetMetrics),
+            (r"/xnat/event", XnatEvent),
         ]
         settings = dict(
             static_path=os.path.join(FILEDIR, "static"),
@@ -101,25 +750,120 @@ class GetState(RequestHandler):
 
     async def get(self):
         """
-        GET ``/state`` returns JSON similar to data sent over websocket
-        via ``broadcast(WS_CONNECTIONS, json.dumps(...))``
+        GET ``/state`` returns the full state of every station
+        with each template once (:py:meth:`ws_protocol.DeltaEncoder.state`)::
 
-        data here missing 'msg' but otherwise matches. it looks like::
+            {"v": 2,
+             "templates": {"3f2a...": {"iPAT": "p2", ...}},
+             "stations": {"AWP167046": {
+                 "station": "AWP167046", "seq": 12,
+                 "content": {"conforms": true, "errors": {},
+                             "template_id": "3f2a...",
+                             "input": {"iPAT":"p2", .... }},
+                 "progress": {"expected": 320, "received": 41, ...}}}}
 
-            {'station': 'AWP167046',
-             'content': {"conforms": true, "errors": {},
-                         "template": {"iPAT": "p2", ...},
-                         "input": {"iPAT":"p2", .... }}}
+        ``seq`` is the last websocket message the state includes.
+        ``progress`` is :py:meth:`series_progress.SeriesProgress.to_dict`.
+        ``/state?v=1`` is the old format: station -> ``{'station', 'content'}``
+        with ``content`` the full :py:data:`template_checker.CheckResult`.
 
+        ``/state?since=N&boot=B`` has only stations changed after version ``N``
+        (all of them if ``B`` isn't this server's :py:attr:`StateCache.boot`).
+        Version 2 bodies include ``version`` and ``boot`` for the next request.
+        Bodies come from :py:data:`STATE_CACHE` and have an ETag;
+        a matching ``If-None-Match`` gets a 304.
         """
-        #: 'station', 'content', and (not here) 'msg' (update|new)
-        #:  are sent when inotify sees a new file.
-        #: mimic that for code reuse on javascript side
-        state_like_ws = {
-            k: {"station": v.station, "content": v.hdr_check} for k, v in STATE.items()
-        }
-        logging.debug("/state data sent: %s", state_like_ws)
-        self.write(json.dumps(state_like_ws, default=str))
+        M_STATE_REQUESTS.inc()
+        fmt = self.get_argument("v", "2")
+        try:
+            since = int(self.get_argument("since", "0"))
+        except ValueError:
+            raise HTTPError(400, "since must be an integer version")
+        if since > STATE_CACHE.version or self.get_argument("boot", "") not in (
+            "",
+            STATE_CACHE.boot,
+        ):
+            since = 0
+
+        def build() -> dict:
+            changed = set(STATE_CACHE.changed_since(since)) if since else STATE
+            checks = {k: v.hdr_check for k, v in STATE.items() if k in changed}
+            progress = {
+                k: STATE[k].progress.to_dict() if STATE[k].progress else None
+                for k in checks
+            }
+            if fmt == "1":
+                #: 'station', 'content', and (not here) 'msg' (update|new)
+                #:  are sent when inotify sees a new file.
+                return {
+                    k: {"station": k, "content": v, "progress": progress[k]}
+                    for k, v in checks.items()
+                }
+            data = ENCODER.state(checks)
+            for k, entry in data["stations"].items():
+                entry["progress"] = progress[k]
+            data.update(version=STATE_CACHE.version, boot=STATE_CACHE.boot)
+            return data
+
+        etag, body = STATE_CACHE.get(f"v{fmt}s{since}", build)
+        self.set_header("Etag", etag)
+        # browsers revalidate with If-None-Match instead of using a stale copy
+        self.set_header("Cache-Control", "no-cache")
+        self.set_header("Content-Type", "application/json")
+        if self.check_etag_header():
+            M_STATE_304.inc()
+            self.set_status(304)
+            return
+        logging.debug("/state data sent: %s", body)
+        self.write(body)
+
+
+class GetWatches(RequestHandler):
+    """
+    inotify watch counts as JSON (:py:meth:`WatchManager.counts`).
+    With ``--workers``, :py:meth:`supervisor.Supervisor.counts`
+    """
+
+    async def get(self):
+        counts = WATCH_MANAGER.counts() if WATCH_MANAGER else {}
+        self.write(json.dumps(counts))
+
+
+class GetMetrics(RequestHandler):
+    """Prometheus text format metrics (:py:data:`metrics.REGISTRY`)"""
+
+    async def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.write(REGISTRY.render())
+
+
+class XnatEvent(RequestHandler):
+    """XNAT event service webhook (:py:mod:`xnat_events`)"""
+
+    async def post(self):
+        """
+        POST ``/xnat/event`` with a session archived event queues that session
+        for :py:func:`session_ingest.process_session`. Responds 202 with
+        ``{"session": path, "queued": bool}`` (``queued`` is false for a repeat event).
+        404 when ``--xnat-root`` isn't set or the session directory isn't found.
+        """
+        if XNAT_EVENTS is None:
+            raise HTTPError(404, "XNAT events not enabled (--xnat-root)")
+        try:
+            payload = json.loads(self.request.body)
+        except ValueError:
+            raise HTTPError(400, "body must be JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        M_XNAT_EVENTS.inc()
+        ses, queued = XNAT_EVENTS.receive(payload)
+        if ses is None:
+            raise HTTPError(404, "no MR session directory for this event")
+        if not queued:
+            M_XNAT_DUPLICATES.inc()
+        self.set_status(202)
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps({"session": ses, "queued": queued}))
 
 
 class HttpIndex(RequestHandler):
@@ -151,6 +895,8 @@ async def track_ws(websocket):
     """
     WS_CONNECTIONS.add(websocket)
     try:
+        # templates already broadcast won't be sent again
+        await websocket.send(json.dumps(ENCODER.hello(), default=list))
         await websocket.wait_closed()
     finally:
         WS_CONNECTIONS.remove(websocket)
@@ -173,11 +919,26 @@ def session_from_fname(dcm_fname: os.PathLike) -> Sequence:
     return sequence
 
 
-async def monitor_dirs(watcher, dcm_checker):
+async def monitor_dirs(
+    watcher,
+    dcm_checker,
+    shim_drift: Optional[ShimDrift] = None,
+    coalescer: Optional[UpdateCoalescer] = None,
+    snapshot: Optional[StateSnapshot] = None,
+    write_behind: Optional[WriteBehind] = None,
+):
     """
     Perpetually wait for new dicom files.
     Broadcast new files to the browser over websockets.
+
+    :param shim_drift: when given, new series get ``shim_outliers``
+        (:py:meth:`shim_drift.ShimDrift.check`, read only) added to their check result
+    :param coalescer: rate limits ``update`` messages. Default :py:class:`UpdateCoalescer`
+    :param snapshot: when given, told about every :py:data:`STATE` change
+    :param write_behind: when given, every header is queued for the database
     """
+    if coalescer is None:
+        coalescer = UpdateCoalescer()
 
     await watcher.setup()
     logging.debug("watching for new files")
@@ -186,6 +947,7 @@ async def monitor_dirs(watcher, dcm_checker):
         # event = await asyncio.wait_for(watcher.get_event(), timeout=?)
 
         event = await watcher.get_event()
+        M_EVENTS.inc()
 
         logging.debug("got event %s", event)
         file = os.path.join(event.alias, event.name)
@@ -194,7 +956,7 @@ async def monitor_dirs(watcher, dcm_checker):
             watcher.watch(path=file, flags=FOLLOW_FLAGS)
             logging.info("%s is a dir! following with %d", file, FOLLOW_FLAGS)
             continue
-        if event.flags == aionotify.Flags.CREATE:
+        if event.flags == IN_CREATE:
             logging.debug("file created but waiting for WRITE finish")
             continue
 
@@ -204,7 +966,11 @@ async def monitor_dirs(watcher, dcm_checker):
             # NB. we might be able to look at the file project_seqnum_seriesnum.dcm
             # and skip without having to read the header
             # not sure how we'd get station
-            hdr = dcm_checker.reader.read_dicom_tags(file)
+            with M_PARSE.time():
+                hdr = dcm_checker.reader.read_dicom_tags(file)
+            M_DICOMS.inc()
+            if write_behind:
+                write_behind.observe(hdr)
 
             logging.debug("DICOM HEADER: %s", hdr)
 
@@ -222,25 +988,44 @@ async def monitor_dirs(watcher, dcm_checker):
 
                 # keep this in memory in case browser asks for it again (HTTP vs WS)
                 # see '/state' route and GetState
-                hdr_check = dcm_checker.check_header(hdr)
+                with M_CHECK.time():
+                    hdr_check = dcm_checker.check_header(hdr)
+                if shim_drift:
+                    hdr_check["shim_outliers"] = shim_drift.check(
+                        station, hdr["SequenceName"], hdr.get("Shims")
+                    )
                 STATE[station].hdr_check = hdr_check
+                # replaces the previous series' progress (and any stall it had)
+                current_ses.progress = SeriesProgress(expected_files(file))
+                current_ses.stall_sent = False
 
                 msg = {
                     "station": station,
                     "type": "new",
                     "content": hdr_check,
+                    "file": file,
+                    "progress": current_ses.progress.to_dict(),
                 }
                 # logging here but not update
                 logging.debug(msg)
             else:
+                if current_ses.progress is None:
+                    # restored from a snapshot mid series
+                    current_ses.progress = SeriesProgress()
+                else:
+                    current_ses.progress.observe()
                 msg = {
                     "station": hdr["Station"],
                     "type": "update",
                     "content": current_ses.count,
+                    "file": file,
+                    "progress": current_ses.progress.to_dict(),
                 }
                 logging.debug("already have %s", current_ses)
-            # send data to browser via websocket
-            broadcast(WS_CONNECTIONS, json.dumps(msg, default=list))
+            # send data to browser via websocket. updates may be merged
+            coalescer.submit(msg)
+            if snapshot:
+                snapshot.mark_dirty()
 
             # TODO: if epi maybe try plotting motion?
             # async alignment
@@ -251,36 +1036,228 @@ async def monitor_dirs(watcher, dcm_checker):
             # broadcast(WS_CONNECTIONS, f"non-dicom file: {event}")
 
 
-async def main(paths):
+async def watch_stalls(
+    coalescer: UpdateCoalescer,
+    interval: float = STALL_CHECK,
+    state: dict[Station, CurSeqStation] = STATE,
+):
     """
-    Run all services on different threads.
-    HTTP and inotify are forked. Websocket holds the main thread.
+    Send an ``update`` when a station's series starts or stops being stalled
+    (:py:meth:`series_progress.SeriesProgress.stalled`).
+    Stalls have no file event to trigger a message.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        for cur in state.values():
+            if cur.progress is None:
+                continue
+            progress = cur.progress.to_dict()
+            if progress["stalled"] == cur.stall_sent:
+                continue
+            cur.stall_sent = progress["stalled"]
+            if cur.stall_sent:
+                logging.warning("%s stalled: %s", cur, progress)
+            coalescer.submit(
+                {
+                    "station": cur.station,
+                    "type": "update",
+                    "content": cur.count,
+                    "progress": progress,
+                }
+            )
+
+
+def build_pipeline(
+    paths,
+    watch_depth: int = WATCH_DEPTH,
+    idle_minutes=IDLE_MINUTES,
+    watcher_backend: Optional[str] = None,
+    poll_interval: float = 1.0,
+    db_path: os.PathLike = DB_PATH,
+) -> tuple[WatchManager, TemplateChecker, ShimDrift]:
+    """
+    Watches and checkers for :py:func:`monitor_dirs`.
+    Used by :py:func:`main` and each :py:func:`supervisor.run_worker`.
+
+    :param paths: directories to watch
+    :param db_path: ``db.sqlite`` with templates
+    :return: watcher (roots added), header checker, shim drift
     """
     dcm_checker = TemplateChecker(
-        context="RT"
+        db=sqlite3.connect(db_path), context="RT"
     )  # TODO: this can be defined globally for the package?
-    watcher = aionotify.Watcher()
+    # NB. prev had just aionotify.Flags.CREATE but that triggers too early (partial file)
+    watcher = WatchManager(
+        make_watcher(watcher_backend, poll_interval),
+        max_depth=watch_depth,
+        idle_seconds=idle_minutes * 60,
+    )
     for path in paths:
         logging.info("watching %s", path)
-        watcher.watch(
-            path=path,
-            flags=FOLLOW_FLAGS,
-            # NB. prev had just aionotify.Flags.CREATE but that triggers too early (partial file)
-        )  # aionotify.Flags.MODIFY|aionotify.Flags.CREATE |aionotify.Flags.DELETE)
-        for sub_path in glob.glob(path + "/*/"):
-            logging.info("trying to add %s", sub_path)
-            if os.path.isdir(sub_path):
-                watcher.watch(path=sub_path, flags=FOLLOW_FLAGS)
-    asyncio.create_task(monitor_dirs(watcher, dcm_checker))
+        watcher.add_root(path)
+    logging.info("initial watches: %s", watcher.counts())
+    shim_drift = ShimDrift(dcm_checker.db.sql)
+    dcm_checker.db.get_template = M_LOOKUP.timed(dcm_checker.db.get_template)
+    return watcher, dcm_checker, shim_drift
+
+
+def start_write_behind(dcm_checker: TemplateChecker) -> WriteBehind:
+    """
+    :py:class:`WriteBehind` on ``dcm_checker``'s database connection,
+    writing every :py:data:`WRITE_INTERVAL` and (whatever is left) at exit
+    """
+    writer = WriteBehind(DBQuery(dcm_checker.db.sql, source=DBQuery.SOURCE_REALTIME))
+    asyncio.create_task(writer.run_forever())
+    atexit.register(writer.flush, force=True)
+    return writer
+
+
+def apply_worker_message(
+    msg: dict, series_seqname: str, snapshot: Optional["StateSnapshot"] = None
+):
+    """
+    Front end (``--workers``) side of :py:func:`monitor_dirs`:
+    mirror a worker's :py:data:`STATE` change and broadcast its message.
+
+    :param msg: ``new`` or ``update`` message from a worker
+    :param series_seqname: worker's :py:attr:`CurSeqStation.series_seqname`
+    """
+    station = msg["station"]
+    cur = STATE.get(station)
+    if cur is None:
+        cur = STATE[station] = CurSeqStation(station)
+    cur.series_seqname = series_seqname
+    if msg["type"] == "new":
+        cur.count = 0
+        cur.hdr_check = msg["content"]
+    else:
+        cur.count = msg["content"]
+    if msg.get("progress"):
+        cur.progress = SeriesProgress.from_dict(msg["progress"])
+    ws_send(msg)
+    if snapshot:
+        snapshot.mark_dirty()
+
+
+async def main(
+    paths,
+    watch_depth: int = WATCH_DEPTH,
+    idle_minutes=IDLE_MINUTES,
+    updates_per_second=UPDATES_PER_SECOND,
+    state_file: Optional[os.PathLike] = None,
+    watcher_backend: Optional[str] = None,
+    poll_interval: float = 1.0,
+    workers: bool = False,
+    write_behind: bool = False,
+    xnat_roots: Optional[list[str]] = None,
+    db_path: os.PathLike = DB_PATH,
+    reporting: Optional[os.PathLike] = None,
+):
+    """
+    Run all services on different threads.
+    HTTP and inotify are forked. Websocket holds the main thread.
+
+    :param paths: directories to watch
+    :param watch_depth: see :py:class:`WatchManager`
+    :param idle_minutes: see :py:class:`WatchManager`. 0 to keep watches forever
+    :param updates_per_second: see :py:class:`UpdateCoalescer`
+    :param state_file: restore :py:data:`STATE` from and save it to this file
+        (see :py:class:`StateSnapshot`). None to keep it only in memory
+    :param watcher_backend: ``inotify`` or ``poll`` (see :py:func:`make_watcher`)
+    :param poll_interval: seconds between polls with the ``poll`` backend
+    :param workers: watch and check each path in its own process
+        (see :py:mod:`supervisor`). This process only serves HTTP and websockets
+    :param write_behind: record headers in the database (:py:class:`WriteBehind`)
+    :param xnat_roots: ``scan_data`` directories to find sessions from
+        XNAT events in (:py:class:`XnatEvent`). None to not accept events
+    :param db_path: database for templates, ``write_behind``, and XNAT session reports
+    :param reporting: ``reporting.toml`` for XNAT session reports.
+        None is ``email_latest_flip.REPORTING_TOML``
+    """
+    global WATCH_MANAGER, XNAT_EVENTS
+    snapshot = None
+    if state_file:
+        snapshot = StateSnapshot(state_file)
+        snapshot.load()
+        # debounced write may still be pending on a clean exit
+        atexit.register(snapshot.write)
+
+    options = dict(
+        watch_depth=watch_depth,
+        idle_minutes=idle_minutes,
+        watcher_backend=watcher_backend,
+        poll_interval=poll_interval,
+        db_path=db_path,
+    )
+    watcher = supervisor = None
+    if workers:
+        from .supervisor import Supervisor
+
+        supervisor = Supervisor(
+            paths,
+            dict(
+                options,
+                updates_per_second=updates_per_second,
+                write_behind=write_behind,
+            ),
+        )
+        supervisor.start()
+        atexit.register(supervisor.close)
+        WATCH_MANAGER = supervisor
+        REGISTRY.gauge(
+            "mrqart_workers_alive", "running worker processes", supervisor.alive
+        )
+        REGISTRY.gauge(
+            "mrqart_worker_restarts",
+            "workers restarted after exiting",
+            lambda: supervisor.restarts,
+        )
+        asyncio.create_task(
+            supervisor.receive_forever(
+                lambda msg, seqname: apply_worker_message(msg, seqname, snapshot)
+            )
+        )
+        asyncio.create_task(supervisor.check_forever())
+    else:
+        watcher, dcm_checker, shim_drift = build_pipeline(paths, **options)
+        WATCH_MANAGER = watcher
+        coalescer = UpdateCoalescer(max_per_second=updates_per_second)
+        REGISTRY.gauge(
+            "mrqart_pending_updates",
+            "coalesced update messages waiting to be sent",
+            lambda: len(coalescer.pending),
+        )
+        writer = start_write_behind(dcm_checker) if write_behind else None
+        asyncio.create_task(
+            monitor_dirs(watcher, dcm_checker, shim_drift, coalescer, snapshot, writer)
+        )
+        asyncio.create_task(watcher.expire_forever())
+        asyncio.create_task(watch_stalls(coalescer))
+
+    if xnat_roots:
+        from . import email_latest_flip as elf
+        from .session_ingest import make_processor
+        from .xnat_events import XnatEventQueue
+
+        # DRYRUN=1 prints session emails instead of mailing (send_via_local_mail)
+        email_toml = elf.EMAIL_TOML if elf.EMAIL_TOML.exists() else None
+        if email_toml is None:
+            logging.warning("no %s: XNAT session reports are printed", elf.EMAIL_TOML)
+        process = make_processor(db_path, reporting or elf.REPORTING_TOML, email_toml)
+        XNAT_EVENTS = XnatEventQueue(xnat_roots, process)
+        asyncio.create_task(XNAT_EVENTS.run_forever())
 
     http_run()
 
     # while True:
     #    await asyncio.sleep(.1)
-    async with serve(track_ws, "0.0.0.0", WS_PORT):
+    async with serve(track_ws, "0.0.0.0", WS_PORT, compression=WS_COMPRESSION):
         await asyncio.get_running_loop().create_future()  # run forever
 
-    watcher.close()
+    if watcher:
+        watcher.close()
+    if supervisor:
+        supervisor.close()
     logging.info("DONE")
 
 
@@ -300,10 +1277,87 @@ if __name__ == "__main__":
         default=HTTP_PORT,
         help="HTTP port (not websocket port) ",
     )
+    parser.add_argument(
+        "--watch-depth",
+        type=int,
+        default=WATCH_DEPTH,
+        help=f"Directory levels below each --watch path to follow (default: {WATCH_DEPTH})",
+    )
+    parser.add_argument(
+        "--idle-minutes",
+        type=float,
+        default=IDLE_MINUTES,
+        help=f"Stop watching session dirs without new files for this long; 0 never (default: {IDLE_MINUTES})",
+    )
+    parser.add_argument(
+        "--updates-per-second",
+        type=float,
+        default=UPDATES_PER_SECOND,
+        help=f"Max 'update' messages per station per second; 0 sends all (default: {UPDATES_PER_SECOND})",
+    )
+    parser.add_argument(
+        "--state-file",
+        default=None,
+        help="Save current series per station here and restore it on restart",
+    )
+    parser.add_argument(
+        "--watcher",
+        choices=["inotify", "poll"],
+        default=None,
+        help="File event backend. 'poll' for podman, macOS and network mounts (default: inotify if available)",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between directory polls with --watcher poll (default: 1)",
+    )
+    parser.add_argument(
+        "--write-behind",
+        action="store_true",
+        help="Record headers in db.sqlite (Source=realtime) so the nightly update can skip them",
+    )
+    parser.add_argument(
+        "--workers",
+        action="store_true",
+        help="Watch and check each --watch path in its own process",
+    )
+    parser.add_argument(
+        "--db",
+        default=DB_PATH,
+        help=f"Database with templates; --write-behind and XNAT reports use it too (default: {DB_PATH})",
+    )
+    parser.add_argument(
+        "--reporting",
+        default=None,
+        help="reporting.toml for XNAT session reports (default: config/reporting.toml)",
+    )
+    parser.add_argument(
+        "--xnat-root",
+        action="append",
+        default=None,
+        help="Accept XNAT session archived events on POST /xnat/event;"
+        " find their sessions in this scan_data directory. Repeatable",
+    )
     args = parser.parse_args()
     HTTP_PORT = args.port
 
     if not os.path.isdir(args.watch[0]):
         raise Exception(f"{args.watch} is not a directory!")
     print(args)
-    asyncio.run(main(args.watch))
+    asyncio.run(
+        main(
+            args.watch,
+            watch_depth=args.watch_depth,
+            idle_minutes=args.idle_minutes,
+            updates_per_second=args.updates_per_second,
+            state_file=args.state_file,
+            watcher_backend=args.watcher,
+            poll_interval=args.poll_interval,
+            workers=args.workers,
+            write_behind=args.write_behind,
+            xnat_roots=args.xnat_root,
+            db_path=args.db,
+            reporting=args.reporting,
+        )
+    )
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Polling stand-in for ``aionotify.Watcher`` where inotify doesn't work:
+podman, docker on macOS (FUSE), and NFS/SMB mounts like the scanner's samba push.
+
+Same interface (``watch``, ``unwatch``, ``setup``, ``get_event``, ``close``)
+and the same :py:data:`Event` tuples, so :py:func:`mrqart.monitor_dirs` and
+:py:class:`mrqart.WatchManager` don't know the difference.
+
+Each poll ``stat``\\ s every watched directory but only ``scandir``\\ s the ones
+whose mtime changed. A file is reported (``IN_CLOSE_WRITE``) once its size and mtime
+have been the same for ``stable_polls`` polls in a row;
+until then only that file is re-``stat``\\ ed.
+Cost per poll is the number of watched directories plus changed entries,
+not the number of files.
+"""
+
+import asyncio
+import collections
+import logging
+import os
+from typing import Optional
+
+#: inotify values (``<sys/inotify.h>``) so flags compare the same as ``aionotify.Flags``
+IN_CLOSE_WRITE = 0x00000008
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+#: same fields as ``aionotify.Event``
+Event = collections.namedtuple("Event", ["flags", "cookie", "name", "alias"])
+
+#: (size, mtime_ns)
+FileSig = tuple[int, int]
+
+
+class PollingWatcher:
+    "``os.scandir`` poller with the ``aionotify.Watcher`` interface"
+
+    def __init__(self, interval: float = 1.0, stable_polls: int = 1):
+        """
+        :param interval: seconds between polls
+        :param stable_polls: polls a file's size and mtime must stay unchanged
+            before it is reported as written
+        """
+        self.interval = interval
+        self.stable_polls = stable_polls
+        #: alias -> (path, flags), like aionotify
+        self.requests: dict[str, tuple[str, int]] = {}
+        #: alias -> st_mtime_ns of the directory at the last scan. None when gone
+        self.descriptors: dict[str, Optional[int]] = {}
+        #: alias -> {file name: signature already reported (or baseline)}
+        self.files: dict[str, dict[str, FileSig]] = {}
+        #: alias -> subdirectory names already seen
+        self.dirs: dict[str, set[str]] = {}
+        #: (alias, name) -> (signature, polls unchanged)
+        self.pending: dict[tuple[str, str], tuple[FileSig, int]] = {}
+        self.events: collections.deque = collections.deque()
+        self._started = False
+        self._closed = False
+
+    def watch(self, path, flags, *, alias=None):
+        """
+        Start watching ``path``. Before :py:meth:`setup`, what's already there is the
+        baseline (like inotify). Afterwards existing files are reported,
+        which closes the gap between a directory appearing and being watched.
+        """
+        if alias is None:
+            alias = path
+        if alias in self.requests:
+            raise ValueError(f"A watch request is already scheduled for alias {alias}")
+        self.requests[alias] = (path, flags)
+        if self._started:
+            self._scan(alias, baseline=False)
+
+    def unwatch(self, alias):
+        if alias not in self.requests:
+            raise ValueError(f"Unknown watch alias {alias}")
+        del self.requests[alias]
+        self.descriptors.pop(alias, None)
+        self.files.pop(alias, None)
+        self.dirs.pop(alias, None)
+        for key in [k for k in self.pending if k[0] == alias]:
+            del self.pending[key]
+
+    async def setup(self, loop=None):
+        for alias in self.requests:
+            self._scan(alias, baseline=True)
+        self._started = True
+
+    def close(self):
+        self._closed = True
+
+    @property
+    def closed(self):
+        return self._closed
+
+    async def get_event(self) -> Optional[Event]:
+        "next event, polling every :py:attr:`interval` until there is one"
+        while not self.events:
+            if self._closed:
+                return None
+            await asyncio.sleep(self.interval)
+            self.poll()
+        return self.events.popleft()
+
+    def poll(self):
+        "one pass: not-yet-stable files, then changed directories"
+        # before scanning so a file first seen now waits at least one interval
+        self._check_pending()
+        for alias in list(self.requests):
+            path = self.requests[alias][0]
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                if self.descriptors.get(alias) is not None:
+                    # directory is gone. inotify says IGNORED
+                    self.descriptors[alias] = None
+                    self.events.append(Event(IN_IGNORED, 0, "", alias))
+                continue
+            if mtime != self.descriptors.get(alias):
+                self._scan(alias, baseline=False)
+
+    def _scan(self, alias: str, baseline: bool):
+        path, flags = self.requests[alias]
+        try:
+            self.descriptors[alias] = os.stat(path).st_mtime_ns
+            entries = list(os.scandir(path))
+        except OSError as err:
+            logging.warning("cannot scan %s: %s", path, err)
+            self.descriptors[alias] = None
+            return
+        files = self.files.setdefault(alias, {})
+        dirs = self.dirs.setdefault(alias, set())
+        current_dirs = set()
+        current_files = set()
+        for e in entries:
+            try:
+                if e.is_dir():
+                    current_dirs.add(e.name)
+                    if e.name not in dirs and not baseline and flags & IN_CREATE:
+                        self.events.append(
+                            Event(IN_CREATE | IN_ISDIR, 0, e.name, alias)
+                        )
+                    continue
+                st = e.stat()
+            except OSError:
+                continue  # removed while scanning
+            current_files.add(e.name)
+            sig = (st.st_size, st.st_mtime_ns)
+            if baseline:
+                files[e.name] = sig
+            elif files.get(e.name) != sig and (alias, e.name) not in self.pending:
+                if e.name not in files and flags & IN_CREATE:
+                    self.events.append(Event(IN_CREATE, 0, e.name, alias))
+                self.pending[(alias, e.name)] = (sig, 0)
+        self.dirs[alias] = current_dirs
+        for gone in set(files) - current_files:
+            del files[gone]
+
+    def _check_pending(self):
+        for (alias, name), (sig, polls) in list(self.pending.items()):
+            if alias not in self.requests:
+                del self.pending[(alias, name)]
+                continue
+            try:
+                st = os.stat(os.path.join(self.requests[alias][0], name))
+            except OSError:
+                del self.pending[(alias, name)]
+                continue
+            now = (st.st_size, st.st_mtime_ns)
+            if now != sig:
+                self.pending[(alias, name)] = (now, 0)
+                continue
+            polls += 1
+            if polls < self.stable_polls:
+                self.pending[(alias, name)] = (sig, polls)
+                continue
+            del self.pending[(alias, name)]
+            self.files[alias][name] = sig
+            if self.requests[alias][1] & IN_CLOSE_WRITE:
+                self.events.append(Event(IN_CLOSE_WRITE, 0, name, alias))
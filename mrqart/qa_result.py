@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Stored template check results: one ``qa_result`` row per checked acquisition.
+
+The daily report (:py:func:`email_latest_flip.check_day`) and
+``mrqart session-watch`` (:py:func:`session_ingest.session_report`) write
+what :py:class:`template_checker.TemplateChecker` found when they run it:
+
+* ``conforms``: 1 or 0. ``null`` when there was no template
+* ``errors``: JSON ``{col: {"expect": ..., "have": ...}}`` (``CheckResult["errors"]``)
+* ``template_param_id``: ``acq_param`` row of the template it was checked against
+* ``template_version``: :py:func:`template_version` of that template's values
+
+Reports read these instead of checking again:
+:py:func:`html_email.build_html_body` (series badges, failure day counts)
+and :py:func:`seq_report.render_seq_report` (mismatch summary).
+A new check of the same acquisition replaces its row.
+"""
+
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any, Iterable, Mapping, Optional
+
+from .acq2sqlite import DBQuery
+
+SCHEMA = """
+create table if not exists qa_result (
+  acq_id integer primary key, -- acq.rowid
+  Project text,
+  SubID text,
+  SequenceName text,
+  AcqDate text,
+  SeriesNumber text,
+  conforms integer, -- null: no template
+  errors text, -- json {col: {expect, have}}
+  template_param_id integer,
+  template_version text,
+  checked_at text
+);
+create index if not exists qa_result_session on qa_result (SubID, AcqDate);
+create index if not exists qa_result_seq on qa_result (Project, SequenceName);
+"""
+
+#: one ``qa_result`` row, in column order
+QaRow = tuple
+
+COLUMNS = (
+    "acq_id",
+    "Project",
+    "SubID",
+    "SequenceName",
+    "AcqDate",
+    "SeriesNumber",
+    "conforms",
+    "errors",
+    "template_param_id",
+    "template_version",
+    "checked_at",
+)
+
+
+def ensure_table(sql: sqlite3.Connection) -> None:
+    "create ``qa_result`` if missing"
+    for stmt in SCHEMA.split(";"):
+        if stmt.strip():
+            sql.execute(stmt)
+
+
+def has_table(sql: sqlite3.Connection) -> bool:
+    return (
+        sql.execute(
+            "select 1 from sqlite_master where type='table' and name='qa_result'"
+        ).fetchone()
+        is not None
+    )
+
+
+def template_version(template: Optional[Mapping[str, Any]]) -> Optional[str]:
+    """
+    Short hash of the values a template is compared with.
+    Changes when the template does, even when ``param_id`` doesn't
+    (e.g. a new echo in ``multiecho_tes``).
+
+    >>> v = template_version({"TR": "1300", "TE": "30", "param_id": 1})
+    >>> v == template_version({"TE": "30", "TR": "1300", "param_id": 7}), len(v)
+    (True, 12)
+    >>> template_version({}) is None
+    True
+    """
+    if not template:
+        return None
+    values = {k: str(template.get(k)) for k in DBQuery.CONSTS if k in template}
+    blob = json.dumps(values, sort_keys=True).encode()
+    return hashlib.sha1(blob).hexdigest()[:12]
+
+
+def result_row(
+    row: Mapping[str, Any], res: Mapping[str, Any], checked_at: Optional[str] = None
+) -> Optional[QaRow]:
+    """
+    :param row: ``fetch_acquisitions`` style row. needs ``acq_id``
+    :param res: :py:data:`template_checker.CheckResult` for the row
+    :param checked_at: default now
+    :return: ``qa_result`` values in :py:data:`COLUMNS` order. None without ``acq_id``
+    """
+    keys = row.keys() if hasattr(row, "keys") else ()
+    if "acq_id" not in keys or row["acq_id"] is None:
+        return None
+    template = res.get("template") or {}
+    return (
+        int(row["acq_id"]),
+        row["Project"],
+        row["SubID"],
+        row["SequenceName"],
+        row["AcqDate"],
+        row["SeriesNumber"],
+        int(bool(res.get("conforms"))) if template else None,
+        json.dumps(res.get("errors") or {}, sort_keys=True, default=str),
+        template.get("param_id"),
+        template_version(template),
+        checked_at or datetime.now().isoformat(timespec="seconds"),
+    )
+
+
+def store_results(sql: sqlite3.Connection, rows: Iterable[QaRow]) -> int:
+    """
+    Insert (or replace) :py:func:`result_row` values. Doesn't commit.
+
+    :return: rows written
+    """
+    rows = [r for r in rows if r is not None]
+    if not rows:
+        return 0
+    ensure_table(sql)
+    sql.executemany(
+        f"insert or replace into qa_result ({','.join(COLUMNS)})"
+        f" values ({','.join('?' * len(COLUMNS))})",
+        rows,
+    )
+    return len(rows)
+
+
+def results_for(
+    sql: sqlite3.Connection, acq_ids: Iterable[int]
+) -> dict[int, Optional[dict]]:
+    """
+    :return: acq_id -> stored errors (``{}`` if it conforms, None if there was no template).
+        acquisitions never checked are left out
+    """
+    acq_ids = list(acq_ids)
+    if not acq_ids or not has_table(sql):
+        return {}
+    rows = sql.execute(
+        """
+        select q.acq_id, q.conforms, q.errors
+        from json_each(?) k join qa_result q on q.acq_id = k.value
+        """,
+        (json.dumps(acq_ids),),
+    )
+    return {
+        r[0]: (json.loads(r[2] or "{}") if r[1] is not None else None) for r in rows
+    }
+
+
+def series_conformance(
+    sql: sqlite3.Connection, project: str, seqname: str, subid: str, acqdate: str
+) -> list[tuple[str, bool]]:
+    """
+    Stored counterpart of :py:meth:`acq2sqlite.DBQuery.get_series_conformance`:
+    (series number, conforms) for the session's checked acquisitions of the sequence.
+    """
+    if not has_table(sql):
+        return []
+    rows = sql.execute(
+        """
+        select SeriesNumber, conforms from qa_result
+        where SubID = ? and AcqDate = ? and Project = ? and SequenceName = ?
+          and conforms is not null
+          and CAST(SeriesNumber AS INTEGER) < 100
+        order by CAST(SeriesNumber AS INTEGER)
+        """,
+        (subid, acqdate, project, seqname),
+    ).fetchall()
+    return [(str(r[0]), bool(r[1])) for r in rows if r[0]]
+
+
+def failure_days(
+    sql: sqlite3.Connection, projects: Optional[Iterable[str]] = None
+) -> dict[tuple[str, str, str], int]:
+    """
+    Days each (project, sequence, column) had a mismatch.
+    Same counts :py:func:`html_email.get_failure_streaks` reads from the web JSONL log.
+
+    :param projects: only these projects (default all)
+    """
+    if not has_table(sql):
+        return {}
+    where, args = "", []
+    if projects is not None:
+        where = "and q.Project in (select value from json_each(?))"
+        args.append(json.dumps(sorted(set(projects))))
+    rows = sql.execute(
+        f"""
+        select q.Project, q.SequenceName, e.key, count(distinct q.AcqDate)
+        from qa_result q, json_each(q.errors) e
+        where q.conforms = 0 {where}
+        group by 1, 2, 3
+        """,
+        args,
+    )
+    return {(r[0], r[1], r[2]): r[3] for r in rows}
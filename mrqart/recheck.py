@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Recheck stored verdicts (``qa_result``) after ``template_by_count`` changes.
+
+Re-running :py:class:`template_checker.TemplateChecker` on every acquisition
+repeats the same work many times. A verdict depends only on the acquisition's
+``acq_param`` row and its template, and there are far fewer of those pairs
+than acquisitions. So :py:func:`recheck`:
+
+1. finds the (Project, SequenceName) groups whose stored verdicts are stale
+   (:py:func:`stale_groups`): the template, or its :py:func:`qa_result.template_version`,
+   changed, or there are acquisitions that were never checked
+2. joins the groups' ``acq_param`` rows to their templates and flags every
+   :py:data:`acq2sqlite.DBQuery.CONSTS` column in one query. ``qa_match``,
+   registered on the connection, is the checker's own per-column comparator
+   (:py:func:`template_checker.compile_comparators`), tolerances included.
+   ``acq_param`` rows used by sidecar acquisitions (``Source = 'sidecar'``)
+   are flagged a second time, allowing :py:data:`bids_sidecar.SIDECAR_NULL`
+3. writes every acquisition of those groups with one ``insert ... select``
+   through a keyed temp table of the verdicts
+
+The results are the same as a ``TemplateChecker(context="DB")`` check.
+::
+
+    mrqart recheck --db db.sqlite
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from typing import Iterable, Mapping, NamedTuple, Optional
+
+from . import qa_result
+from .acq2sqlite import DBQuery
+from .bids_sidecar import SIDECAR_NULL
+from .template_checker import ComparatorPlan, compile_comparators
+
+Group = tuple[str, str]
+
+
+class RecheckStats(NamedTuple):
+    groups: int
+    params: int
+    acquisitions: int
+    seconds: float
+
+
+def register_functions(sql: sqlite3.Connection, plan: ComparatorPlan) -> None:
+    """
+    ``qa_match(col, template, header)``: 1 if they match.
+    Values are made strings the way :py:meth:`acq2sqlite.DBQuery.get_template`
+    (``none_to_null``) and ``dict(row)`` leave them for ``find_errors``.
+    """
+    cmps = plan["cmp"]
+
+    def qa_match(col, template, header):
+        return int(cmps[col](str(template or "null"), str(header)))
+
+    sql.create_function("qa_match", 3, qa_match, deterministic=True)
+
+
+def current_templates(
+    sql: sqlite3.Connection, groups: Optional[Iterable[Group]] = None
+) -> dict[Group, Optional[dict]]:
+    """
+    :param groups: default: every (Project, SequenceName) in ``acq_param``
+    :return: group -> template, as the checker would find it
+    """
+    if groups is None:
+        groups = sql.execute(
+            "select distinct Project, SequenceName from acq_param"
+        ).fetchall()
+    return DBQuery(sql).get_templates([tuple(g) for g in groups])
+
+
+def stale_groups(
+    sql: sqlite3.Connection, templates: Mapping[Group, Optional[dict]]
+) -> list[Group]:
+    """
+    Groups with a stored verdict against a different template (or version),
+    or with acquisitions not in ``qa_result``.
+    """
+    stored: dict[Group, set] = {}
+    checked: dict[Group, int] = {}
+    if qa_result.has_table(sql):
+        for r in sql.execute(
+            """
+            select Project, SequenceName, template_param_id, template_version, count(*)
+            from qa_result group by 1, 2, 3, 4
+            """
+        ):
+            stored.setdefault((r[0], r[1]), set()).add((r[2], r[3]))
+            checked[(r[0], r[1])] = checked.get((r[0], r[1]), 0) + r[4]
+
+    stale = []
+    for r in sql.execute(
+        """
+        select p.Project, p.SequenceName, count(*)
+        from acq a join acq_param p on a.param_id = p.rowid
+        group by 1, 2
+        """
+    ):
+        group = (r[0], r[1])
+        if group not in templates:
+            continue
+        tmpl = templates[group]
+        now = (
+            (tmpl.get("param_id"), qa_result.template_version(tmpl))
+            if tmpl
+            else (None, None)
+        )
+        if stored.get(group, {now}) != {now} or checked.get(group, 0) < r[2]:
+            stale.append(group)
+    return stale
+
+
+def _flag_query() -> str:
+    """
+    one row per (acq_param row, sidecar or not, template)
+    with every column's value and match flag
+    """
+    te = "case when instr(g.multiecho_tes, ',') > 0 then g.multiecho_tes else tp.TE end"
+    cols = []
+    for k in DBQuery.CONSTS:
+        expect = te if k == "TE" else f"tp.{k}"
+        ok = f"qa_match('{k}', {expect}, p.{k})"
+        if k in SIDECAR_NULL:
+            ok = f"({ok} or (s.sidecar and p.{k} = 'null'))"
+        cols.append(f"{expect} as t_{k}, p.{k} as h_{k}, {ok} as ok_{k}")
+    return f"""
+        with grp as materialized (
+          select json_extract(value, '$[0]') as Project,
+                 json_extract(value, '$[1]') as SequenceName,
+                 json_extract(value, '$[2]') as param_id,
+                 json_extract(value, '$[3]') as multiecho_tes
+          from json_each(?)
+        )
+        select p.rowid, s.sidecar, g.param_id, {", ".join(cols)}
+        from grp g
+        join acq_param p on p.Project is g.Project and p.SequenceName is g.SequenceName
+        join (select distinct param_id, Source is 'sidecar' as sidecar from acq) s
+          on s.param_id = p.rowid
+        left join acq_param tp on tp.rowid = g.param_id
+    """
+
+
+def _verdicts(
+    sql: sqlite3.Connection, templates: Mapping[Group, Optional[dict]]
+) -> list[list]:
+    """
+    :param templates: group -> template (:py:func:`current_templates`)
+    :return: [hdr param_id, sidecar, conforms, errors json, template param_id, version]
+        per ``acq_param`` row (and ``Source`` is sidecar or not) of the groups
+    """
+    groups = [
+        (
+            [g[0], g[1], t.get("param_id"), t.get("multiecho_tes")]
+            if t
+            else [*g, None, None]
+        )
+        for g, t in templates.items()
+    ]
+    out = []
+    for row in sql.execute(_flag_query(), (json.dumps(groups),)):
+        hdr_id, sidecar, tpl_id = row[0], row[1], row[2]
+        if tpl_id is None:
+            out.append([hdr_id, sidecar, None, "{}", None, None])
+            continue
+        template, errors = {}, {}
+        for i, k in enumerate(DBQuery.CONSTS):
+            expect, have, ok = row[3 + 3 * i : 6 + 3 * i]
+            template[k] = expect or "null"
+            if not ok:
+                errors[k] = {"expect": template[k], "have": have}
+        out.append(
+            [
+                hdr_id,
+                sidecar,
+                int(not errors),
+                json.dumps(errors, sort_keys=True, default=str),
+                tpl_id,
+                qa_result.template_version(template),
+            ]
+        )
+    return out
+
+
+def recheck(
+    sql: sqlite3.Connection,
+    plan: Optional[ComparatorPlan] = None,
+    groups: Optional[list[Group]] = None,
+) -> RecheckStats:
+    """
+    Recompute ``qa_result`` for stale groups (or the given ``groups``). Doesn't commit.
+
+    :param plan: comparators, e.g. ``compile_comparators`` of ``reporting.toml`` settings
+    :param groups: (Project, SequenceName) to recheck regardless of staleness
+    """
+    start = time.monotonic()
+    qa_result.ensure_table(sql)
+    DBQuery(sql).ensure_source_column()
+    register_functions(sql, plan or compile_comparators())
+    if groups is None:
+        templates = current_templates(sql)
+        groups = stale_groups(sql, templates)
+        templates = {g: templates[g] for g in groups}
+    else:
+        templates = current_templates(sql, groups)
+    if not groups:
+        return RecheckStats(0, 0, 0, time.monotonic() - start)
+
+    verdicts = _verdicts(sql, templates)
+    # keyed temp table: acq is probed by param_id through the primary key.
+    # joined to a json_each CTE, sqlite scans the verdicts once per acquisition
+    sql.execute(
+        """
+        create temp table if not exists qa_recheck (
+          hdr_id integer, sidecar integer, conforms, errors,
+          template_param_id, template_version,
+          primary key (hdr_id, sidecar))
+        """
+    )
+    sql.execute("delete from temp.qa_recheck")
+    sql.executemany("insert into temp.qa_recheck values (?,?,?,?,?,?)", verdicts)
+    cur = sql.execute(
+        f"""
+        insert or replace into qa_result ({",".join(qa_result.COLUMNS)})
+        select a.rowid, p.Project, a.SubID, p.SequenceName, a.AcqDate, a.SeriesNumber,
+               v.conforms, v.errors, v.template_param_id, v.template_version, ?
+        from acq a
+        join temp.qa_recheck v
+          on v.hdr_id = a.param_id and v.sidecar = (a.Source is 'sidecar')
+        join acq_param p on p.rowid = a.param_id
+        """,
+        (datetime.now().isoformat(timespec="seconds"),),
+    )
+    sql.execute("delete from temp.qa_recheck")
+    stats = RecheckStats(
+        len(groups), len(verdicts), cur.rowcount, time.monotonic() - start
+    )
+    logging.info("rechecked %s", stats)
+    return stats
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Replay a directory of dicoms into a directory watched by ``mrqart.py``
+and time how long until each file shows up on the websocket.
+
+Like ``sim_mrqart.bash`` but scripted and with many files::
+
+    python -m mrqart.mrqart --watch sim/ &
+    mrqart replay --src dicoms/ --dest sim/ --stations 3 --rate 20
+
+Each simulated station gets its own session directory under ``dest``
+and its own ``StationName`` (``AWP167046_sim1``, ...) so the server tracks it separately.
+Stations write concurrently, each at ``rate`` files per second.
+
+Latency is from the replayed file being closed to a websocket message naming it
+(``file``, or ``dcm_path`` in ``content.input`` or ``content.input_delta``).
+Updates merged by :py:class:`mrqart.UpdateCoalescer` never get a message,
+so ``received`` can be less than ``sent``.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import time
+from typing import Iterable, Optional
+
+import pydicom
+from websockets.asyncio.client import connect
+
+#: same pattern :py:func:`mrqart.monitor_dirs` uses to decide a file is a dicom
+DICOM_RE = re.compile(r"^MR.|.dcm$|.IMA$")
+
+
+def find_dicoms(src: os.PathLike) -> list[str]:
+    """
+    :param src: directory tree (or single file) to replay
+    :return: dicom-looking files, sorted so series replay in order
+
+    >>> find_dicoms('example_dicoms/phantom20240226')[0]
+    'example_dicoms/phantom20240226/001_000001_000001.dcm'
+    """
+    if os.path.isfile(src):
+        return [str(src)]
+    found = []
+    for root, _, files in os.walk(src):
+        found += [os.path.join(root, f) for f in files if DICOM_RE.search(f)]
+    return sorted(found)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    >>> percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 90)
+    9
+    >>> math.isnan(percentile([], 50))
+    True
+    """
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: Iterable[float], sent: int) -> dict:
+    """
+    :param latencies: seconds, one per file with a websocket message
+    :param sent: files written
+    :return: counts and p50/p90/p99/max in milliseconds
+    """
+    lat = [x * 1000 for x in latencies]
+    out = {"sent": sent, "received": len(lat)}
+    for p in (50, 90, 99):
+        out[f"p{p}_ms"] = round(percentile(lat, p), 2)
+    out["max_ms"] = round(max(lat), 2) if lat else float("nan")
+    return out
+
+
+class Replay:
+    "write files for simulated stations and listen for the websocket messages about them"
+
+    def __init__(
+        self,
+        files: list[str],
+        dest: os.PathLike,
+        stations: int = 1,
+        rate: float = 10.0,
+        ws_url: str = "ws://127.0.0.1:5000",
+    ):
+        """
+        :param files: dicoms to replay (each station writes all of them)
+        :param dest: directory ``mrqart.py --watch`` is watching
+        :param stations: number of concurrent simulated stations
+        :param rate: files per second per station. 0 for as fast as possible
+        :param ws_url: websocket the server broadcasts on
+        """
+        self.files = files
+        self.dest = dest
+        self.stations = stations
+        self.rate = rate
+        self.ws_url = ws_url
+        #: replayed file name -> time.monotonic() when closed
+        self.closed_at: dict[str, float] = {}
+        #: replayed file name -> time.monotonic() of first message naming it
+        self.received_at: dict[str, float] = {}
+
+    def session_dir(self, station: int) -> str:
+        return os.path.join(self.dest, f"replay_{os.getpid()}_sim{station}")
+
+    def write_one(self, src: str, station: int, i: int) -> str:
+        "copy ``src`` as station's ``i``-th file with a per-station StationName"
+        name = f"{station:03d}_{i:06d}_{os.path.basename(src)}"
+        if not DICOM_RE.search(name):
+            name += ".dcm"
+        out = os.path.join(self.session_dir(station), name)
+        try:
+            dcm = pydicom.dcmread(src)
+            dcm.StationName = f"{dcm.get('StationName', 'sim')}_sim{station}"
+            dcm.save_as(out)
+        except (pydicom.errors.InvalidDicomError, OSError) as err:
+            logging.warning("not replaying %s: %s", src, err)
+            return ""
+        self.closed_at[name] = time.monotonic()
+        return name
+
+    async def station(self, station: int):
+        "write all :py:attr:`files` for one station at :py:attr:`rate`"
+        interval = 1 / self.rate if self.rate else 0
+        start = time.monotonic()
+        for i, src in enumerate(self.files):
+            await asyncio.to_thread(self.write_one, src, station, i)
+            delay = start + (i + 1) * interval - time.monotonic()
+            await asyncio.sleep(max(delay, 0))
+
+    def _file_of(self, msg: dict) -> Optional[str]:
+        if msg.get("file"):
+            return os.path.basename(msg["file"])
+        content = msg.get("content")
+        if isinstance(content, dict):
+            hdr = content.get("input") or content.get("input_delta") or {}
+            path = hdr.get("dcm_path")
+            return os.path.basename(path) if path else None
+        return None
+
+    async def listen(self, ws):
+        async for raw in ws:
+            now = time.monotonic()
+            name = self._file_of(json.loads(raw))
+            # can arrive before write_one's thread records the close time
+            if name:
+                self.received_at.setdefault(name, now)
+
+    async def run(self, settle: float = 1.0, grace: float = 2.0) -> dict:
+        """
+        :param settle: seconds between creating session dirs and the first file
+            (the server must add watches for the new directories)
+        :param grace: seconds to keep listening after the last file
+        :return: :py:func:`summarize` output
+        """
+        async with connect(self.ws_url) as ws:
+            listener = asyncio.create_task(self.listen(ws))
+            for s in range(self.stations):
+                os.makedirs(self.session_dir(s), exist_ok=True)
+            await asyncio.sleep(settle)
+
+            await asyncio.gather(*(self.station(s) for s in range(self.stations)))
+            await asyncio.sleep(grace)
+            listener.cancel()
+
+        latencies = [
+            max(self.received_at[k] - self.closed_at[k], 0)
+            for k in self.received_at
+            if k in self.closed_at
+        ]
+        return summarize(latencies, len(self.closed_at))
+
+
+def replay(
+    src: os.PathLike,
+    dest: os.PathLike,
+    stations: int = 1,
+    rate: float = 10.0,
+    ws_url: str = "ws://127.0.0.1:5000",
+    limit: Optional[int] = None,
+) -> dict:
+    """
+    Run a :py:class:`Replay` of ``src`` into ``dest``.
+
+    :param limit: only the first ``limit`` files of ``src``
+    :return: latency summary
+    """
+    files = find_dicoms(src)[:limit]
+    if not files:
+        raise ValueError(f"no dicoms in {src}")
+    return asyncio.run(Replay(files, dest, stations, rate, ws_url).run())
@@ -7,6 +7,8 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+from . import qa_result
+
 
 def _as_float(x: Any) -> float | None:
     try:
@@ -67,7 +69,8 @@ def _fetch_rows(
 ) -> List[sqlite3.Row]:
     return sql.execute(
         """
-        SELECT a.AcqDate, a.AcqTime, a.Station, a.SubID, a.SeriesNumber,
+        SELECT a.rowid AS acq_id,
+               a.AcqDate, a.AcqTime, a.Station, a.SubID, a.SeriesNumber,
                p.Project, p.SequenceName, p.SequenceType,
                p.TR, p.TE, p.FA, p.TA, p.FoV, p.Matrix, p.PixelResol, p.BWP, p.BWPPE,
                p.Phase, p.PED_major, p.Comments
@@ -176,6 +179,44 @@ def _summarize_mismatches(
     return mismatches
 
 
+def _summarize_stored(
+    *,
+    rows: List[sqlite3.Row],
+    stored: Dict[int, Dict[str, Dict[str, Any]]],
+    marquee_cols: List[str],
+) -> List[SeqMismatch]:
+    """
+    _summarize_mismatches from the qa_result errors recorded when the rows
+    were checked (TemplateChecker tolerances and all) instead of comparing again.
+    """
+    mismatches: List[SeqMismatch] = []
+    for col in marquee_cols:
+        idx = [i for i, r in enumerate(rows) if col in stored[r["acq_id"]]]
+        if not idx:
+            continue
+        errs = [stored[rows[i]["acq_id"]][col] for i in idx]
+        exp = _norm(errs[0].get("expect"))
+        if exp == "":
+            continue
+        have_vals = [e.get("have") for e in errs]
+        mismatches.append(
+            SeqMismatch(
+                col=col,
+                expect=exp,
+                n_mismatch=len(idx),
+                n_total=len(rows),
+                values_seen=_sorted_values_seen(
+                    v for v in have_vals if _norm(v) not in ("", exp)
+                ),
+                n_null=sum(1 for v in have_vals if _norm(v) == ""),
+                series_examples=[
+                    _series_str(_col_value(rows[i], "SeriesNumber")) for i in idx[:6]
+                ],
+            )
+        )
+    return mismatches
+
+
 def parse_seq_path(path: str) -> Tuple[str, str, str]:
     """
     Parse a slash-delimited path into (project, subid, seqname).
@@ -276,9 +317,16 @@ def render_seq_report(
                 out.append(f"  {col}: {v}")
         out.append("")
 
-        mism = _summarize_mismatches(
-            rows=rows, template=tmpl, marquee_cols=marquee_cols
-        )
+        # verdicts stored at check time when every row has one
+        stored = qa_result.results_for(sql, [r["acq_id"] for r in rows])
+        if rows and len(stored) == len(rows) and None not in stored.values():
+            mism = _summarize_stored(
+                rows=rows, stored=stored, marquee_cols=marquee_cols
+            )
+        else:
+            mism = _summarize_mismatches(
+                rows=rows, template=tmpl, marquee_cols=marquee_cols
+            )
         if mism:
             out.append("❌ Mismatches vs template (marquee cols):")
             for m in mism:
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Live progress of the series each scanner is sending (``mrqart.py``).
+
+The expected number of files is estimated once per series from the
+ASCCONV (``MrPhoenixProtocol``) block of the first file's CSA series header:
+
+* volumes: ``lRepetitions + 1``, times ``sDiffusion.lDiffDirections`` for diffusion
+* mosaic (EPI): one file per volume per echo (``lContrasts``)
+* 3D (``sKSpace.ucDimension = 0x4``): one file per partition
+  (``sKSpace.lImagesPerSlab`` per slab)
+* other 2D: one file per slice (``sSliceArray.lSize``) per volume per echo
+
+After that each file is O(1): a count, an EWMA of the seconds between files,
+and the projected end from both. A series that hasn't sent a file in
+:py:data:`STALL_FACTOR` times its usual interval (at least :py:data:`STALL_MIN_SECONDS`)
+is ``stalled``. The estimate can be high and series get aborted, so after
+:py:data:`STALL_GIVE_UP_SECONDS` without a file the series is taken as over.
+When the station starts its next series, ``mrqart.py`` replaces the tracker.
+"""
+
+import logging
+import re
+import time
+from typing import Optional
+
+import pydicom
+
+from .dcmmeta2tsv import read_csa
+
+#: weight of the newest inter-arrival time in the rate EWMA
+EWMA_ALPHA = 0.2
+#: missed intervals before a series is stalled
+STALL_FACTOR = 5
+#: never stalled sooner than this (seconds). long TRs, slow network copies
+STALL_MIN_SECONDS = 30.0
+#: no longer stalled, just over, after this long without a file (seconds)
+STALL_GIVE_UP_SECONDS = 15 * 60.0
+
+
+def ascconv_values(ascconv: str, keys: list[str]) -> dict[str, str]:
+    """
+    :param ascconv: ``MrPhoenixProtocol`` text
+    :param keys: ASCCONV names like ``sSliceArray.lSize``
+    :return: name -> raw value for the keys present
+
+    >>> ascconv_values("lRepetitions\\t = \\t319\\nlContrasts\\t = \\t1", ["lRepetitions", "lAverages"])
+    {'lRepetitions': '319'}
+    """
+    found = {}
+    for key in keys:
+        m = re.search(rf"^{re.escape(key)}\s*=\s*(\S+)", ascconv, re.M)
+        if m:
+            found[key] = m.group(1)
+    return found
+
+
+def _int(value: Optional[str], default: int) -> int:
+    try:
+        return int(value, 0)
+    except (TypeError, ValueError):
+        return default
+
+
+def expected_from_ascconv(
+    ascconv: str, mosaic: bool, diffusion: bool = False
+) -> Optional[int]:
+    """
+    :param ascconv: ``MrPhoenixProtocol`` text
+    :param mosaic: ``MOSAIC`` in ImageType (one file per volume)
+    :param diffusion: ``DIFFUSION`` in ImageType
+    :return: estimated files in the series, None if ASCCONV has no slice count
+
+    >>> asc = "lRepetitions\\t = \\t379\\nsSliceArray.lSize\\t = \\t48\\nlContrasts\\t = \\t3"
+    >>> expected_from_ascconv(asc, mosaic=True)
+    1140
+    >>> expected_from_ascconv(asc, mosaic=False)
+    54720
+    >>> expected_from_ascconv("", mosaic=True) is None
+    True
+    """
+    v = ascconv_values(
+        ascconv,
+        [
+            "lRepetitions",
+            "sSliceArray.lSize",
+            "lContrasts",
+            "sKSpace.ucDimension",
+            "sKSpace.lImagesPerSlab",
+            "sDiffusion.lDiffDirections",
+        ],
+    )
+    if "sSliceArray.lSize" not in v:
+        return None
+    volumes = _int(v.get("lRepetitions"), 0) + 1
+    if diffusion:
+        volumes *= max(_int(v.get("sDiffusion.lDiffDirections"), 1), 1)
+    echoes = max(_int(v.get("lContrasts"), 1), 1)
+    slices = _int(v["sSliceArray.lSize"], 1)
+    if mosaic:
+        return volumes * echoes
+    if _int(v.get("sKSpace.ucDimension"), 2) == 4:
+        slices *= _int(v.get("sKSpace.lImagesPerSlab"), 1)
+    return slices * volumes * echoes
+
+
+def expected_files(dcm_path) -> Optional[int]:
+    """
+    Read one file's header for :py:func:`expected_from_ascconv`.
+
+    :return: estimated files in ``dcm_path``'s series. None if unknown
+    """
+    try:
+        dcm = pydicom.dcmread(dcm_path, stop_before_pixels=True)
+    except (pydicom.errors.InvalidDicomError, OSError) as err:
+        logging.warning("no expected file count for %s: %s", dcm_path, err)
+        return None
+    csa_s = read_csa(dcm.get((0x0029, 0x1020)))
+    try:
+        ascconv = csa_s["tags"]["MrPhoenixProtocol"]["items"][0]
+    except (KeyError, IndexError, TypeError):
+        return None
+    image_type = [str(x) for x in dcm.get("ImageType", [])]
+    return expected_from_ascconv(
+        ascconv, mosaic="MOSAIC" in image_type, diffusion="DIFFUSION" in image_type
+    )
+
+
+class SeriesProgress:
+    """
+    Files received, arrival rate, and projected end of one series.
+
+    >>> p = SeriesProgress(expected=10, now=100)
+    >>> for t in (102, 104, 106):
+    ...     p.observe(t)
+    >>> p.received, p.interval, p.remaining()
+    (4, 2.0, 6)
+    >>> p.eta_seconds(106), p.stalled(106), p.stalled(200), p.stalled(2000)
+    (12.0, False, True, False)
+    """
+
+    def __init__(self, expected: Optional[int] = None, now: Optional[float] = None):
+        """
+        :param expected: files the series should have (:py:func:`expected_files`)
+        :param now: time of the first file (default ``time.time()``)
+        """
+        now = time.time() if now is None else now
+        self.expected = expected
+        self.received = 1
+        self.first_at = now
+        self.last_at = now
+        #: EWMA of seconds between files. None until the second file
+        self.interval: Optional[float] = None
+
+    def observe(self, now: Optional[float] = None):
+        "another file arrived"
+        now = time.time() if now is None else now
+        gap = max(now - self.last_at, 0.0)
+        if self.interval is None:
+            self.interval = gap
+        else:
+            self.interval += EWMA_ALPHA * (gap - self.interval)
+        self.received += 1
+        self.last_at = now
+
+    def finish(self):
+        "no more files are coming (next series started): nothing remaining"
+        if self.expected is not None:
+            self.expected = self.received
+
+    def remaining(self) -> Optional[int]:
+        if self.expected is None:
+            return None
+        return max(self.expected - self.received, 0)
+
+    def rate(self) -> Optional[float]:
+        "files per second"
+        if not self.interval:
+            return None
+        return 1 / self.interval
+
+    def eta_seconds(self, now: Optional[float] = None) -> Optional[float]:
+        "seconds until the last expected file, from the last one received"
+        remaining = self.remaining()
+        if remaining is None or self.interval is None:
+            return None
+        now = time.time() if now is None else now
+        return max(self.last_at + remaining * self.interval - now, 0.0)
+
+    def stalled(self, now: Optional[float] = None) -> bool:
+        "files are still expected but none arrived in a while (but not too long)"
+        if not self.remaining():
+            # done, or no expected count to know either way
+            return False
+        now = time.time() if now is None else now
+        wait = max(STALL_FACTOR * (self.interval or 0), STALL_MIN_SECONDS)
+        return wait < now - self.last_at <= max(wait, STALL_GIVE_UP_SECONDS)
+
+    def to_dict(self, now: Optional[float] = None) -> dict:
+        "JSON-able summary for websocket messages and ``/state``"
+        now = time.time() if now is None else now
+        eta = self.eta_seconds(now)
+        rate = self.rate()
+        return {
+            "expected": self.expected,
+            "received": self.received,
+            "rate": None if rate is None else round(rate, 3),
+            "eta_seconds": None if eta is None else round(eta, 1),
+            "projected_end": None if eta is None else round(now + eta, 1),
+            "last_at": self.last_at,
+            "stalled": self.stalled(now),
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "SeriesProgress":
+        "inverse of :py:meth:`to_dict` (front end of ``--workers``)"
+        cur = cls(d.get("expected"), now=d.get("last_at"))
+        cur.received = d.get("received", 1)
+        rate = d.get("rate")
+        cur.interval = 1 / rate if rate else None
+        return cur
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Ingest and check one MRRC session as soon as it lands in ``scan_data``
+(``mrqart session-watch``), instead of waiting for the nightly
+``mrrc_dbupdate.py`` crawl and the next morning's ``daily-email``.
+
+:py:class:`SessionWatcher` polls the project directories
+(``/disk/mace2/scan_data/*``, an NFS mount where inotify doesn't see the copies)
+for new ``yyyy.mm.dd-hh.mm.ss`` session directories. Once nothing in a session
+has changed for ``settle`` seconds, :py:func:`process_session`
+
+* adds its acquisitions to the DB like the nightly crawl (:py:func:`ingest_session`)
+* runs the ``email_latest_flip`` checks on just that session (:py:func:`session_report`)
+* mails ``email_settings.toml`` recipients when something doesn't conform
+
+Sessions already on disk when the watcher starts are left to the nightly crawl.
+That crawl only looks at sessions newer than each project's newest ``AcqDate``,
+so sessions ingested here aren't read again, but neither is a session that
+failed here once a later one of the project is in the DB.
+:py:class:`SessionWatcher` retries failed sessions itself, every
+:py:data:`RETRY_SECONDS` (doubling up to :py:data:`RETRY_MAX_SECONDS`) until it goes through.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import subprocess
+import time
+from glob import glob
+from pathlib import Path
+from typing import Callable, Optional
+
+from . import email_latest_flip as elf
+from . import qa_result
+from .acq2sqlite import DBQuery
+from .dcmmeta2tsv import DicomTagReader, TagValues
+from .poll_watcher import IN_CREATE, IN_ISDIR, PollingWatcher
+
+PathLike = str
+
+#: session directory names like ``2024.06.27-09.19.11``
+SESSION_RE = re.compile("^2[0-9.-]{18}$")
+#: where the MRRC copies projects
+SCAN_DATA = "/disk/mace2/scan_data"
+#: seconds a session must go unchanged before it is read
+SETTLE_SECONDS = 300.0
+#: seconds between polls of the project directories
+POLL_INTERVAL = 30.0
+#: seconds before a session that failed is processed again. doubles each failure
+RETRY_SECONDS = 600.0
+#: longest wait between retries
+RETRY_MAX_SECONDS = 6 * 3600.0
+
+#: (files, bytes, newest mtime_ns) of a session tree
+TreeSig = tuple[int, int, int]
+
+
+def is_project(pdir: str) -> bool:
+    """
+    Is input a MR project dir?
+    should have subfolder like ``2024.06.27-09.19.11/``
+
+    :param pdir: directory to test
+    :return: True if is a project directory
+
+    #>>> is_project('/disk/mace2/scan_data/WPC-8620/')
+    #True
+    #>>> is_project('/disk/mace2/scan_data/7T/')
+    #False
+    """
+    if not os.path.isdir(pdir):
+        return False
+    for sesdir in os.listdir(pdir):
+        if SESSION_RE.search(sesdir):
+            return True
+    return False
+
+
+def find_first_dicoms(session_root: PathLike) -> list[list[PathLike]]:
+    """
+    Find a representative dicom for each acquisition in ``session_root``.
+
+    :param session_root: path to session root directory. likely like ``.../ProjectName/yyyy.mm.dd-hh.mm.ss``
+    :return: list of lists first dicoms like ``sessroot/subjid/acquisitonname/MR*``
+    """
+    first_dicoms = []
+    if not os.path.isdir(session_root):
+        raise Exception(f"{session_root} is not a directory!")
+    for seqdir in glob(os.path.join(session_root, "*/*/")):
+        if not os.path.isdir(seqdir) or re.search("PhysioLog|PhoenixZIPReport", seqdir):
+            continue
+        # original method. fast. but not always firt-in-time dicom
+        # findcmd = f"find '{seqdir}' -maxdepth 1 -type f \( -iname '*.dcm' -or -iname 'MR.*' -or -iname '*.IMA' \) -print -quit"
+        findcmd = f"find '{seqdir}' -maxdepth 1 -type f \\( -iname '*.dcm' -or -iname 'MR.*' -or -iname '*.IMA' \\) -print0 | sort -zn"  # | sed -z 1q
+        dcms = subprocess.check_output(findcmd, shell=True).decode("utf-8").split("\0")
+
+        if dcms:
+            logging.debug("found first dcm '%s'", dcms[0])
+            first_dicoms.append([d for d in dcms if d])
+        else:
+            logging.warning("no dicoms found in %s", seqdir)
+    return first_dicoms
+
+
+def ingest_session(
+    ses: PathLike, db: DBQuery, dtr: DicomTagReader, dry_run: bool = False
+) -> tuple[list[TagValues], int]:
+    """
+    Add every acquisition in one session directory to the DB.
+    Doesn't commit.
+
+    :param ses: ``Project/yyyy.mm.dd-hh.mm.ss`` directory
+    :param db: DB to add to
+    :param dtr: header reader
+    :param dry_run: log headers instead of inserting
+    :return: (first header of each acquisition, count already recorded by realtime)
+    """
+    acq_dicoms = find_first_dicoms(ses)
+    logging.info("ses '%s' has %d dicoms found", ses, len(acq_dicoms))
+    headers = []
+    skipped = 0
+    for acqs in acq_dicoms:
+        if not acqs or not os.path.isfile(acqs[0]):
+            logging.warning("%s bad acq file '%s'", ses, acqs)
+            continue
+        logging.debug("processing dcms from newer acq '%s'", acqs[0])
+        first = dtr.read_dicom_tags(acqs[0])
+        headers.append(first)
+        # realtime server (mrqart.py --write-behind) already has it
+        if db.captured_live(first):
+            skipped += 1
+            continue
+        all_tags = dtr.read_many_dicom_tags(acqs, first=first)
+        if dry_run:
+            logging.info(all_tags)
+        else:
+            # realtime row missing RT_MAYBE_NULL values (or a sidecar row) is replaced
+            db.drop_live(all_tags)
+            db.dict_to_db_row(all_tags)
+    return headers, skipped
+
+
+def tree_signature(path: PathLike) -> TreeSig:
+    """
+    :param path: directory to summarize
+    :return: file count, total size, and newest mtime below ``path``.
+        Changes while files are still being copied in.
+    """
+    files = size = newest = 0
+    for root, _dirs, names in os.walk(path):
+        for name in names:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue  # renamed by the copy
+            files += 1
+            size += st.st_size
+            newest = max(newest, st.st_mtime_ns)
+    return files, size, newest
+
+
+def session_report(
+    sql, headers: list[TagValues], settings: dict, label: str
+) -> tuple[str, str, elf.Totals]:
+    """
+    ``email_latest_flip`` evaluation of just the acquisitions in ``headers``.
+    Each check is written to ``qa_result`` (not committed).
+
+    :param sql: connection with ``acq``, ``template_by_count``, and ``project``
+    :param headers: first headers from :py:func:`ingest_session`
+    :param settings: from ``email_latest_flip.load_reporting_config``
+    :param label: in place of the report date, like ``Project yyyy.mm.dd-hh.mm.ss``
+    :return: subject, body, ``email_latest_flip.Totals``
+    """
+    sessions = sorted({(h["SubID"], h["AcqDate"]) for h in headers})
+    acq_rows = []
+    for subid, acq_date in sessions:
+        acq_rows += elf.fetch_session_acquisitions(sql, subid, acq_date)
+
+    (
+        eligible_rows,
+        study_counts_today,
+        seq_counts_today,
+        study_subids_today,
+        excluded_by_deny,
+    ) = elf.select_eligible_rows(acq_rows, settings)
+    tc = elf.TemplateChecker(
+        db=sql,
+        context="DB",
+        float_tolerance_default=settings.get("float_tolerance_default"),
+        float_tolerance_by_col=settings.get("float_tolerance_by_col"),
+    )
+    qa_rows: list[tuple] = []
+    seq_summary, missing_templates, totals = elf.evaluate_rows(
+        eligible_rows,
+        sql=sql,
+        tc=tc,
+        marquee_cols=settings["marquee_cols"],
+        study_counts_today=study_counts_today,
+        seq_counts_today=seq_counts_today,
+        qa_rows=qa_rows,
+    )
+    qa_result.store_results(sql, qa_rows)
+    totals.total_seen_today = len(acq_rows)
+    physicist_by_project = elf.physicists_for_projects(
+        sql, (key[0] for key in seq_summary)
+    )
+    subject, body = elf.build_email(
+        date_label=label,
+        marquee_cols=settings["marquee_cols"],
+        total_seen_today=len(acq_rows),
+        seq_summary=seq_summary,
+        missing_templates=missing_templates,
+        totals=totals,
+        study_subids_today=study_subids_today,
+        physicist_by_project=physicist_by_project,
+        excluded_by_deny=excluded_by_deny,
+    )
+    return subject, body, totals
+
+
+def process_session(
+    ses: PathLike,
+    db: DBQuery,
+    settings: dict,
+    email_entries: list[dict],
+    dtr: Optional[DicomTagReader] = None,
+    notify_all: bool = False,
+) -> Optional[tuple[str, str]]:
+    """
+    Ingest ``ses``, check it, and mail the result.
+
+    :param ses: settled session directory
+    :param db: DB to add to
+    :param settings: from ``email_latest_flip.load_reporting_config``
+    :param email_entries: recipients. empty to print instead of mailing
+    :param dtr: header reader. new one if None
+    :param notify_all: also mail sessions where everything conforms
+    :return: subject and body, None if there was nothing to check
+    """
+    from .shim_drift import ShimDrift
+
+    try:
+        headers, skipped = ingest_session(ses, db, dtr or DicomTagReader())
+        db.sql.commit()
+        logging.info(
+            "ingested %s: %d acquisitions, %d already from realtime",
+            ses,
+            len(headers),
+            skipped,
+        )
+        if not headers:
+            return None
+        ShimDrift(db.sql).ingest_new()
+        db.sql.commit()
+
+        project = os.path.basename(os.path.dirname(os.path.normpath(ses)))
+        label = f"{project} {os.path.basename(os.path.normpath(ses))}"
+        subject, body, totals = session_report(db.sql, headers, settings, label)
+        db.sql.commit()
+    except Exception:
+        # nothing half done is committed along with the next session
+        db.sql.rollback()
+        raise
+    problem = totals.total_nonconforming > 0 or totals.mia_actionable > 0
+    if not email_entries:
+        print(f"Subject: {subject}\n\n{body}")
+    elif problem or notify_all:
+        elf.send_all(email_entries, subject, body)
+    else:
+        logging.info("%s conforms. not mailing: %s", label, subject)
+    return subject, body
+
+
+class SessionWatcher:
+    """
+    Find new session directories in project directories and
+    hand each to ``on_session`` once it has stopped changing.
+
+    Polls with :py:class:`poll_watcher.PollingWatcher`: a watch per project,
+    plus one on each root for new projects.
+    A session ``on_session`` raises for is tried again later (:py:attr:`failed`).
+    """
+
+    def __init__(
+        self,
+        roots: list[PathLike],
+        on_session: Callable[[PathLike], object],
+        settle: float = SETTLE_SECONDS,
+        poll_interval: float = POLL_INTERVAL,
+        retry: float = RETRY_SECONDS,
+    ):
+        """
+        :param roots: ``scan_data`` style directories of projects, or project directories
+        :param on_session: called with each settled session directory
+        :param settle: seconds a session must be unchanged
+        :param poll_interval: seconds between polls
+        :param retry: seconds before the first retry of a failed session
+        """
+        self.on_session = on_session
+        self.settle = settle
+        self.watcher = PollingWatcher(interval=poll_interval)
+        #: watched directory -> True for projects, False for roots of projects
+        self.is_project: dict[str, bool] = {}
+        #: session path -> (signature, time.monotonic() it was last seen changing)
+        self.pending: dict[str, tuple[TreeSig, float]] = {}
+        self.retry = retry
+        #: session path -> (failures, time.monotonic() of the next try)
+        self.failed: dict[str, tuple[int, float]] = {}
+        for root in roots:
+            root = os.path.normpath(root)
+            if is_project(root):
+                self.watch(root, True)
+                continue
+            self.watch(root, False)
+            for e in os.scandir(root):
+                if e.is_dir():
+                    self.watch(e.path, True)
+
+    def watch(self, path: str, project: bool):
+        if path in self.is_project:
+            return
+        self.watcher.watch(path, IN_CREATE)
+        self.is_project[path] = project
+
+    def handle(self, event, now: float):
+        "note new sessions (and new projects to watch) from one watcher event"
+        if not event.flags & IN_ISDIR:
+            return
+        path = os.path.join(event.alias, event.name)
+        if not self.is_project.get(event.alias):
+            self.watch(path, True)  # sessions already inside come as events
+        elif SESSION_RE.search(event.name) and path not in self.pending:
+            logging.info("new session %s", path)
+            self.pending[path] = (tree_signature(path), now)
+
+    def settled(self, now: Optional[float] = None) -> list[str]:
+        """
+        Re-check pending sessions.
+
+        :return: sessions unchanged for :py:attr:`settle` seconds (no longer pending)
+        """
+        now = time.monotonic() if now is None else now
+        ready = []
+        for path, (sig, since) in list(self.pending.items()):
+            cur = tree_signature(path)
+            if cur != sig:
+                self.pending[path] = (cur, now)
+            elif now - since >= self.settle and cur[0] > 0:
+                del self.pending[path]
+                ready.append(path)
+        return ready
+
+    def step(self, now: Optional[float] = None):
+        "one poll: new directories, then settled sessions to ``on_session``"
+        now = time.monotonic() if now is None else now
+        self.watcher.poll()
+        while self.watcher.events:
+            self.handle(self.watcher.events.popleft(), now)
+        settled = self.settled(now)
+        due = [p for p, (_, at) in self.failed.items() if now >= at]
+        for path in settled + [p for p in due if p not in settled]:
+            self.process(path, now)
+
+    def process(self, path: str, now: float):
+        "``on_session``. a failure is scheduled for a retry instead of raised"
+        try:
+            self.on_session(path)
+        except Exception:
+            # one unreadable session shouldn't stop the daemon.
+            # the nightly crawl won't go back for it either (see module doc)
+            n = self.failed.get(path, (0, 0.0))[0] + 1
+            wait = min(self.retry * 2 ** (n - 1), RETRY_MAX_SECONDS)
+            self.failed[path] = (n, now + wait)
+            logging.exception(
+                "failed to process session %s (%d times). retry in %.0fs", path, n, wait
+            )
+        else:
+            self.failed.pop(path, None)
+
+    async def run_forever(self):
+        await self.watcher.setup()
+        logging.info("watching %d directories for new sessions", len(self.is_project))
+        while True:
+            await asyncio.sleep(self.watcher.interval)
+            self.step()
+
+
+def make_processor(
+    db_path: PathLike,
+    reporting: PathLike,
+    email_toml: Optional[PathLike] = None,
+    notify_all: bool = False,
+) -> Callable[[PathLike], Optional[tuple[str, str]]]:
+    """
+    :py:func:`process_session` with its DB, settings, and recipients bound.
+    The DB is opened on first use, so the returned function can be handed
+    to a worker thread (sqlite connections stay in the thread that made them).
+
+    :param db_path: ``db.sqlite``
+    :param reporting: ``reporting.toml``
+    :param email_toml: recipients. None to print reports instead
+    :param notify_all: see :py:func:`process_session`
+    """
+    settings = elf.load_reporting_config(Path(reporting))
+    email_entries = elf.load_email_entries(Path(email_toml)) if email_toml else []
+    dtr = DicomTagReader()
+    db: list[DBQuery] = []
+
+    def on_session(ses: PathLike):
+        if not db:
+            db.append(DBQuery(sqlite3.connect(db_path), source=DBQuery.SOURCE_NIGHTLY))
+        return process_session(
+            ses, db[0], settings, email_entries, dtr=dtr, notify_all=notify_all
+        )
+
+    return on_session
+
+
+def main(
+    roots: list[PathLike],
+    db_path: PathLike,
+    reporting: PathLike,
+    email_toml: Optional[PathLike] = None,
+    settle: float = SETTLE_SECONDS,
+    poll_interval: float = POLL_INTERVAL,
+    notify_all: bool = False,
+    session: Optional[PathLike] = None,
+) -> int:
+    """
+    ``mrqart session-watch``: watch ``roots`` until killed.
+
+    :param email_toml: recipients. None to print reports instead
+    :param session: process this one session directory and exit
+    """
+    on_session = make_processor(db_path, reporting, email_toml, notify_all)
+    if session:
+        on_session(session)
+        return 0
+
+    watcher = SessionWatcher(
+        roots or [SCAN_DATA], on_session, settle=settle, poll_interval=poll_interval
+    )
+    asyncio.run(watcher.run_forever())
+    return 0
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Track scanner shim drift from ``acq.Shims``.
+
+:py:func:`dcmmeta2tsv.read_shims` stores 10 shim and frequency values as a comma string.
+Here each value (``component`` 0-9, in ``Shims`` order) gets running statistics per
+``Station × SequenceName`` in the ``shim_stats`` table:
+
+* Welford ``n``, ``mean``, ``m2`` (variance is ``m2/(n-1)``)
+* an exponentially weighted moving average (``ewma``) that follows recent acquisitions
+
+A new acquisition is compared to the statistics *before* it is folded in.
+Flags go to ``shim_outlier``:
+
+* ``value``: the value is more than :py:data:`Z_THRESHOLD` sd from the mean
+* ``drift``: the EWMA has moved more than :py:data:`DRIFT_THRESHOLD` sd from the mean
+
+Only acquisitions with a rowid above the ``shim_watermark`` are read,
+so the nightly update (:py:meth:`ShimDrift.ingest_new`) never rescans history.
+Rowids aren't enough to say what's been counted: :py:meth:`acq2sqlite.DBQuery.drop_live`
+replaces realtime and sidecar rows with new (higher rowid) ones.
+``shim_folded`` keys each folded acquisition by Station, SubID, AcqDate, and SeriesNumber
+so a replaced row isn't folded in again.
+Realtime uses :py:meth:`ShimDrift.check` which does not write,
+and reloads statistics when the nightly update has moved the watermark.
+"""
+
+import logging
+import math
+import sqlite3
+from typing import Iterable, Optional, TypedDict
+
+#: values in ``acq.Shims`` (see :py:func:`dcmmeta2tsv.read_shims`)
+N_COMPONENTS = 10
+#: EWMA weight of the newest acquisition
+EWMA_ALPHA = 0.1
+#: sd from mean for a single acquisition to be flagged
+Z_THRESHOLD = 4.0
+#: sd from mean for the EWMA to be flagged
+DRIFT_THRESHOLD = 2.0
+#: don't flag until this many acquisitions are in the statistics
+MIN_N = 10
+
+SCHEMA = """
+create table if not exists shim_stats (
+  Station text,
+  SequenceName text,
+  component integer,
+  n integer,
+  mean real,
+  m2 real,
+  ewma real,
+  primary key (Station, SequenceName, component)
+);
+create table if not exists shim_outlier (
+  acq_id integer,
+  Station text,
+  SequenceName text,
+  component integer,
+  kind text, -- 'value' or 'drift'
+  value real,
+  mean real,
+  sd real
+);
+create table if not exists shim_watermark (
+  last_acq_id integer
+);
+create table if not exists shim_folded (
+  Station text,
+  SubID text,
+  AcqDate text,
+  SeriesNumber text,
+  primary key (Station, SubID, AcqDate, SeriesNumber)
+);
+"""
+
+#: acquisitions in ``shim_folded``. (columns of ``acq a``)
+FOLDED_KEY = "a.Station, a.SubID, a.AcqDate, a.SeriesNumber"
+
+#: one flagged shim component
+ShimOutlier = TypedDict(
+    "ShimOutlier",
+    {
+        "component": int,
+        "kind": str,
+        "value": float,
+        "mean": float,
+        "sd": float,
+    },
+)
+
+
+def parse_shims(shims: Optional[str]) -> Optional[list[float]]:
+    """
+    :param shims: ``acq.Shims`` comma string
+    :return: floats or None when missing or not :py:data:`N_COMPONENTS` numbers
+
+    >>> parse_shims('1174,-2475,4575,531,-20,59,54,-8,123160323,4')[:3]
+    [1174.0, -2475.0, 4575.0]
+    >>> parse_shims('null,null') is None
+    True
+    """
+    if not shims:
+        return None
+    try:
+        vals = [float(x) for x in str(shims).split(",")]
+    except ValueError:
+        return None
+    if len(vals) != N_COMPONENTS:
+        return None
+    return vals
+
+
+class RunningStat:
+    """
+    Welford mean/variance plus EWMA for one shim component.
+
+    >>> s = RunningStat()
+    >>> for x in [1, 2, 3, 4]:
+    ...     s.push(x)
+    >>> (s.n, s.mean, round(s.sd, 3))
+    (4, 2.5, 1.291)
+    """
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0, ewma=None):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+        self.ewma = ewma
+
+    @property
+    def sd(self) -> float:
+        "sample standard deviation (0 with fewer than 2 values)"
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def push(self, x: float, alpha: float = EWMA_ALPHA):
+        "fold in a new value"
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.ewma = x if self.ewma is None else alpha * x + (1 - alpha) * self.ewma
+
+    def flags(
+        self,
+        x: float,
+        alpha: float = EWMA_ALPHA,
+        z: float = Z_THRESHOLD,
+        drift: float = DRIFT_THRESHOLD,
+        min_n: int = MIN_N,
+    ) -> list[str]:
+        """
+        Compare ``x`` to the current statistics (without adding it).
+
+        :return: list of ``'value'`` and/or ``'drift'``
+        """
+        sd = self.sd
+        if self.n < min_n or sd == 0:
+            return []
+        out = []
+        if abs(x - self.mean) > z * sd:
+            out.append("value")
+        ewma = x if self.ewma is None else alpha * x + (1 - alpha) * self.ewma
+        if abs(ewma - self.mean) > drift * sd:
+            out.append("drift")
+        return out
+
+
+class ShimDrift:
+    """
+    Per ``Station × SequenceName`` shim statistics backed by ``shim_stats``.
+    Statistics are loaded once per key and written back on :py:meth:`save`.
+    :py:meth:`check` drops the loaded statistics when another connection
+    (the nightly :py:meth:`ingest_new`) moved the watermark.
+    """
+
+    def __init__(
+        self,
+        sql: sqlite3.Connection,
+        alpha: float = EWMA_ALPHA,
+        z: float = Z_THRESHOLD,
+        drift: float = DRIFT_THRESHOLD,
+        min_n: int = MIN_N,
+    ):
+        """
+        :param sql: connection to ``db.sqlite``. shim tables are created if missing
+        :param alpha: see :py:data:`EWMA_ALPHA`
+        :param z: see :py:data:`Z_THRESHOLD`
+        :param drift: see :py:data:`DRIFT_THRESHOLD`
+        :param min_n: see :py:data:`MIN_N`
+        """
+        self.sql = sql
+        had_folded = self.sql.execute(
+            "select 1 from sqlite_master where type='table' and name='shim_folded'"
+        ).fetchone()
+        # not executescript: that commits the caller's open transaction
+        for stmt in SCHEMA.split(";"):
+            if stmt.strip():
+                self.sql.execute(stmt)
+        if not had_folded and self.watermark():
+            # statistics from before shim_folded: everything under the watermark
+            self.sql.execute(
+                f"""
+                insert or ignore into shim_folded
+                select {FOLDED_KEY} from acq a where a.rowid <= ?
+                """,
+                (self.watermark(),),
+            )
+        self.alpha, self.z, self.drift, self.min_n = alpha, z, drift, min_n
+        self.stats: dict[tuple[str, str], list[RunningStat]] = {}
+        self.dirty: set[tuple[str, str]] = set()
+        #: :py:meth:`watermark` when :py:attr:`stats` were last known current
+        self.loaded_mark: Optional[int] = None
+
+    def _refresh(self):
+        "forget statistics loaded before another connection moved the watermark"
+        mark = self.watermark()
+        if mark != self.loaded_mark:
+            # unsaved changes made here are kept
+            self.stats = {k: v for k, v in self.stats.items() if k in self.dirty}
+            self.loaded_mark = mark
+
+    def _stats(self, station: str, seqname: str) -> list[RunningStat]:
+        key = (station, seqname)
+        if key not in self.stats:
+            stats = [RunningStat() for _ in range(N_COMPONENTS)]
+            rows = self.sql.execute(
+                """
+                select component, n, mean, m2, ewma from shim_stats
+                where Station = ? and SequenceName = ?
+                """,
+                key,
+            )
+            for comp, n, mean, m2, ewma in rows:
+                stats[comp] = RunningStat(n, mean, m2, ewma)
+            self.stats[key] = stats
+        return self.stats[key]
+
+    def check(self, station: str, seqname: str, shims: str) -> list[ShimOutlier]:
+        """
+        Flag components of ``shims`` against current statistics. Nothing is updated.
+        Used in realtime where the acquisition isn't in the database yet.
+
+        :param station: ``Station`` header value
+        :param seqname: ``SequenceName`` header value
+        :param shims: ``Shims`` comma string
+        """
+        vals = parse_shims(shims)
+        if vals is None:
+            return []
+        self._refresh()
+        return self._flag(station, seqname, vals)
+
+    def _flag(self, station: str, seqname: str, vals: list[float]) -> list[ShimOutlier]:
+        out: list[ShimOutlier] = []
+        for comp, (stat, x) in enumerate(zip(self._stats(station, seqname), vals)):
+            for kind in stat.flags(x, self.alpha, self.z, self.drift, self.min_n):
+                out.append(
+                    {
+                        "component": comp,
+                        "kind": kind,
+                        "value": x,
+                        "mean": stat.mean,
+                        "sd": stat.sd,
+                    }
+                )
+        return out
+
+    def update(
+        self, station: str, seqname: str, shims: str, acq_id: Optional[int] = None
+    ) -> list[ShimOutlier]:
+        """
+        :py:meth:`check` then fold the values into the statistics.
+        Flags are recorded in ``shim_outlier``.
+
+        :param acq_id: ``acq.rowid`` stored with any flags
+        """
+        vals = parse_shims(shims)
+        if vals is None:
+            return []
+        flagged = self._flag(station, seqname, vals)
+        for f in flagged:
+            self.sql.execute(
+                """
+                insert into shim_outlier
+                (acq_id, Station, SequenceName, component, kind, value, mean, sd)
+                values (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (acq_id, station, seqname, f["component"], f["kind"])
+                + (f["value"], f["mean"], f["sd"]),
+            )
+        for stat, x in zip(self._stats(station, seqname), vals):
+            stat.push(x, self.alpha)
+        self.dirty.add((station, seqname))
+        return flagged
+
+    def save(self):
+        "write changed statistics back to ``shim_stats``"
+        rows = []
+        for station, seqname in self.dirty:
+            for comp, s in enumerate(self.stats[(station, seqname)]):
+                rows.append((station, seqname, comp, s.n, s.mean, s.m2, s.ewma))
+        self.sql.executemany(
+            """
+            insert or replace into shim_stats
+            (Station, SequenceName, component, n, mean, m2, ewma)
+            values (?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        self.dirty.clear()
+
+    def watermark(self) -> int:
+        "largest ``acq.rowid`` already folded into the statistics"
+        row = self.sql.execute("select max(last_acq_id) from shim_watermark").fetchone()
+        return row[0] or 0
+
+    def ingest_new(self) -> int:
+        """
+        Fold every acquisition newer than :py:meth:`watermark` into the statistics
+        (in acquisition order) and save. Also works as the initial backfill.
+        Rows replacing an acquisition already in ``shim_folded`` are skipped.
+
+        :return: number of acquisitions read
+        """
+        rows = self.sql.execute(
+            f"""
+            select a.rowid, a.Station, p.SequenceName, a.Shims,
+                   exists (
+                     select 1 from shim_folded f
+                     where f.Station is a.Station and f.SubID is a.SubID
+                       and f.AcqDate is a.AcqDate and f.SeriesNumber is a.SeriesNumber
+                   ) as folded,
+                   {FOLDED_KEY}
+            from acq a join acq_param p on a.param_id = p.rowid
+            where a.rowid > ?
+            order by a.AcqDate, a.AcqTime, a.rowid
+            """,
+            (self.watermark(),),
+        ).fetchall()
+        new = [r for r in rows if not r[4]]
+        self.sql.executemany(
+            "insert or ignore into shim_folded values (?, ?, ?, ?)",
+            [r[5:] for r in new],
+        )
+        last = max((r[0] for r in rows), default=None)
+        return self.ingest_rows([r[:4] for r in new], last)
+
+    def ingest_rows(self, rows: Iterable[tuple], last: Optional[int] = None) -> int:
+        """
+        :param rows: ``(acq_id, Station, SequenceName, Shims)``
+        :param last: watermark to store when higher than any ``acq_id``
+            (rows the caller skipped)
+        :return: number of rows read
+        """
+        n = 0
+        last = max(self.watermark(), last or 0)
+        for acq_id, station, seqname, shims in rows:
+            flagged = self.update(station, seqname, shims, acq_id)
+            if flagged:
+                logging.info(
+                    "shim drift %s %s acq %s: %s", station, seqname, acq_id, flagged
+                )
+            last = max(last, acq_id)
+            n += 1
+        self.save()
+        self.sql.execute("delete from shim_watermark")
+        self.sql.execute("insert into shim_watermark values (?)", (last,))
+        self.loaded_mark = last
+        return n
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Run ``mrqart.py``'s file watching and header checking in worker processes,
+one per ``--watch`` root (each scanner pushes to its own directory).
+
+``mrqart.py --workers`` keeps HTTP, websockets, :py:data:`mrqart.STATE`
+and ``--state-file`` in the front-end process. Each worker runs
+:py:func:`mrqart.monitor_dirs` on its root and puts the messages it would have
+broadcast on a ``multiprocessing`` queue instead (update messages are
+still coalesced in the worker). A burst on one scanner then only costs
+that scanner's process, and a worker that dies is restarted
+without taking down the page or the other scanners.
+
+Workers are ``spawn``\\ ed so they don't inherit the front end's
+event loop, sockets, or sqlite connection.
+Metrics for parsing and checking (``/metrics``) are counted in the workers
+and are not reported by the front end.
+Watch counts are: each worker sends its :py:meth:`mrqart.WatchManager.counts`
+every :py:data:`WATCH_REPORT` seconds, and :py:meth:`Supervisor.counts`
+(``/watches``, the ``mrqart_watches`` gauge) adds them up.
+"""
+
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import queue
+import time
+from typing import Callable, Optional
+
+#: seconds to wait before restarting a worker that exited
+RESTART_DELAY = 5.0
+#: seconds between a worker's checks that the front end is still running
+PARENT_CHECK = 1.0
+#: seconds between a worker's watch count messages
+WATCH_REPORT = 10.0
+#: ``type`` of a worker's watch count message. not broadcast
+WATCHES_MSG = "watches"
+
+
+def run_worker(root: str, out: mp.Queue, options: dict):
+    """
+    Worker process entry point: watch ``root`` until killed.
+
+    :param root: directory to watch (one ``--watch`` path)
+    :param out: gets ``(msg, series_seqname)`` for every message to broadcast,
+        and a :py:data:`WATCHES_MSG` every :py:data:`WATCH_REPORT` seconds
+    :param options: :py:func:`mrqart.build_pipeline` keyword arguments,
+        ``updates_per_second`` and ``write_behind``
+    """
+    # imported here: the front end may be running mrqart.mrqart as __main__
+    from . import mrqart as rt
+
+    options = dict(options)
+    updates_per_second = options.pop("updates_per_second", rt.UPDATES_PER_SECOND)
+    write_behind = options.pop("write_behind", False)
+
+    def send(msg: dict):
+        cur = rt.STATE.get(msg["station"])
+        out.put((msg, cur.series_seqname if cur else ""))
+
+    async def orphaned():
+        "front end killed without :py:meth:`Supervisor.close`: stop too"
+        # reparented (to init) once the front end exits
+        parent = os.getppid()
+        while os.getppid() == parent:
+            await asyncio.sleep(PARENT_CHECK)
+        logging.warning("front end for %s is gone. worker exiting", root)
+
+    async def report_watches(watcher):
+        while True:
+            msg = {"type": WATCHES_MSG, "root": root, "counts": watcher.counts()}
+            out.put((msg, ""))
+            await asyncio.sleep(WATCH_REPORT)
+
+    async def watch():
+        watcher, dcm_checker, shim_drift = rt.build_pipeline([root], **options)
+        coalescer = rt.UpdateCoalescer(send, max_per_second=updates_per_second)
+        writer = rt.start_write_behind(dcm_checker) if write_behind else None
+        tasks = [
+            asyncio.create_task(c)
+            for c in (
+                rt.monitor_dirs(
+                    watcher, dcm_checker, shim_drift, coalescer, write_behind=writer
+                ),
+                watcher.expire_forever(),
+                rt.watch_stalls(coalescer),
+                report_watches(watcher),
+                orphaned(),
+            )
+        ]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            task.result()  # raise a crash so the exit code shows it
+
+    logging.info("worker %d watching %s", mp.current_process().pid, root)
+    asyncio.run(watch())
+
+
+class Supervisor:
+    "start, restart, and read from one :py:func:`run_worker` process per root"
+
+    def __init__(
+        self,
+        roots: list[str],
+        options: Optional[dict] = None,
+        restart_delay: float = RESTART_DELAY,
+        target: Callable = run_worker,
+    ):
+        """
+        :param roots: directories to watch, one worker each
+        :param options: passed to every :py:func:`run_worker`
+        :param restart_delay: seconds between a worker exiting and its restart
+        :param target: worker entry point (tests swap in something lighter)
+        """
+        self.roots = roots
+        self.options = options or {}
+        self.restart_delay = restart_delay
+        self.target = target
+        self.ctx = mp.get_context("spawn")
+        self.queue = self.ctx.Queue()
+        #: root -> worker process
+        self.procs: dict[str, mp.Process] = {}
+        #: root -> time.monotonic() the worker was found dead
+        self.died_at: dict[str, float] = {}
+        #: workers started after the first (crash restarts)
+        self.restarts = 0
+        #: root -> latest ``WatchManager.counts()`` from its worker
+        self.watch_counts: dict[str, dict] = {}
+        self._closed = False
+
+    def start_worker(self, root: str):
+        proc = self.ctx.Process(
+            target=self.target,
+            args=(root, self.queue, self.options),
+            name=f"mrqart-worker:{root}",
+            daemon=True,
+        )
+        proc.start()
+        self.procs[root] = proc
+        self.died_at.pop(root, None)
+
+    def start(self):
+        for root in self.roots:
+            self.start_worker(root)
+
+    def alive(self) -> int:
+        "number of running workers (``/metrics`` gauge)"
+        return sum(p.is_alive() for p in self.procs.values())
+
+    def counts(self) -> dict:
+        """
+        :py:meth:`mrqart.WatchManager.counts` summed over the workers' latest reports,
+        plus ``workers``: each root's own
+        """
+        by_depth: dict[int, int] = {}
+        for c in self.watch_counts.values():
+            for depth, n in c["by_depth"].items():
+                by_depth[depth] = by_depth.get(depth, 0) + n
+        return {
+            "watches": sum(c["watches"] for c in self.watch_counts.values()),
+            "by_depth": by_depth,
+            "expired": sum(c["expired"] for c in self.watch_counts.values()),
+            "workers": dict(self.watch_counts),
+        }
+
+    def check(self):
+        "restart workers that have been dead for :py:attr:`restart_delay`"
+        now = time.monotonic()
+        for root, proc in self.procs.items():
+            if proc.is_alive():
+                continue
+            if root not in self.died_at:
+                self.watch_counts.pop(root, None)
+                logging.error(
+                    "worker for %s exited (code %s). restarting in %.0fs",
+                    root,
+                    proc.exitcode,
+                    self.restart_delay,
+                )
+                self.died_at[root] = now
+            if now - self.died_at[root] >= self.restart_delay:
+                self.restarts += 1
+                self.start_worker(root)
+
+    async def check_forever(self, interval: float = 1.0):
+        while not self._closed:
+            self.check()
+            await asyncio.sleep(interval)
+
+    def get(self, timeout: float = 0.5) -> Optional[tuple[dict, str]]:
+        "next ``(msg, series_seqname)`` from any worker, None on timeout"
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def receive_forever(self, on_message: Callable[[dict, str], None]):
+        """
+        Call ``on_message(msg, series_seqname)`` in the event loop
+        for every message from every worker (see :py:meth:`dispatch`).
+        """
+        while not self._closed:
+            item = await asyncio.to_thread(self.get)
+            if item is not None:
+                self.dispatch(item, on_message)
+
+    def dispatch(self, item: tuple[dict, str], on_message: Callable[[dict, str], None]):
+        "keep a :py:data:`WATCHES_MSG`'s counts. pass anything else to ``on_message``"
+        msg, series_seqname = item
+        if msg.get("type") == WATCHES_MSG:
+            self.watch_counts[msg["root"]] = msg["counts"]
+        else:
+            on_message(msg, series_seqname)
+
+    def close(self):
+        self._closed = True
+        for proc in self.procs.values():
+            if proc.is_alive():
+                proc.terminate()
+        for proc in self.procs.values():
+            proc.join(timeout=5)
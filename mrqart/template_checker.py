@@ -2,10 +2,13 @@
 check a header against best template
 """
 
-import re
-from typing import TypedDict
+import time
+from collections import defaultdict
+from functools import lru_cache
+from typing import Callable, Iterable, Mapping, Optional, TypedDict
 
 from .acq2sqlite import DBQuery
+from .bids_sidecar import SIDECAR_NULL
 from .dcmmeta2tsv import DicomTagReader, TagKey, TagValues
 
 #: Dictionary for mismatches in input (``have`` key) and template (``expect`` key)
@@ -20,6 +23,8 @@ ErrorDict = dict[TagKey, ErrorCompare]
 #:   | (:py:class:`dcmmeta2tsv.TagValues`)
 #: * | ``template``: all the parameters of a template (matching Study, SeriesName)
 #:   | Also a :py:class:`dcmmeta2tsv.TagValues`
+#: * | ``nearest``: when there is no ``template``, the closest template in the same
+#:   | project and its ``errors`` (:py:data:`template_index.NearestMatch`). Otherwise ``None``
 #:
 #: Here's an example of :py:class:`CheckResult` datastructure in html/javascript
 #: on the `static debug-enabled page <../_static/mrqart/index.html>`_
@@ -33,22 +38,191 @@ CheckResult = TypedDict(
         "input": TagValues,
         "template": TagValues,
         "errors": ErrorDict,
+        "nearest": Optional[dict],
     },
 )
 
 
-def _norm_str(x) -> str:
+#: float tolerance for numeric columns without an entry in :py:data:`FLOAT_TOLERANCE_BY_COL`.
+#: Overridden by ``[compare] float_tolerance_default`` in ``config/reporting.toml``
+FLOAT_TOLERANCE_DEFAULT = 1e-3
+#: per column tolerance (``[compare] float_tolerance_by_col``).
+#: TR of 1ms matches the old compare-as-int behavior
+FLOAT_TOLERANCE_BY_COL = {"TE": 0.05, "TR": 1.0}
+#: seconds between checks for a rebuilt ``template_by_count``
+#: (:py:meth:`TemplateChecker.nearest_template` in the long running realtime checker)
+INDEX_RECHECK_SECONDS = 300
+
+#: How each :py:data:`acq2sqlite.DBQuery.CONSTS` column is compared.
+#: Columns not listed are ``string``.
+#:
+#: * | ``numeric``: floats within tolerance. falls back to ``string`` if either is not a number
+#: * | ``set``: comma separated values (multiecho TE), any overlap within tolerance passes
+#: * | ``vector``: same length arrays (``[1.0, 2.0]`` or ``1.0,2.0``), every element within tolerance
+#: * | ``token``: exact ``str`` match (compact tokens like iPAT ``p2``)
+#: * | ``string``: whitespace collapsed, casefolded match
+COMPARE_KIND = {
+    "TR": "numeric",
+    "FA": "numeric",
+    "BWP": "numeric",
+    "BWPPE": "numeric",
+    "TE": "set",
+    "PixelResol": "vector",
+    "iPAT": "token",
+}
+
+
+@lru_cache(maxsize=4096)
+def _norm_str(x: str) -> str:
     """
     Normalize strings for tolerant comparisons:
     - collapse whitespace runs to a single space
     - trim leading/trailing whitespace
     - case-insensitive via casefold (locale-robust)
+
+    >>> _norm_str("  Unaliased  MB3/PE4 ")
+    'unaliased mb3/pe4'
     """
-    return re.sub(r"\s+", " ", str(x)).strip().casefold()
+    return " ".join(str(x).split()).casefold()
+
+
+@lru_cache(maxsize=4096)
+def _parse_float(x: str) -> Optional[float]:
+    "float or None. cached: the same few values repeat across a project's history"
+    try:
+        return float(x)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _parse_floats(x: str) -> Optional[tuple[float, ...]]:
+    """
+    Parse a comma separated (optionally bracketed) array. None if any element is not a number
+
+    >>> _parse_floats("[2.5, 2.5]")
+    (2.5, 2.5)
+    >>> _parse_floats("4.8,banana") is None
+    True
+    """
+    vals = tuple(
+        _parse_float(v) for v in x.replace("[", "").replace("]", "").split(",")
+    )
+    return None if None in vals else vals
+
+
+#: ``(template, header) -> conforms`` for a single column.
+#: Both values are ``str()`` before the call
+#: (:py:meth:`TemplateChecker.check_headers` relies on that to memoize)
+Comparator = Callable[[str, str], bool]
+#: compiled lookup of column to comparison. see :py:func:`compile_comparators`
+ComparatorPlan = TypedDict(
+    "ComparatorPlan",
+    {
+        "kind": dict[TagKey, str],
+        "tol": dict[TagKey, float],
+        "cmp": dict[TagKey, Comparator],
+    },
+)
+
+
+def _string_cmp(t: str, h: str) -> bool:
+    return _norm_str(t) == _norm_str(h)
+
+
+def _token_cmp(t: str, h: str) -> bool:
+    return t == h
+
+
+def _numeric_cmp(tol: float) -> Comparator:
+    def cmp(t: str, h: str) -> bool:
+        t_f, h_f = _parse_float(t), _parse_float(h)
+        if t_f is None or h_f is None:
+            return _string_cmp(t, h)
+        return abs(t_f - h_f) < tol
+
+    return cmp
+
+
+def _set_cmp(tol: float) -> Comparator:
+    def cmp(t: str, h: str) -> bool:
+        t_vals, h_vals = t.split(","), h.split(",")
+        for t_v in t_vals:
+            t_f = _parse_float(t_v)
+            for h_v in h_vals:
+                h_f = _parse_float(h_v)
+                if t_f is None or h_f is None:
+                    if _norm_str(t_v) == _norm_str(h_v):
+                        return True
+                elif abs(t_f - h_f) < tol:
+                    return True
+        return False
+
+    return cmp
+
+
+def _vector_cmp(tol: float) -> Comparator:
+    def cmp(t: str, h: str) -> bool:
+        t_arr, h_arr = _parse_floats(t), _parse_floats(h)
+        if t_arr is None or h_arr is None or len(t_arr) != len(h_arr):
+            return _string_cmp(t, h)
+        return all(abs(a - b) < tol for a, b in zip(t_arr, h_arr))
+
+    return cmp
+
+
+def compile_comparators(
+    float_tolerance_default: Optional[float] = None,
+    float_tolerance_by_col: Optional[Mapping[TagKey, float]] = None,
+) -> ComparatorPlan:
+    """
+    Build the per column comparison table once
+    (e.g. at :py:class:`TemplateChecker` construction)
+    from ``[compare]`` settings in ``config/reporting.toml``.
+    Values differing by less than (strictly) the column's tolerance match.
+
+    :param float_tolerance_default: tolerance for numeric/set/vector columns
+    :param float_tolerance_by_col: per column tolerance overrides
+    :return: :py:class:`ComparatorPlan` covering all of :py:data:`acq2sqlite.DBQuery.CONSTS`
+
+    >>> plan = compile_comparators(1e-3, {"TR": 1.0})
+    >>> plan["kind"]["TR"], plan["tol"]["TR"], plan["cmp"]["TR"]("1300", "1300.9")
+    ('numeric', 1.0, True)
+    >>> plan["cmp"]["PixelResol"]("[2.2978723049164, 2.2978723049164]", "2.29787,2.29787")
+    True
+    """
+    if float_tolerance_default is None:
+        float_tolerance_default = FLOAT_TOLERANCE_DEFAULT
+    tol_by_col = {**FLOAT_TOLERANCE_BY_COL, **(float_tolerance_by_col or {})}
+    plan: ComparatorPlan = {"kind": {}, "tol": {}, "cmp": {}}
+    for k in DBQuery.CONSTS:
+        kind = COMPARE_KIND.get(k, "string")
+        tol = float(tol_by_col.get(k, float_tolerance_default))
+        if kind == "numeric":
+            cmp = _numeric_cmp(tol)
+        elif kind == "set":
+            cmp = _set_cmp(tol)
+        elif kind == "vector":
+            cmp = _vector_cmp(tol)
+        elif kind == "token":
+            cmp = _token_cmp
+        else:
+            cmp = _string_cmp
+        plan["kind"][k] = kind
+        plan["tol"][k] = tol
+        plan["cmp"][k] = cmp
+    return plan
+
+
+#: plan with the module default tolerances. used when no plan is given
+DEFAULT_PLAN = compile_comparators()
 
 
 def find_errors(
-    template: TagValues, current_hdr: TagValues, allow_null: list[TagKey] = []
+    template: TagValues,
+    current_hdr: TagValues,
+    allow_null: list[TagKey] = [],
+    plan: Optional[ComparatorPlan] = None,
 ) -> ErrorDict:
     """
     Given a template and hdr, find any mismatches (non-conforming errors).
@@ -57,6 +231,8 @@ def find_errors(
     :param current_hdr: values we currently have
     :param allow_null: current keys that can be null.
                        see py:class:`TemplateChecker.context`
+    :param plan: comparison per column from :py:func:`compile_comparators`.
+                 default :py:data:`DEFAULT_PLAN`
     :returns: dictionary of tag key names and the have/expect values
 
     >>> find_errors({"TR": "1300"}, {"TR": "1300"})
@@ -66,6 +242,7 @@ def find_errors(
     >>> find_errors({"Project": "Brain^WPC-8620"}, {"Project": "Brain^wpc-8620"})
     {}
     """
+    cmps = (plan or DEFAULT_PLAN)["cmp"]
     errors = {}
     for k in DBQuery.CONSTS:
         t_k = template.get(k, "null")
@@ -75,28 +252,7 @@ def find_errors(
         if k in allow_null and h_k == "null":
             continue
 
-        # Specific checks:
-        if k == "TR":
-            # TR is in ms; compare ints of floats to ignore decimal precision
-            if t_k == "null":
-                t_k = 0
-            if h_k == "null":
-                h_k = 0
-            check = int(float(t_k)) == int(float(h_k))
-        elif k == "TE":
-            # multiecho: either header or template may have comma-separated TEs
-            # pass if there is any overlap between the two sets
-            t_values = {_norm_str(v.strip()) for v in str(t_k).split(",")}
-            h_values = {_norm_str(v.strip()) for v in str(h_k).split(",")}
-            check = bool(t_values & h_values)
-        elif k == "iPAT":
-            # Keep strict for compact tokens like 'p2'
-            check = str(t_k) == str(h_k)
-        else:
-            # Default tolerant compare for string-like fields
-            check = _norm_str(t_k) == _norm_str(h_k)
-
-        if check:
+        if cmps[k](str(t_k), str(h_k)):
             continue
         errors[k] = {"expect": t_k, "have": h_k}
     return errors
@@ -107,7 +263,13 @@ class TemplateChecker:
     read a dicom file and report if it conforms to the expected template
     """
 
-    def __init__(self, db=None, context="DB"):
+    def __init__(
+        self,
+        db=None,
+        context="DB",
+        float_tolerance_default: Optional[float] = None,
+        float_tolerance_by_col: Optional[Mapping[TagKey, float]] = None,
+    ):
         """
         db connection and tag reader (from taglist.txt)
         :param db: sql connection passed on to :py:class:`DBQuery`.
@@ -116,10 +278,21 @@ class TemplateChecker:
              * | "DB" - rigorous nightly DB check
              * | "RT" - lenient for ICEconfig realtime
                | dicoms missing some headers
+             * | "JSON" - headers from dcm2niix sidecars
+               | (:py:data:`bids_sidecar.SIDECAR_NULL` are missing)
+        :param float_tolerance_default: ``[compare]`` setting from ``reporting.toml``
+        :param float_tolerance_by_col: ``[compare]`` setting from ``reporting.toml``.
+            Both compiled once by :py:func:`compile_comparators`
         """
         self.db = DBQuery(db)
         self.reader = DicomTagReader()
         self.context = context
+        self.plan = compile_comparators(float_tolerance_default, float_tolerance_by_col)
+        #: :py:class:`template_index.TemplateIndex` built on first missing template
+        self._index = None
+        #: ``TemplateIndex.version`` the index was built from, and when it was last compared
+        self._index_version = None
+        self._index_checked = 0.0
 
     def check_file(self, dcm_path) -> CheckResult:
         """
@@ -128,24 +301,61 @@ class TemplateChecker:
         hdr = self.reader.read_dicom_tags(dcm_path)
         return self.check_header(hdr)
 
+    def allow_null(self, hdr: Optional[TagValues] = None) -> list[TagKey]:
+        """
+        parameters that may be null in the header for this :py:attr:`context`.
+
+        :param hdr: a DB row from a sidecar (``Source`` is
+            :py:data:`acq2sqlite.DBQuery.SOURCE_SIDECAR`) also allows
+            :py:data:`bids_sidecar.SIDECAR_NULL`, whatever the context
+        """
+        if self.context == "RT":
+            # FoV and TA (and sometimes BWPPE) are often missing in scanner-pushed RT dicoms
+            allow = ["FoV", "TA", "BWPPE"]
+        elif self.context == "JSON":
+            allow = list(SIDECAR_NULL)
+        else:
+            allow = []
+        if hdr is not None and hdr.get("Source") == DBQuery.SOURCE_SIDECAR:
+            allow += [k for k in SIDECAR_NULL if k not in allow]
+        return allow
+
+    def nearest_template(self, hdr: TagValues) -> Optional[dict]:
+        """
+        Closest template within ``hdr['Project']`` for a header without an exact match.
+        The index over all templates is built on first use and rebuilt when
+        ``template_by_count`` changes (looked for every :py:data:`INDEX_RECHECK_SECONDS`).
+
+        :return: :py:data:`template_index.NearestMatch` or None
+        """
+        # template_index needs find_errors from this module
+        from .template_index import TemplateIndex, closest_template
+
+        now = time.monotonic()
+        if self._index is None or now - self._index_checked >= INDEX_RECHECK_SECONDS:
+            self._index_checked = now
+            version = TemplateIndex.version(self.db)
+            if self._index is None or version != self._index_version:
+                self._index = TemplateIndex.from_db(self.db, self.plan)
+                self._index_version = version
+        return closest_template(self._index, hdr, self.allow_null(hdr))
+
     def check_header(self, hdr) -> CheckResult:
         """
         Check acquisition parameters against its template.
         """
         template = self.db.get_template(hdr["Project"], hdr["SequenceName"])
 
-        allow_null = []
-        if self.context == "RT":
-            # FoV and TA (and sometimes BWPPE) are often missing in scanner-pushed RT dicoms
-            allow_null = ["FoV", "TA", "BWPPE"]
+        allow_null = self.allow_null(hdr)
 
+        nearest = None
         if template:
             template = dict(template)
-            errors = find_errors(template, hdr, allow_null)
-            errors = clean_rt(errors)
+            errors = find_errors(template, hdr, allow_null, self.plan)
         else:
             template = {}
             errors = {}
+            nearest = self.nearest_template(hdr)
 
             # if self.context == "RT":
             # errors = clean_rt(errors)
@@ -155,8 +365,85 @@ class TemplateChecker:
             "errors": errors,
             "input": hdr,
             "template": template,
+            "nearest": nearest,
         }
 
+    def check_headers(self, hdrs: Iterable[TagValues]) -> list[CheckResult]:
+        """
+        Batch :py:meth:`check_header`. Same results, in the same order as ``hdrs``.
+
+        Headers are grouped by ``(Project, SequenceName)`` and every group's
+        template is fetched in one query
+        (:py:meth:`acq2sqlite.DBQuery.get_templates`). Within a group the
+        comparison runs column by column over
+        :py:data:`acq2sqlite.DBQuery.CONSTS`, and each distinct header value
+        is compared (normalized) once per column.
+        A day (or a full history) of one sequence is mostly the same few values.
+
+        :param hdrs: headers, e.g. ``dict(row)`` of ``acq join acq_param`` rows
+        :return: list of :py:data:`CheckResult`
+        """
+        hdrs = list(hdrs)
+        results: list[Optional[CheckResult]] = [None] * len(hdrs)
+        allow_null = self.allow_null()
+        allow_sidecar = self.allow_null({"Source": DBQuery.SOURCE_SIDECAR})
+
+        groups: dict[tuple[str, str], list[int]] = defaultdict(list)
+        for i, hdr in enumerate(hdrs):
+            groups[(hdr["Project"], hdr["SequenceName"])].append(i)
+
+        templates = self.db.get_templates(list(groups))
+        for (project, seqname), idxs in groups.items():
+            template = templates[(project, seqname)]
+            if not template:
+                # one lookup per group. same parameters -> same neighbor
+                memo: dict[tuple, Optional[dict]] = {}
+                for i in idxs:
+                    key = tuple(str(hdrs[i].get(k, "null")) for k in DBQuery.CONSTS)
+                    if key not in memo:
+                        memo[key] = self.nearest_template(hdrs[i])
+                    results[i] = {
+                        "conforms": True,
+                        "errors": {},
+                        "input": hdrs[i],
+                        "template": {},
+                        "nearest": memo[key],
+                    }
+                continue
+
+            template = dict(template)
+            group_errors: list[ErrorDict] = [{} for _ in idxs]
+            for k in DBQuery.CONSTS:
+                t_k = template.get(k, "null")
+                t_str = str(t_k)
+                cmp = self.plan["cmp"][k]
+                verdicts: dict[str, bool] = {}
+                for j, i in enumerate(idxs):
+                    h_k = hdrs[i].get(k, "null")
+                    if h_k == "null" and k in (
+                        allow_sidecar
+                        if hdrs[i].get("Source") == DBQuery.SOURCE_SIDECAR
+                        else allow_null
+                    ):
+                        continue
+                    key = str(h_k)
+                    if key not in verdicts:
+                        verdicts[key] = cmp(t_str, key)
+                    if not verdicts[key]:
+                        group_errors[j][k] = {"expect": t_k, "have": h_k}
+
+            for j, i in enumerate(idxs):
+                errors = group_errors[j]
+                results[i] = {
+                    "conforms": not errors,
+                    "errors": errors,
+                    "input": hdrs[i],
+                    "template": template,
+                    "nearest": None,
+                }
+
+        return results
+
 
 def float_or_0(val: str) -> float:
     "float or zero"
@@ -205,6 +492,9 @@ def clean_rt(errors: ErrorDict) -> ErrorDict:
     Clean up errors that are not actually errors in "realtime" dicom headers.
 
     Currently (2025-02-26) only checks ``PixelResol`` using :py:func:`fuzzy_arr_check`
+
+    No longer used by :py:class:`TemplateChecker`:
+    ``PixelResol`` is a ``vector`` column in :py:func:`compile_comparators` (2026-10).
     """
     if "PixelResol" in errors.keys():
         errcmp = errors["PixelResol"]
@@ -0,0 +1,172 @@
+"""
+Find the closest templates for an acquisition that has no exact
+``Project × SequenceName`` template (e.g. renamed ``T2w_FLAIR repeat``).
+"""
+
+import heapq
+import math
+from collections import defaultdict
+from typing import Iterable, Optional, TypedDict
+
+from .acq2sqlite import DBQuery
+from .dcmmeta2tsv import TagKey, TagValues
+from .template_checker import (
+    DEFAULT_PLAN,
+    ComparatorPlan,
+    ErrorDict,
+    _norm_str,
+    _parse_float,
+    _parse_floats,
+    find_errors,
+)
+
+#: :py:data:`acq2sqlite.DBQuery.CONSTS` used to compare templates.
+#: Project is the partition and SequenceName is what's presumably wrong.
+FEATURES = [c for c in DBQuery.CONSTS if c not in ("Project", "SequenceName")]
+
+#: * | ``template``: closest template (like ``CheckResult['template']``)
+#: * | ``errors``: :py:func:`template_checker.find_errors` of header against it
+#: * | ``distance``: number of mismatched parameters (``len(errors)``)
+NearestMatch = TypedDict(
+    "NearestMatch", {"template": TagValues, "errors": ErrorDict, "distance": int}
+)
+
+Feature = tuple[TagKey, object]
+
+
+def _bucket(f: float, tol: float) -> object:
+    """
+    Tolerance bucket of ``f``. The exact value when it can't be bucketed
+    (``inf``, ``nan``, or a tolerance of 0).
+
+    >>> _bucket(1300.2, 1.0), _bucket(1300.2, 0), _bucket(float("inf"), 1.0)
+    (1300, 1300.2, inf)
+    """
+    q = f / tol if tol and tol > 0 else math.nan
+    return round(q) if math.isfinite(q) else f
+
+
+def features(hdr: TagValues, plan: ComparatorPlan = DEFAULT_PLAN) -> set[Feature]:
+    """
+    Hashable, tolerance-bucketed ``(column, value)`` pairs for a header or template.
+    Values matching under ``plan`` (mostly) land in the same bucket.
+    Multiecho TE contributes one feature per echo.
+
+    >>> feats = features({"TR": "1300.2", "TE": "4.8,38.76"})
+    >>> sorted(f for f in feats if f[0] in ("TR", "TE"))
+    [('TE', 96), ('TE', 775), ('TR', 1300)]
+    """
+    out = set()
+    for k in FEATURES:
+        v = str(hdr.get(k, "null"))
+        kind, tol = plan["kind"][k], plan["tol"][k]
+        if kind == "numeric":
+            f = _parse_float(v)
+            out.add((k, _bucket(f, tol) if f is not None else _norm_str(v)))
+        elif kind == "set":
+            for each in v.split(","):
+                f = _parse_float(each)
+                out.add((k, _bucket(f, tol) if f is not None else _norm_str(each)))
+        elif kind == "vector":
+            arr = _parse_floats(v)
+            out.add((k, tuple(_bucket(x, tol) for x in arr) if arr else _norm_str(v)))
+        elif kind == "token":
+            out.add((k, v))
+        else:
+            out.add((k, _norm_str(v)))
+    return out
+
+
+class TemplateIndex:
+    """
+    Per project inverted index from :py:func:`features` to templates.
+    A lookup only visits templates sharing at least one parameter value with the header,
+    ranks them by shared count, and runs :py:func:`template_checker.find_errors`
+    on the best few to get the real distance.
+    """
+
+    def __init__(
+        self, templates: Iterable[TagValues], plan: ComparatorPlan = DEFAULT_PLAN
+    ):
+        """
+        :param templates: ``template_by_count`` join ``acq_param`` rows
+        :param plan: comparison plan (see :py:func:`template_checker.compile_comparators`)
+        """
+        self.plan = plan
+        self.templates: list[TagValues] = []
+        #: project (casefolded) -> feature -> template positions
+        self.postings: dict[str, dict[Feature, list[int]]] = defaultdict(
+            lambda: defaultdict(list)
+        )
+        for tmpl in templates:
+            pos = len(self.templates)
+            self.templates.append(tmpl)
+            project = _norm_str(tmpl.get("Project", ""))
+            for feat in features(tmpl, plan):
+                self.postings[project][feat].append(pos)
+
+    @staticmethod
+    def version(db: DBQuery) -> tuple:
+        """
+        Changes when ``template_by_count`` is rebuilt with different templates
+        (``email_latest_flip.rebuild_templates``). One aggregate query.
+        """
+        return tuple(
+            db.sql.execute(
+                "select count(*), total(param_id), total(n), max(param_id)"
+                " from template_by_count"
+            ).fetchone()
+        )
+
+    @classmethod
+    def from_db(cls, db: DBQuery, plan: ComparatorPlan = DEFAULT_PLAN):
+        """
+        Build from every template in ``template_by_count`` (one query).
+        Templates are the exact check's (:py:meth:`acq2sqlite.DBQuery.get_all_templates`),
+        multi-echo ``TE`` included.
+
+        :param db: database with ``template_by_count`` (``make_template_by_count.sql``)
+        """
+        return cls(db.get_all_templates(), plan)
+
+    def nearest(
+        self, hdr: TagValues, k: int = 1, allow_null: list[TagKey] = []
+    ) -> list[NearestMatch]:
+        """
+        :param hdr: header without an exact template
+        :param k: how many matches to return
+        :param allow_null: passed to :py:func:`template_checker.find_errors`
+        :return: up to ``k`` matches from the same project, closest first
+        """
+        postings = self.postings.get(_norm_str(hdr.get("Project", "")))
+        if not postings:
+            return []
+
+        shared: dict[int, int] = defaultdict(int)
+        for feat in features(hdr, self.plan):
+            for pos in postings.get(feat, []):
+                shared[pos] += 1
+
+        # shared count bounds the real distance; verify a few more than asked
+        candidates = heapq.nlargest(max(3 * k, 5), shared.items(), key=lambda x: x[1])
+        matches: list[NearestMatch] = []
+        for pos, _ in candidates:
+            tmpl = self.templates[pos]
+            errors = find_errors(tmpl, hdr, allow_null, self.plan)
+            # SequenceName can't match (or it'd have been found) and isn't a parameter
+            errors.pop("SequenceName", None)
+            matches.append(
+                {"template": tmpl, "errors": errors, "distance": len(errors)}
+            )
+        matches.sort(key=lambda m: m["distance"])
+        return matches[:k]
+
+
+def closest_template(
+    index: Optional[TemplateIndex], hdr: TagValues, allow_null: list[TagKey] = []
+) -> Optional[NearestMatch]:
+    "single best match or None (also None without an index)"
+    if index is None:
+        return None
+    found = index.nearest(hdr, 1, allow_null)
+    return found[0] if found else None
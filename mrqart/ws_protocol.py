@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Versioned, delta-encoded websocket messages for ``mrqart.py``.
+
+Version 1 (no ``v`` key) sent the full :py:data:`template_checker.CheckResult`,
+``input`` and ``template`` dicts included, for every new series.
+Version 2 (``"v": 2``) sends
+
+* every message: ``station`` and a per station ``seq`` (1, 2, ...).
+  A browser that sees a gap re-fetches ``/state``
+* ``new``: ``content`` without ``template`` but with ``template_id``.
+  The template itself is in ``templates`` the first time that id is broadcast.
+  ``input`` is replaced by ``input_delta`` (keys that changed since the station's
+  previous ``new``) and ``input_removed``. A station's first message has the full ``input``
+* ``update``: unchanged (``content`` is the count)
+* ``hello``: sent to each new connection with every known template
+
+Template ids hash the template's content, so a rebuilt template gets a new id.
+``static/index.html`` rebuilds the full ``CheckResult`` from these.
+"""
+
+import hashlib
+import json
+from typing import Optional
+
+PROTOCOL_VERSION = 2
+
+
+def template_id(template: Optional[dict]) -> Optional[str]:
+    """
+    :param template: ``CheckResult['template']``
+    :return: short content hash, None for no template
+
+    >>> template_id({"TR": "1300"}) == template_id({"TR": "1300"})
+    True
+    >>> template_id({}) is None
+    True
+    """
+    if not template:
+        return None
+    blob = json.dumps(template, sort_keys=True, default=str).encode()
+    return hashlib.sha1(blob).hexdigest()[:12]
+
+
+def split_template(check: dict) -> tuple[dict, Optional[dict]]:
+    """
+    :param check: :py:data:`template_checker.CheckResult`
+    :return: copy of ``check`` with ``template_id`` instead of ``template``, and the template
+
+    >>> content, tmpl = split_template({"conforms": True, "template": {}, "input": {}})
+    >>> content
+    {'conforms': True, 'input': {}, 'template_id': None}
+    """
+    content = dict(check)
+    template = content.pop("template", None)
+    content["template_id"] = template_id(template)
+    return content, template
+
+
+class DeltaEncoder:
+    "per server state needed to encode version 2 messages"
+
+    def __init__(self):
+        #: template id -> template, everything ever sent (for :py:meth:`hello`)
+        self.templates: dict[str, dict] = {}
+        #: station -> ``input`` of the last ``new`` sent
+        self.last_input: dict[str, dict] = {}
+        #: station -> last ``seq`` sent
+        self.seq: dict[str, int] = {}
+
+    def encode(self, msg: dict) -> dict:
+        """
+        :param msg: version 1 message (``station``, ``type``, ``content``, ...)
+        :return: version 2 message. Updates :py:attr:`last_input` and :py:attr:`seq`
+        """
+        station = msg["station"]
+        self.seq[station] = self.seq.get(station, 0) + 1
+        out = dict(msg, v=PROTOCOL_VERSION, seq=self.seq[station])
+        if msg["type"] != "new":
+            return out
+
+        content, template = split_template(msg["content"])
+        tid = content["template_id"]
+        if tid and tid not in self.templates:
+            self.templates[tid] = template
+            out["templates"] = {tid: template}
+
+        hdr = content.pop("input")
+        prev = self.last_input.get(station)
+        if prev is None:
+            content["input"] = hdr
+        else:
+            content["input_delta"] = {
+                k: v for k, v in hdr.items() if k not in prev or prev[k] != v
+            }
+            content["input_removed"] = [k for k in prev if k not in hdr]
+        self.last_input[station] = hdr
+        out["content"] = content
+        return out
+
+    def hello(self) -> dict:
+        "first message on a new connection"
+        return {
+            "v": PROTOCOL_VERSION,
+            "type": "hello",
+            "templates": self.templates,
+            "seq": self.seq,
+        }
+
+    def state(self, checks: dict[str, Optional[dict]]) -> dict:
+        """
+        ``/state`` body: full ``input`` for every station and each template once.
+
+        :param checks: station -> last :py:data:`template_checker.CheckResult`
+        """
+        templates = {}
+        stations = {}
+        for station, check in checks.items():
+            content = None
+            if check is not None:
+                content, template = split_template(check)
+                if content["template_id"]:
+                    templates[content["template_id"]] = template
+            stations[station] = {
+                "station": station,
+                "seq": self.seq.get(station, 0),
+                "content": content,
+            }
+        return {"v": PROTOCOL_VERSION, "templates": templates, "stations": stations}
+
+
+def decode(msg: dict, templates: dict, inputs: dict) -> Optional[dict]:
+    """
+    Python version of the ``static/index.html`` decoder (tests, ``mrqart replay``).
+
+    :param msg: version 2 ``new`` message
+    :param templates: id -> template, updated from ``msg``
+    :param inputs: station -> last full input, updated
+    :return: version 1 ``CheckResult`` or None if a delta's base is missing
+    """
+    templates.update(msg.get("templates", {}))
+    content = dict(msg["content"])
+    station = msg["station"]
+    if "input" in content:
+        hdr = content["input"]
+    elif station in inputs:
+        hdr = {
+            k: v
+            for k, v in inputs[station].items()
+            if k not in content.get("input_removed", [])
+        }
+        hdr.update(content.pop("input_delta", {}))
+    else:
+        return None
+    content.pop("input_removed", None)
+    inputs[station] = hdr
+    content["input"] = hdr
+    content["template"] = templates.get(content.pop("template_id"), {})
+    return content
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+XNAT event service notifications: a session was archived.
+
+``mrqart.py --xnat-root /disk/mace2/scan_data`` serves ``POST /xnat/event``
+(:py:class:`mrqart.XnatEvent`). Point an XNAT event service webhook
+for "session archived" at it. The MR session named in the event is found in
+``scan_data`` (``Project/yyyy.mm.dd-hh.mm.ss/<label>``, one glob, no crawl)
+and handed to :py:func:`session_ingest.process_session`,
+the same ingest and check ``mrqart session-watch`` runs without the polling delay.
+
+XNAT retries and may send more than one event for a session (archive, then
+an edit). :py:class:`XnatEventQueue` keeps one entry per session directory,
+and a session processed in the last :py:data:`DEDUPE_SECONDS` isn't queued again.
+
+:py:func:`fake_session_event` and :py:func:`post_event` stand in for XNAT
+in tests and when trying the endpoint by hand::
+
+    mrqart xnat-emit --url http://127.0.0.1:8080/xnat/event WPC-8620 11883_20250102
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from .session_ingest import SESSION_RE
+
+#: seconds after processing a session that more events for it are ignored
+DEDUPE_SECONDS = 3600.0
+#: XNAT data types that are MR sessions
+SESSION_TYPES = ("xnat:mrSessionData",)
+
+
+def session_label(payload: dict) -> Optional[tuple[str, str]]:
+    """
+    :param payload: event JSON. the archived session's fields
+        at the top level or under ``payload``/``object`` (XNAT version dependent)
+    :return: (project, session label), None if the event isn't for an MR session
+
+    >>> session_label({"project": "WPC-8620", "label": "11883_20250102", "xsiType": "xnat:mrSessionData"})
+    ('WPC-8620', '11883_20250102')
+    >>> session_label({"payload": {"project": "WPC-8620", "label": "s1"}})
+    ('WPC-8620', 's1')
+    >>> session_label({"project": "WPC-8620", "label": "s1", "xsiType": "xnat:petSessionData"}) is None
+    True
+    """
+    for key in ("payload", "object"):
+        if isinstance(payload.get(key), dict):
+            payload = payload[key]
+            break
+    xsi = payload.get("xsiType", payload.get("xsi-type"))
+    if xsi and xsi not in SESSION_TYPES:
+        return None
+    project = payload.get("project", payload.get("project-id"))
+    label = payload.get("label", payload.get("session-label"))
+    if not project or not label:
+        return None
+    return str(project), str(label)
+
+
+def find_session(roots: list[str], project: str, label: str) -> Optional[str]:
+    """
+    :param roots: ``scan_data`` style directories of projects
+    :param project: XNAT project, same as the ``scan_data`` directory name
+    :param label: XNAT session label, same as the directory inside the session
+    :return: ``root/project/yyyy.mm.dd-hh.mm.ss`` holding ``label``. newest if many
+    """
+    found = []
+    for root in roots:
+        pattern = os.path.join(
+            glob.escape(root), glob.escape(project), "*", glob.escape(label)
+        )
+        found += [
+            os.path.dirname(p)
+            for p in glob.glob(pattern)
+            if SESSION_RE.search(os.path.basename(os.path.dirname(p)))
+        ]
+    return max(found, key=os.path.basename) if found else None
+
+
+class XnatEventQueue:
+    """
+    Deduplicated queue of session directories from XNAT events,
+    processed one at a time on a worker thread.
+    """
+
+    def __init__(
+        self,
+        roots: list[str],
+        process: Callable[[str], object],
+        dedupe_seconds: float = DEDUPE_SECONDS,
+    ):
+        """
+        :param roots: where to look for sessions (:py:func:`find_session`)
+        :param process: called with each session directory, on the worker thread
+            (see :py:func:`session_ingest.make_processor`)
+        :param dedupe_seconds: see :py:data:`DEDUPE_SECONDS`
+        """
+        self.roots = roots
+        self.process = process
+        self.dedupe_seconds = dedupe_seconds
+        self.queue: asyncio.Queue = asyncio.Queue()
+        #: sessions queued or being processed
+        self.active: set[str] = set()
+        #: session -> time.monotonic() it was last processed
+        self.done: dict[str, float] = {}
+        self.duplicates = 0
+        # one thread: process() may hold a sqlite connection
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def put(self, ses: str, now: Optional[float] = None) -> bool:
+        """
+        :param ses: session directory
+        :return: True if queued. False if already queued or recently processed
+        """
+        now = time.monotonic() if now is None else now
+        last = self.done.get(ses)
+        if ses in self.active or (
+            last is not None and now - last < self.dedupe_seconds
+        ):
+            self.duplicates += 1
+            return False
+        self.active.add(ses)
+        self.queue.put_nowait(ses)
+        return True
+
+    def receive(self, payload: dict) -> tuple[Optional[str], bool]:
+        """
+        Queue the session an event is about.
+
+        :return: (session directory or None if not found, queued)
+        """
+        found = session_label(payload)
+        if found is None:
+            return None, False
+        ses = find_session(self.roots, *found)
+        if ses is None:
+            logging.warning("no session directory for XNAT event %s/%s", *found)
+            return None, False
+        return ses, self.put(ses)
+
+    async def run_forever(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            ses = await self.queue.get()
+            try:
+                await loop.run_in_executor(self._executor, self.process, ses)
+            except Exception:
+                logging.exception("failed to process XNAT session %s", ses)
+            finally:
+                self.active.discard(ses)
+                self.done[ses] = time.monotonic()
+
+
+def fake_session_event(
+    project: str, label: str, experiment_id: str = "XNAT_E00001"
+) -> dict:
+    """
+    Body like an XNAT event service webhook for an archived MR session.
+
+    >>> session_label(fake_session_event("WPC-8620", "11883_20250102"))
+    ('WPC-8620', '11883_20250102')
+    """
+    return {
+        "event": "SessionArchived",
+        "status": "CREATED",
+        "payload": {
+            "xsiType": "xnat:mrSessionData",
+            "ID": experiment_id,
+            "project": project,
+            "label": label,
+            "uri": f"/data/experiments/{experiment_id}",
+        },
+    }
+
+
+def post_event(url: str, payload: dict, timeout: float = 10.0) -> tuple[int, dict]:
+    """
+    POST ``payload`` as JSON, like XNAT would.
+
+    :return: HTTP status and decoded JSON response
+    """
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as res:
+            return res.status, json.loads(res.read() or b"{}")
+    except urllib.error.HTTPError as err:
+        body = err.read()
+        try:
+            return err.code, json.loads(body)
+        except ValueError:
+            return err.code, {"error": body.decode(errors="replace")}
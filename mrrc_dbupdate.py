@@ -8,63 +8,14 @@ Use RESCAN_ALL to force inspecting all dicoms
 
 import logging
 import os
-import re
 import subprocess
 from datetime import datetime, timedelta
 from glob import glob
 
 from mrqart.acq2sqlite import DBQuery
 from mrqart.dcmmeta2tsv import DicomTagReader
-
-
-def is_project(pdir: str) -> bool:
-    """
-    Is input a MR project dir?
-    should have subfolder like ``2024.06.27-09.19.11/``
-
-    :param pdir: directory to test
-    :return: True if is a project directory
-
-    #>>> is_project('/disk/mace2/scan_data/WPC-8620/')
-    #True
-    #>>> is_project('/disk/mace2/scan_data/7T/')
-    #False
-    """
-    if not os.path.isdir(pdir):
-        return False
-    for sesdir in os.listdir(pdir):
-        if re.search("^2[0-9.-]{18}$", sesdir):
-            return True
-    return False
-
-
-PathLike = str
-
-
-def find_first_dicoms(session_root: PathLike) -> list[list[PathLike]]:
-    """
-    Find a representative dicom for each acquisition in ``session_root``.
-
-    :param session_root: path to session root directory. likely like ``.../ProjectName/yyyy.mm.dd-hh.mm.ss``
-    :return: list of lists first dicoms like ``sessroot/subjid/acquisitonname/MR*``
-    """
-    first_dicoms = []
-    if not os.path.isdir(session_root):
-        raise Exception(f"{session_root} is not a directory!")
-    for seqdir in glob(os.path.join(session_root, "*/*/")):
-        if not os.path.isdir(seqdir) or re.search("PhysioLog|PhoenixZIPReport", seqdir):
-            continue
-        # original method. fast. but not always firt-in-time dicom
-        # findcmd = f"find '{seqdir}' -maxdepth 1 -type f \( -iname '*.dcm' -or -iname 'MR.*' -or -iname '*.IMA' \) -print -quit"
-        findcmd = f"find '{seqdir}' -maxdepth 1 -type f \\( -iname '*.dcm' -or -iname 'MR.*' -or -iname '*.IMA' \\) -print0 | sort -zn"  # | sed -z 1q
-        dcms = subprocess.check_output(findcmd, shell=True).decode("utf-8").split("\0")
-
-        if dcms:
-            logging.debug("found first dcm '%s'", dcms[0])
-            first_dicoms.append([d for d in dcms if d])
-        else:
-            logging.warning("no dicoms found in %s", seqdir)
-    return first_dicoms
+from mrqart.session_ingest import PathLike, ingest_session, is_project
+from mrqart.shim_drift import ShimDrift
 
 
 def update_mrrc_db(project_dir_list: list[PathLike] = None):
@@ -77,8 +28,9 @@ def update_mrrc_db(project_dir_list: list[PathLike] = None):
     if not project_dir_list:
         project_dir_list = glob("/disk/mace2/scan_data/*")
 
-    db = DBQuery()
+    db = DBQuery(source=DBQuery.SOURCE_NIGHTLY)
     dtr = DicomTagReader()
+    skipped = 0
     VERYRECENT = db.most_recent()
     for pdir in project_dir_list:
         if not is_project(pdir):
@@ -109,19 +61,17 @@ def update_mrrc_db(project_dir_list: list[PathLike] = None):
         )
 
         for ses in newsessions:
-            acq_dicoms = find_first_dicoms(ses)
-            logging.info("ses '%s' has %d dicoms found", ses, len(acq_dicoms))
-            for acqs in acq_dicoms:
-                if not acqs or not os.path.isfile(acqs[0]):
-                    logging.warning("%s bad acq file '%s'", ses, acqs)
-                    continue
-                logging.debug("processing dcms from newer acq '%s'", acqs[0])
-                all_tags = dtr.read_many_dicom_tags(acqs)
-                if os.environ.get("DRYRUN"):
-                    logging.info(all_tags)
-                else:
-                    db.dict_to_db_row(all_tags)
+            _, n = ingest_session(ses, db, dtr, dry_run=bool(os.environ.get("DRYRUN")))
+            skipped += n
+
+        db.sql.commit()
+
+    logging.info("skipped %d acquisitions already recorded by realtime", skipped)
 
+    # fold only the acquisitions added above into rolling shim statistics
+    if not os.environ.get("DRYRUN"):
+        n = ShimDrift(db.sql).ingest_new()
+        logging.info("shim drift updated with %d new acquisitions", n)
         db.sql.commit()
 
 
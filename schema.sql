@@ -7,7 +7,9 @@ create table acq (
   SubID text,
   Operator text,
   Station text,
-  Shims text
+  Shims text,
+  -- 'realtime' (mrqart.py write-behind), 'nightly' (mrrc_dbupdate.py), or null (older imports)
+  Source text
 );
 
 -- acq params that should match across sessions
@@ -1,7 +1,59 @@
+import sqlite3
 import sys
 from pathlib import Path
 
+import pytest
+
 root = Path(__file__).resolve().parents[1]
 # prefer local sources
 sys.path.insert(0, str(root / "src"))
 sys.path.insert(0, str(root))
+
+
+@pytest.fixture
+def history_db(tmp_path):
+    """db.sqlite of four projects: history on 20250101, then a report day on 20250102
+    with conforming, nonconforming, and template-less sequences"""
+    from mrqart.acq2sqlite import DBQuery
+    from mrqart.email_latest_flip import rebuild_templates
+
+    db_path = tmp_path / "db.sqlite"
+    sql = sqlite3.connect(db_path)
+    with open("schema.sql") as f:
+        _ = [sql.execute(c) for c in f.read().split(";")]
+    sql.execute("CREATE TABLE project (Project TEXT, Physicist TEXT)")
+    db = DBQuery(sql)
+
+    def add(project, subid, seq, tr, series):
+        d = {k: "x" for k in DBQuery.CONSTS}
+        d.update(
+            Project=project,
+            SequenceName=seq,
+            SequenceType="tfl",
+            TR=tr,
+            TE="2.3",
+            AcqTime="101010.000000",
+            AcqDate=subid[-8:],
+            SubID=subid,
+            SeriesNumber=series,
+            Operator="op",
+            Station="AWP1",
+            Shims="1,2,3",
+        )
+        db.dict_to_db_row(d)
+
+    for p in range(4):
+        for n in range(3):  # history: the templates
+            add(f"Brain^P{p}", f"{p}{n}_20250101", "mprage", "2000", "3")
+            add(f"Brain^P{p}", f"{p}{n}_20250101", "rest", "800", "4")
+    for p in range(4):
+        subid = f"{p}9_20250102"
+        add(f"Brain^P{p}", subid, "mprage", "2000" if p % 2 else "2100", "3")
+        add(f"Brain^P{p}", subid, "rest", "900", "4")
+    rebuild_templates(sql)
+    for p in range(4):  # after the rebuild: no template
+        add(f"Brain^P{p}", f"{p}9_20250102", f"new{p}", "10", "5")
+    sql.commit()
+    sql.row_factory = sqlite3.Row
+    yield sql, db_path
+    sql.close()
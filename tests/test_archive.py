@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import sqlite3
+
+import pytest
+
+from mrqart.acq2sqlite import DBQuery
+from mrqart.archive import archive_before, archived_years, attach_archives
+from mrqart.email_latest_flip import (
+    fetch_acquisitions,
+    first_seen_date_for_seq,
+    first_seen_many,
+)
+
+
+@pytest.fixture
+def hot_db(tmp_path):
+    """on disk db with acquisitions spread over 3 years"""
+    sql = sqlite3.connect(tmp_path / "db.sqlite")
+    with open("schema.sql") as f:
+        sql.executescript(f.read())
+    sql.execute(
+        "INSERT INTO acq_param (Project, SequenceName, TR) VALUES ('Brain^X', 'rest', '1300')"
+    )
+    for date, series in [("20230105", 1), ("20240610", 2), ("20260206", 3)]:
+        sql.execute(
+            "INSERT INTO acq (param_id, AcqDate, AcqTime, SubID, SeriesNumber) VALUES (1, ?, '101010.0', 'S1', ?)",
+            (date, series),
+        )
+    sql.commit()
+    return sql
+
+
+def test_archive_before_moves_old_years(hot_db, tmp_path):
+    arch = tmp_path / "arch"
+    moved = archive_before(hot_db, arch, 2025)
+    assert moved == {2023: 1, 2024: 1}
+    assert archived_years(arch) == [2023, 2024]
+
+    hot = hot_db.execute("select AcqDate from main.acq").fetchall()
+    assert [r[0] for r in hot] == ["20260206"]
+
+
+def test_archived_rowids_not_reused(hot_db, tmp_path):
+    # an old session ingested late has the highest rowid
+    hot_db.execute(
+        "INSERT INTO acq (param_id, AcqDate, AcqTime, SubID, SeriesNumber) VALUES (1, '20200101', '101010.0', 'S0', 1)"
+    )
+    hot_db.commit()
+    arch = tmp_path / "arch"
+    archive_before(hot_db, arch, 2025)
+    DBQuery(hot_db).dict_to_db_row(
+        {
+            "Project": "Brain^X",
+            "SequenceName": "rest",
+            "TR": "1300",
+            "AcqDate": "20260207",
+            "AcqTime": "090000.0",
+            "SubID": "S2",
+            "SeriesNumber": "4",
+            "Operator": "op",
+            "Station": "AWP1",
+            "Shims": "1,2,3",
+        }
+    )
+    attach_archives(hot_db, arch)
+    rowids = [r[0] for r in hot_db.execute("select rowid from acq")]
+    assert len(rowids) == len(set(rowids)) == 5
+    assert max(rowids) == 5
+
+
+def test_attach_archives_is_one_logical_acq(hot_db, tmp_path):
+    arch = tmp_path / "arch"
+    rowids = dict(hot_db.execute("select AcqDate, rowid from acq").fetchall())
+    archive_before(hot_db, arch, 2025)
+
+    assert attach_archives(hot_db, arch) == [2023, 2024]
+    db = DBQuery(hot_db)
+    assert len(db.find_acquisitions_since("2000-01-01")) == 3
+
+    # acq_id survives the move
+    rows = fetch_acquisitions(hot_db, "20230105")
+    assert [r["acq_id"] for r in rows] == [rowids["20230105"]]
+
+    # writes land in the hot partition
+    db.dict_to_db_row(
+        {
+            "Project": "Brain^X",
+            "SequenceName": "rest",
+            "TR": "1300",
+            "AcqDate": "20260207",
+            "AcqTime": "090000.0",
+            "SubID": "S2",
+            "SeriesNumber": "4",
+            "Operator": "op",
+            "Station": "AWP1",
+            "Shims": "1,2",
+        }
+    )
+    assert hot_db.execute("select count(*) from main.acq").fetchone()[0] == 2
+    assert len(db.find_acquisitions_since("2000-01-01")) == 4
+
+
+def test_attach_archives_subset_of_years(hot_db, tmp_path):
+    arch = tmp_path / "arch"
+    archive_before(hot_db, arch, 2025)
+    attach_archives(hot_db, arch, years=[2024])
+    dates = [r[0] for r in hot_db.execute("select AcqDate from acq")]
+    assert sorted(dates) == ["20240610", "20260206"]
+
+
+def test_first_seen_without_all_years(hot_db, tmp_path):
+    """SKIP_REBUILD attaches only the report's years. first seen still goes back"""
+    arch = tmp_path / "arch"
+    archive_before(hot_db, arch, 2025)
+    attach_archives(hot_db, arch, years=[2026])
+    hot_db.execute('create table template_by_count (Project, SequenceName, "first")')
+    key = ("Brain^X", "rest")
+    assert first_seen_date_for_seq(hot_db, *key) == "2023-01-05"
+    assert first_seen_many(hot_db, [key, ("Brain^X", "none")]) == {
+        key: "2023-01-05",
+        ("Brain^X", "none"): None,
+    }
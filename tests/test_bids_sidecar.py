@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import json
+import sqlite3
+
+import pytest
+
+from mrqart.acq2sqlite import DBQuery
+from mrqart.bids_sidecar import (
+    SIDECAR_NULL,
+    find_sidecars,
+    ingest_sidecars,
+    read_sidecar,
+    read_sidecars,
+)
+from mrqart.dcmmeta2tsv import DicomTagReader
+from mrqart.email_latest_flip import fetch_acquisitions, rebuild_templates
+from mrqart.recheck import recheck
+from mrqart.template_checker import TemplateChecker
+
+# the same series read from dicom and from the dcm2niix sidecar
+PAIRS = [
+    (
+        "dicoms/MR.1.3.12.2.1107.5.2.43.167046.2022082315355424842882582",
+        "example_jsons/20220823142419-31-dMRI_b0_AP-ep_b5#1.json",
+    ),
+    (
+        "dicoms/MR.1.3.12.2.1107.5.2.43.167046.2022082315415621453329108",
+        "example_jsons/20220823142419-35-dMRI_b0_AP-ep_b5#1.json",
+    ),
+]
+
+
+@pytest.mark.parametrize("dcm,sidecar", PAIRS)
+def test_same_as_dicom(dcm, sidecar):
+    from_dcm = {k: str(v) for k, v in DicomTagReader().read_dicom_tags(dcm).items()}
+    from_json = read_sidecar(sidecar, subid=from_dcm["SubID"])
+    assert list(from_json) == list(from_dcm)
+    skip = set(SIDECAR_NULL) | {"Shims", "dcm_path"}
+    assert {k: v for k, v in from_json.items() if k not in skip} == {
+        k: v for k, v in from_dcm.items() if k not in skip
+    }
+    # all but the shim mode
+    assert from_json["Shims"].split(",")[:-1] == from_dcm["Shims"].split(",")[:-1]
+
+
+def test_multiecho_merged(tmp_path):
+    for echo, te in ((1, 0.014), (2, 0.03163)):
+        (tmp_path / f"20220823142419-14-rest_e{echo}.json").write_text(
+            f'{{"SeriesNumber": 14, "EchoTime": {te}, "AcquisitionTime": "14:45:26.4325"}}'
+        )
+    hdrs = read_sidecars(find_sidecars([str(tmp_path)]), subid="s1")
+    assert [(h["TE"], h["AcqTime"], h["AcqDate"]) for h in hdrs] == [
+        ("14,31.63", "144526.4325", "20220823")
+    ]
+
+
+def test_ingest_and_check():
+    sql = sqlite3.connect(":memory:")
+    with open("schema.sql") as f:
+        _ = [sql.execute(c) for c in f.read().split(";")]
+    db = DBQuery(sql, source=DBQuery.SOURCE_SIDECAR)
+    jsons = find_sidecars(["example_jsons"])
+    assert ingest_sidecars(jsons, db) == 0  # anonymized: no SubID
+    assert ingest_sidecars(jsons, db, subid="11878") == len(jsons)
+    rows = sql.execute("select distinct Source, AcqDate from acq order by 2")
+    assert [tuple(r) for r in rows] == [
+        ("sidecar", "20220823"),
+        ("sidecar", "20220830"),
+    ]
+
+    sql.execute(
+        "create table template_by_count as"
+        " select 1 as n, Project, SequenceName, rowid as param_id from acq_param"
+        " group by Project, SequenceName"
+    )
+    hdr = read_sidecar(jsons[1], subid="11878")
+    assert TemplateChecker(db=sql, context="JSON").check_header(hdr)["conforms"]
+
+
+def test_sidecar_rows_in_db():
+    """
+    sidecar rows don't make templates, aren't flagged for SIDECAR_NULL
+    in DB checks, and are replaced by the nightly dicom crawl
+    """
+    sql = sqlite3.connect(":memory:")
+    with open("schema.sql") as f:
+        _ = [sql.execute(c) for c in f.read().split(";")]
+    dcm = {k: str(v) for k, v in DicomTagReader().read_dicom_tags(PAIRS[1][0]).items()}
+    jsons = find_sidecars(["example_jsons"])
+    side = DBQuery(sql, source=DBQuery.SOURCE_SIDECAR)
+    assert ingest_sidecars(jsons, side, subid=dcm["SubID"]) == len(jsons)
+
+    # nightly crawl (session_ingest.ingest_session) of one of the same series
+    nightly = DBQuery(sql, source=DBQuery.SOURCE_NIGHTLY)
+    assert nightly.drop_live(dcm) == 1
+    assert nightly.dict_to_db_row(dcm)
+    rows = sql.execute(
+        "select Source, count(*) from acq where SeriesNumber = ? group by 1",
+        (dcm["SeriesNumber"],),
+    )
+    assert dict(rows.fetchall()) == {"nightly": 1, "sidecar": 1}  # 20220830's 35
+
+    rebuild_templates(sql)
+    templates = [
+        tuple(r)
+        for r in sql.execute(
+            "select p.Project, p.SequenceName, p.TA"
+            " from template_by_count t join acq_param p on p.rowid = t.param_id"
+        )
+    ]
+    assert templates == [(dcm["Project"], dcm["SequenceName"], dcm["TA"])]
+
+    acqs = fetch_acquisitions(sql, dcm["AcqDate"])
+    results = TemplateChecker(db=sql, context="DB").check_headers(dict(r) for r in acqs)
+    recheck(sql)
+    stored = dict(sql.execute("select acq_id, errors from qa_result").fetchall())
+    sidecars = 0
+    for row, res in zip(acqs, results):
+        if row["SequenceName"] != dcm["SequenceName"]:
+            continue
+        if row["Source"] == DBQuery.SOURCE_SIDECAR:
+            sidecars += 1
+            assert not set(res["errors"]) & set(SIDECAR_NULL)
+        else:
+            assert res["conforms"]
+        assert set(json.loads(stored[row["acq_id"]])) == set(res["errors"])
+    assert sidecars == 1
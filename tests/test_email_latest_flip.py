@@ -14,22 +14,34 @@ from datetime import datetime
 import pytest
 
 from mrqart.email_latest_flip import (
+    Selection,
     SeqSummary,
     Totals,
+    backfill,
     build_email,
+    check_day,
     compact_error_keys,
+    compile_filter,
     evaluate_rows,
+    evaluate_rows_parallel,
     fetch_acquisitions,
     first_seen_date_for_seq,
     first_seen_from_template_by_count,
+    first_seen_many,
     format_expected_got,
     format_series_003,
+    get_physicist_for_project,
     get_report_date,
+    get_report_range,
     is_interesting_sequence_with_blacklist,
+    load_reporting_config,
     parse_ta_seconds,
+    physicists_for_projects,
+    select_eligible,
     select_eligible_rows,
     series_is_posthoc,
     study_has_any_templates,
+    study_has_templates_many,
 )
 
 
@@ -536,3 +548,177 @@ def test_first_seen_date_for_seq(mem_sql):
 
     # MIN(AcqDate) should become ISO
     assert first_seen_date_for_seq(mem_sql, "Brain^X", "Seq") == "2026-01-15"
+
+
+def test_set_based_lookups_match_per_key(mem_sql):
+    mem_sql.execute(
+        "INSERT INTO template_by_count (Project, SequenceName, param_id, first, last, n) VALUES (?,?,?,?,?,?)",
+        ("Brain^X", "Seq", 1, "20260101", "20260201", 10),
+    )
+    mem_sql.execute(
+        "INSERT INTO acq_param (Project, SequenceName, SequenceType) VALUES (?,?,?)",
+        ("Brain^Y", "New", "tfl"),
+    )
+    mem_sql.execute(
+        "INSERT INTO acq (param_id, AcqDate, AcqTime, Station, SubID, SeriesNumber) VALUES (?,?,?,?,?,?)",
+        (1, "20260115", "10:00:00", "ST01", "S1", "2"),
+    )
+    mem_sql.execute("CREATE TABLE project (Project TEXT, Physicist TEXT)")
+    mem_sql.executemany(
+        "INSERT INTO project VALUES (?,?)", [("x", " Dr. X "), ("Y", "  ")]
+    )
+
+    keys = [("Brain^X", "Seq"), ("Brain^Y", "New"), ("Brain^Z", "Gone")]
+    assert first_seen_many(mem_sql, keys) == {
+        k: first_seen_from_template_by_count(mem_sql, *k)
+        or first_seen_date_for_seq(mem_sql, *k)
+        for k in keys
+    }
+    projects = [k[0] for k in keys]
+    assert study_has_templates_many(mem_sql, projects) == {
+        p: study_has_any_templates(mem_sql, p) for p in projects
+    }
+    assert physicists_for_projects(mem_sql, projects) == {
+        p: get_physicist_for_project(mem_sql, p) for p in projects
+    }
+    assert physicists_for_projects(mem_sql, projects)["Brain^X"] == "Dr. X"
+
+
+def test_evaluate_rows_queries_do_not_grow_with_rows():
+    from mrqart.template_checker import TemplateChecker
+
+    sql = sqlite3.connect(":memory:")
+    with open("schema.sql") as f:
+        _ = [sql.execute(c) for c in f.read().split(";")]
+    sql.row_factory = sqlite3.Row
+    sql.execute(
+        "CREATE TABLE template_by_count (n INTEGER, Project TEXT, SequenceName TEXT,"
+        " param_id INTEGER, first TEXT, last TEXT)"
+    )
+
+    def rows(n):
+        # n sequences, none with a template: the per-row lookup path
+        return [
+            {
+                "Project": f"Brain^P{i % 3}",
+                "SubID": "S1",
+                "SequenceName": f"Seq{i}",
+                "SeriesNumber": "1",
+            }
+            for i in range(n)
+        ]
+
+    def count_queries(eligible):
+        tc = TemplateChecker(db=sql)
+        statements = []
+        sql.set_trace_callback(statements.append)
+        evaluate_rows(
+            eligible,
+            sql=sql,
+            tc=tc,
+            marquee_cols=["TR"],
+            study_counts_today={},
+            seq_counts_today={},
+        )
+        sql.set_trace_callback(None)
+        return len(statements)
+
+    few, many = count_queries(rows(3)), count_queries(rows(40))
+    assert few == many
+
+
+def test_parallel_matches_serial(history_db):
+    from pathlib import Path
+
+    from mrqart.template_checker import TemplateChecker
+
+    sql, db_path = history_db
+    settings = load_reporting_config(Path("config/reporting.toml"))
+    rows = fetch_acquisitions(sql, "20250102")
+    counts = dict(
+        study_counts_today={f"Brain^P{p}": 3 for p in range(4)},
+        seq_counts_today={},
+        marquee_cols=settings["marquee_cols"],
+    )
+    serial = evaluate_rows(
+        rows, sql=sql, tc=TemplateChecker(db=sql, context="DB"), **counts
+    )
+    parallel = evaluate_rows_parallel(rows, db_path=db_path, jobs=2, **counts)
+    assert serial[2].total_checked == 12 and serial[2].total_missing_templates == 4
+    assert parallel == serial
+    assert [list(d) for d in parallel[:2]] == [list(d) for d in serial[:2]]
+
+
+def test_report_range():
+    days = get_report_range(
+        {"MRQART_DATE_FROM": "2025-12-30", "MRQART_DATE_TO": "20260102"}
+    )
+    assert [d.yday_str for d in days] == [
+        "20251230",
+        "20251231",
+        "20260101",
+        "20260102",
+    ]
+    assert get_report_range({}) is None
+    with pytest.raises(ValueError):
+        get_report_range({"MRQART_DATE_FROM": "20260102", "MRQART_DATE_TO": "20260101"})
+
+
+def test_backfill_matches_each_day(history_db):
+    from pathlib import Path
+
+    sql, _ = history_db
+    settings = load_reporting_config(Path("config/reporting.toml"))
+    days = get_report_range(
+        {"MRQART_DATE_FROM": "20241231", "MRQART_DATE_TO": "20250102"}
+    )
+    statements = []
+    sql.set_trace_callback(statements.append)
+    reports = backfill(sql, days, settings)
+    sql.set_trace_callback(None)
+    # select_eligible: per-sequence counts, then the eligible rows
+    assert sum("a.AcqDate BETWEEN" in s for s in statements) == 2
+
+    one_by_one = [
+        check_day(sql, rd, fetch_acquisitions(sql, rd.yday_str), settings)
+        for rd in days
+    ]
+    assert [(r.subject, r.body) for r in reports] == [
+        (r.subject, r.body) for r in one_by_one
+    ]
+    assert reports[0].subject == "[MRQA] ✅ 0/0 (0); 0 MIA"
+    assert [r.totals.total_checked for r in reports] == [0, 24, 12]
+
+
+def test_select_eligible_matches_rows(history_db):
+    sql, _ = history_db
+    # P0's new0 is posthoc. Body^P1 and Brain^P3 are skipped (glob and regex)
+    sql.execute(
+        "update acq set SeriesNumber = '101' where SubID = '09_20250102' and SeriesNumber = '5'"
+    )
+    sql.execute("update acq_param set Project = 'Body^P1' where Project = 'Brain^P1'")
+    settings = {
+        "interesting_substrings": ["NEW"],
+        "deny_substrings": ["rest"],
+        "blacklist_study_regex": ["^Body", "P3$"],
+        "blacklist_seqtype_prefixes": ["tfl"],
+        "disable_blacklist": False,
+    }
+    assert compile_filter(settings).study_prefixes == ("Body",)
+
+    statements = []
+    sql.set_trace_callback(statements.append)
+    by_date = select_eligible(sql, settings)
+    sql.set_trace_callback(None)
+    assert len(statements) == 2
+    for date in ("20250101", "20250102"):
+        rows = fetch_acquisitions(sql, date)
+        expect = Selection(*select_eligible_rows(rows, settings), total_seen=len(rows))
+        assert by_date[date] == expect
+
+    day = by_date["20250102"]
+    assert [r["SequenceName"] for r in day.eligible] == ["new2"]
+    assert day.total_seen == 12
+    assert day.excluded_by_deny == {
+        (f"Brain^P{p}", seq) for p in (0, 2) for seq in ("mprage", "rest")
+    }
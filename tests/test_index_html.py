@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+static/index.html's script run in node with just enough of a DOM for it.
+"""
+import json
+import re
+import shutil
+import subprocess
+
+import pytest
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+
+DOM = """
+class El {
+  constructor(tag) { this.tag = tag; this.id = ""; this.children = []; this._html = ""; }
+  prepend(el) { this.children.unshift(el); if (el.id) { byId[el.id] = el; } }
+  set innerHTML(v) { this._html = v; if (v === "") { this.children = []; } }
+  get innerHTML() { return this._html; }
+  get innerText() { return this.children.length ? "x" : this._html; }
+  querySelector(_) { return this.children.length ? this.children[0].progress : null; }
+}
+const byId = {stations: new El("div"), select_station: new El("select")};
+byId.stations._html = "waiting for scanner\\n";
+const document = {
+  getElementById: (id) => byId[id] || null,
+  createElement: (tag) => {
+    const el = new El(tag);
+    el.progress = {innerText: "", classList: {toggle() {}}};
+    return el;
+  },
+};
+const window = {};
+console.log = console.warn = () => {};
+let fetched = [];
+let state_reply = null;
+function fetch(url) {
+  fetched.push(url);
+  return Promise.resolve({json: () => state_reply});
+}
+"""
+
+
+def page_script() -> str:
+    with open("static/index.html") as f:
+        return re.search(r"<script>(.*?)</script>", f.read(), re.S).group(1)
+
+
+def run(steps: str) -> dict:
+    "run ``steps`` after the page script. returns what they ``report()``"
+    js = (
+        DOM
+        + page_script()
+        + "\nfunction report(x) { process.stdout.write(JSON.stringify(x)); }\n"
+        + "function shown(st) { return byId['station-' + st].children.length; }\n"
+        + steps
+    )
+    out = subprocess.run(["node", "-e", js], capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr
+    return json.loads(out.stdout)
+
+
+def state(seq, series, version):
+    content = {
+        "conforms": True,
+        "errors": {},
+        "template_id": "t1",
+        "input": {"Station": "AWP1", "SubID": "1", "SeriesNumber": series},
+    }
+    return {
+        "v": 2,
+        "version": version,
+        "boot": "b",
+        "templates": {"t1": {"TR": "1300"}},
+        "stations": {
+            "AWP1": {
+                "station": "AWP1",
+                "seq": seq,
+                "content": content,
+                "progress": {"received": seq, "expected": 10, "stalled": False},
+            }
+        },
+    }
+
+
+def test_gap_refetch_keeps_series():
+    steps = f"""
+    updateUIFromState({json.dumps(state(1, "3", 1))});
+    const counts = [shown("AWP1")];
+    // seq 2 was missed. /state has the same series, only progress changed
+    state_reply = {json.dumps(state(3, "3", 3))};
+    receivedMessage({{data: JSON.stringify(
+      {{v: 2, type: "update", station: "AWP1", seq: 3, content: 5}})}});
+    setTimeout(() => {{
+      counts.push(shown("AWP1"));
+      // a gap that did bring a new series
+      state_reply = {json.dumps(state(6, "4", 6))};
+      receivedMessage({{data: JSON.stringify(
+        {{v: 2, type: "update", station: "AWP1", seq: 6, content: 5}})}});
+      setTimeout(() => {{
+        counts.push(shown("AWP1"));
+        report({{counts, fetched}});
+      }}, 0);
+    }}, 0);
+    """
+    out = run(steps)
+    assert out["counts"] == [1, 1, 2]
+    assert out["fetched"] == ["/state?since=1&boot=b", "/state?since=3&boot=b"]
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+from mrqart.metrics import Registry
+
+
+def test_render_prometheus_text():
+    reg = Registry()
+    hist = reg.histogram("x_seconds", "x time", buckets=(0.01, 0.1))
+    queue = []
+    reg.gauge("q_depth", "queue depth", lambda: len(queue))
+    assert reg.counter("n_total", "n") is reg.counter("n_total", "n")
+
+    with hist.time():
+        pass
+    hist.observe(0.05)
+    queue += [1, 2]
+    text = reg.render()
+
+    assert "# TYPE x_seconds histogram" in text
+    assert 'x_seconds_bucket{le="0.01"} 1' in text
+    assert 'x_seconds_bucket{le="0.1"} 2' in text
+    assert 'x_seconds_bucket{le="+Inf"} 2' in text
+    assert "x_seconds_count 2" in text
+    assert "q_depth 2.0" in text
+    assert "n_total 0.0" in text
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+
+from mrqart.poll_watcher import (
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_IGNORED,
+    IN_ISDIR,
+    PollingWatcher,
+)
+
+FLAGS = IN_CLOSE_WRITE | IN_CREATE
+
+
+def drain(w):
+    out = list(w.events)
+    w.events.clear()
+    return [(e.flags, e.name) for e in out]
+
+
+def test_poll_reports_new_dirs_and_stable_files(tmp_path):
+    (tmp_path / "old.dcm").write_text("x")
+    w = PollingWatcher()
+    w.watch(str(tmp_path), FLAGS)
+    asyncio.run(w.setup())
+
+    os.mkdir(tmp_path / "ses")
+    w.poll()
+    assert drain(w) == [(IN_CREATE | IN_ISDIR, "ses")]
+
+    ses = str(tmp_path / "ses")
+    w.watch(ses, FLAGS)
+    with open(tmp_path / "ses" / "a.dcm", "w") as f:
+        f.write("partial")
+    w.poll()
+    assert drain(w) == [(IN_CREATE, "a.dcm")]
+
+    # still growing: not reported
+    with open(tmp_path / "ses" / "a.dcm", "a") as f:
+        f.write(" more")
+    w.poll()
+    assert drain(w) == []
+
+    # unchanged for a poll: written. only once
+    w.poll()
+    assert drain(w) == [(IN_CLOSE_WRITE, "a.dcm")]
+    w.poll()
+    assert drain(w) == []
+
+    # unchanged dirs aren't rescanned; baseline file never reported
+    assert "old.dcm" in w.files[str(tmp_path)]
+
+    os.remove(tmp_path / "ses" / "a.dcm")
+    os.rmdir(ses)
+    w.poll()
+    assert (IN_IGNORED, "") in drain(w)
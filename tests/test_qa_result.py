@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import sqlite3
+from pathlib import Path
+
+from mrqart import qa_result
+from mrqart.email_latest_flip import (
+    check_day,
+    evaluate_rows_parallel,
+    fetch_acquisitions,
+    get_report_date,
+    load_reporting_config,
+)
+from mrqart.seq_report import render_seq_report
+
+SETTINGS = load_reporting_config(Path("config/reporting.toml"))
+
+
+def day_report(sql, **kwargs):
+    rd = get_report_date({"MRQART_DATE": "20250102"})
+    rows = fetch_acquisitions(sql, rd.yday_str)
+    return check_day(sql, rd, rows, SETTINGS, store=True, **kwargs)
+
+
+def test_stored_at_check_time(history_db):
+    sql, _ = history_db
+    report = day_report(sql)
+    rows = sql.execute(
+        "select Project, SequenceName, conforms, template_param_id, template_version"
+        " from qa_result order by Project, SequenceName"
+    ).fetchall()
+    assert len(rows) == report.totals.total_checked == 12
+    by_seq = {(r[0], r[1]): r for r in rows}
+    # P0 mprage TR 2100 vs 2000; everyone's rest TR 900 vs 800
+    assert by_seq[("Brain^P0", "mprage")][2] == 0
+    assert by_seq[("Brain^P1", "mprage")][2] == 1
+    assert by_seq[("Brain^P1", "rest")][2] == 0
+    # no template: no verdict
+    assert by_seq[("Brain^P1", "new1")][2:] == (None, None, None)
+    version = by_seq[("Brain^P1", "mprage")][4]
+    assert len(version) == 12
+
+    # checking again replaces rows. same template, same version
+    day_report(sql)
+    assert sql.execute("select count(*) from qa_result").fetchone()[0] == 12
+    versions = sql.execute(
+        "select distinct template_version from qa_result"
+        " where Project = 'Brain^P1' and SequenceName = 'mprage'"
+    )
+    assert [v[0] for v in versions] == [version]
+
+    assert qa_result.series_conformance(
+        sql, "Brain^P0", "mprage", "09_20250102", "20250102"
+    ) == [("3", False)]
+    days = qa_result.failure_days(sql)
+    assert days[("Brain^P2", "rest", "TR")] == 1
+    assert ("Brain^P1", "mprage", "TR") not in days
+
+
+def test_parallel_stores_same(history_db):
+    sql, db_path = history_db
+    day_report(sql)
+    serial = sql.execute(
+        "select acq_id, conforms, errors, template_version from qa_result order by 1"
+    ).fetchall()
+    sql.execute("delete from qa_result")
+
+    evaluate = lambda rows, **kw: evaluate_rows_parallel(
+        rows, db_path=db_path, jobs=2, marquee_cols=SETTINGS["marquee_cols"], **kw
+    )
+    day_report(sql, evaluate=evaluate)
+    parallel = sql.execute(
+        "select acq_id, conforms, errors, template_version from qa_result order by 1"
+    ).fetchall()
+    assert [tuple(r) for r in parallel] == [tuple(r) for r in serial]
+
+
+def test_seq_report_reads_stored(history_db):
+    sql, db_path = history_db
+    cols = ["TR"]
+    args = dict(
+        project="Brain^P2", subid="29_20250102", seqname="rest", marquee_cols=cols
+    )
+    # nothing stored yet: compared here
+    assert "TR: expected 800, saw 900" in render_seq_report(db_path=db_path, **args)
+
+    day_report(sql)
+    # a stored verdict that the plain string compare wouldn't give
+    sql.execute(
+        """update qa_result set errors = '{"TR": {"expect": "800", "have": "901"}}'
+        where Project = 'Brain^P2' and SequenceName = 'rest'"""
+    )
+    sql.commit()
+    assert "TR: expected 800, saw 901" in render_seq_report(db_path=db_path, **args)
+
+
+def test_dry_run_stores_nothing(history_db, monkeypatch, capsys):
+    from mrqart.email_latest_flip import main
+
+    _, db_path = history_db
+    for k, v in {
+        "MRQART_DB": str(db_path),
+        "MRQART_DATE": "20250102",
+        "SKIP_REBUILD": "1",
+    }.items():
+        monkeypatch.setenv(k, v)
+    assert main(dry_run=True) == 0
+    monkeypatch.setenv("MRQART_DATE_FROM", "20250101")
+    monkeypatch.setenv("MRQART_DATE_TO", "20250102")
+    assert main(dry_run=True) == 0
+    assert "Subject:" in capsys.readouterr().out
+
+    assert not qa_result.has_table(sqlite3.connect(db_path))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+from pathlib import Path
+
+from mrqart.acq2sqlite import DBQuery
+from mrqart.email_latest_flip import (
+    check_day,
+    fetch_acquisitions,
+    get_report_date,
+    load_reporting_config,
+    rebuild_templates,
+)
+from mrqart.recheck import recheck
+
+SETTINGS = load_reporting_config(Path("config/reporting.toml"))
+QUERY = (
+    "select acq_id, conforms, errors, template_param_id, template_version"
+    " from qa_result order by acq_id"
+)
+
+
+def stored(sql):
+    return [tuple(r) for r in sql.execute(QUERY)]
+
+
+def test_same_as_checker(history_db):
+    sql, _ = history_db
+    rd = get_report_date({"MRQART_DATE": "20250102"})
+    check_day(sql, rd, fetch_acquisitions(sql, rd.yday_str), SETTINGS, store=True)
+    checked = stored(sql)
+    sql.execute("delete from qa_result")
+
+    stats = recheck(sql)
+    assert stats.acquisitions == 36  # all history, not just the report day
+    day_ids = {r[0] for r in checked}
+    assert [r for r in stored(sql) if r[0] in day_ids] == checked
+    # nothing changed: nothing to do
+    assert recheck(sql).groups == 0
+
+
+def test_only_changed_groups(history_db):
+    sql, _ = history_db
+    rebuild_templates(sql)  # the report day's new sequences get templates
+    recheck(sql)
+    before = stored(sql)
+
+    # P3 rest at TR 900 three more times: the template is now the 900 version
+    db = DBQuery(sql)
+    for n in range(3):
+        d = {k: "x" for k in DBQuery.CONSTS}
+        d.update(
+            Project="Brain^P3",
+            SequenceName="rest",
+            SequenceType="tfl",
+            TR="900",
+            TE="2.3",
+            AcqTime="101010.000000",
+            AcqDate="20250103",
+            SubID=f"3{n}_20250103",
+            SeriesNumber="4",
+            Operator="op",
+            Station="AWP1",
+            Shims="1,2,3",
+        )
+        db.dict_to_db_row(d)
+    rebuild_templates(sql)
+
+    stats = recheck(sql)
+    assert stats.groups == 1
+    after = {r[0]: r for r in stored(sql)}
+    changed = [r for r in before if after[r[0]] != r]
+    rest_p3 = {
+        r[0]
+        for r in sql.execute(
+            "select acq_id from qa_result"
+            " where Project = 'Brain^P3' and SequenceName = 'rest'"
+        )
+    }
+    assert changed and {r[0] for r in changed} <= rest_p3
+    # the old TR 800 history no longer conforms, the 900s do
+    verdicts = sql.execute(
+        "select p.TR, q.conforms from qa_result q join acq a on a.rowid = q.acq_id"
+        " join acq_param p on p.rowid = a.param_id"
+        " where q.Project = 'Brain^P3' and q.SequenceName = 'rest'"
+    )
+    assert {tuple(r) for r in verdicts} == {("800", 0), ("900", 1)}
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+import os
+
+import pydicom
+
+from mrqart.replay import Replay, find_dicoms, summarize
+
+
+def test_summarize_percentiles():
+    stats = summarize([i / 1000 for i in range(1, 101)], sent=120)
+    assert stats["sent"] == 120
+    assert stats["received"] == 100
+    assert (stats["p50_ms"], stats["p99_ms"], stats["max_ms"]) == (50, 99, 100)
+
+
+def test_write_one_per_station(tmp_path):
+    src = find_dicoms("dicoms")[0]
+    rp = Replay([src], tmp_path, stations=2)
+    os.makedirs(rp.session_dir(1))
+    name = rp.write_one(src, 1, 0)
+
+    assert name in rp.closed_at
+    out = pydicom.dcmread(os.path.join(rp.session_dir(1), name))
+    assert out.StationName == pydicom.dcmread(src).StationName + "_sim1"
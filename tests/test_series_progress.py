@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import asyncio
+import time
+
+from mrqart import mrqart
+from mrqart.series_progress import (
+    STALL_GIVE_UP_SECONDS,
+    SeriesProgress,
+    expected_files,
+)
+
+
+def test_expected_files_mosaic():
+    # HabitTask: 320 volume multiband EPI, one mosaic per volume
+    dcm = "dicoms/MR.1.3.12.2.1107.5.2.43.167046.2022082314584544988380003"
+    assert expected_files(dcm) == 320
+    assert expected_files("dicoms/DNE") is None
+
+
+def test_progress_rate_and_eta():
+    p = SeriesProgress(expected=5, now=0)
+    for t in (1, 2, 3, 4):
+        p.observe(t)
+    d = p.to_dict(now=4)
+    assert (d["received"], d["rate"], d["eta_seconds"]) == (5, 1.0, 0.0)
+    assert not p.stalled(now=1000)  # complete
+
+    unknown = SeriesProgress(now=0)
+    assert unknown.to_dict(now=1)["eta_seconds"] is None
+    assert not unknown.stalled(now=1000)
+
+    again = SeriesProgress.from_dict(SeriesProgress(10, now=0).to_dict(now=0))
+    assert (again.expected, again.received, again.last_at) == (10, 1, 0)
+
+
+def test_stall_is_bounded():
+    p = SeriesProgress(expected=100, now=0)
+    p.observe(2)
+    assert p.stalled(now=60)
+    # fewer files than estimated, or aborted: not stalled forever
+    assert not p.stalled(now=2 + STALL_GIVE_UP_SECONDS + 1)
+    p.finish()  # next series started
+    assert (p.remaining(), p.stalled(now=60)) == (0, False)
+
+
+def test_watch_stalls_sends_once():
+    sent = []
+
+    class Coalescer:
+        submit = sent.append
+
+    cur = mrqart.CurSeqStation("AWP1")
+    # last file a minute ago (not so long ago that the series is over)
+    cur.progress = SeriesProgress(expected=100, now=time.time() - 60)
+    state = {"AWP1": cur}
+
+    async def run():
+        task = asyncio.create_task(mrqart.watch_stalls(Coalescer, 0.01, state))
+        await asyncio.sleep(0.05)
+        cur.progress.observe()  # files arrive again
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    assert [m["progress"]["stalled"] for m in sent] == [True, False]
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import shutil
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from mrqart.acq2sqlite import DBQuery
+from mrqart.email_latest_flip import load_reporting_config, rebuild_templates
+from mrqart.session_ingest import SessionWatcher, process_session, session_report
+
+
+def touch(path, content="x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_new_sessions_after_settle(tmp_path):
+    old = tmp_path / "WPC-8620" / "2024.01.01-09.00.00"
+    touch(old / "11883_20240101" / "mprage_256x240.3" / "MR.1")
+    found = []
+    watcher = SessionWatcher([str(tmp_path)], found.append, settle=10)
+    asyncio.run(watcher.watcher.setup())
+
+    new = tmp_path / "WPC-8620" / "2025.01.02-09.00.00"
+    touch(new / "11883_20250102" / "mprage_256x240.3" / "MR.1")
+    # new project directory: its sessions are new too
+    other = tmp_path / "WPC-9999" / "2025.01.02-10.00.00"
+    touch(other / "1_20250102" / "rest_96x96.4" / "MR.1")
+    watcher.step(now=0)
+    assert sorted(watcher.pending) == [str(new), str(other)]
+
+    # still copying
+    touch(new / "11883_20250102" / "mprage_256x240.3" / "MR.2")
+    watcher.step(now=8)
+    watcher.step(now=12)
+    assert found == [str(other)]
+    watcher.step(now=20)
+    assert found == [str(other), str(new)]
+    assert not watcher.pending
+
+
+@pytest.fixture
+def sql():
+    mem = sqlite3.connect(":memory:")
+    with open("schema.sql") as f:
+        _ = [mem.execute(c) for c in f.read().split(";")]
+    mem.execute("create table project (Project text, Physicist text)")
+    return mem
+
+
+def hdr(subid, tr="2000", series="3"):
+    d = {k: "x" for k in DBQuery.CONSTS}
+    d.update(
+        Project="Brain^WPC-8620",
+        SequenceName="mprage",
+        SequenceType="tfl",
+        TR=tr,
+        TE="2.3",
+        AcqTime="101010.000000",
+        AcqDate=subid[-8:],
+        SubID=subid,
+        SeriesNumber=series,
+        Operator="op",
+        Station="AWP1",
+        Shims="1,2,3",
+    )
+    return d
+
+
+def test_session_report_scoped(sql):
+    db = DBQuery(sql, source=DBQuery.SOURCE_NIGHTLY)
+    for subid in ("1_20250101", "2_20250101", "3_20250101"):
+        db.dict_to_db_row(hdr(subid))
+    # another session the same day that isn't being reported
+    db.dict_to_db_row(hdr("4_20250102", tr="3000"))
+    rebuild_templates(sql)
+
+    new = hdr("5_20250102", tr="2500")
+    db.dict_to_db_row(new)
+    settings = load_reporting_config(Path("config/reporting.toml"))
+    subject, body, totals = session_report(sql, [new], settings, "WPC-8620 ses")
+    assert (totals.total_checked, totals.total_nonconforming) == (1, 1)
+    assert "5_20250102" in body and "4_20250102" not in body
+    assert subject.startswith("[MRQA] ❌ 1/1")
+
+
+def test_failed_session_retried(tmp_path, sql):
+    """
+    process_session fails (no template_by_count yet) and rolls back.
+    the watcher retries it after the backoff and it goes through once fixed
+    """
+    ses = tmp_path / "WPC-8620" / "2025.01.02-09.00.00"
+    os.makedirs(ses / "11883_20250102" / "seq")
+    shutil.copy(
+        "example_dicoms/RewardedAnti_good.dcm", ses / "11883_20250102" / "seq" / "MR.1"
+    )
+    db = DBQuery(sql, source=DBQuery.SOURCE_NIGHTLY)
+    settings = load_reporting_config(Path("config/reporting.toml"))
+
+    with pytest.raises(sqlite3.OperationalError):
+        process_session(str(ses), db, settings, [])
+    assert not sql.in_transaction
+
+    watcher = SessionWatcher(
+        [str(tmp_path)],
+        lambda s: process_session(s, db, settings, []),
+        settle=10,
+        retry=100,
+    )
+    asyncio.run(watcher.watcher.setup())
+    watcher.process(str(ses), now=0)
+    assert watcher.failed == {str(ses): (1, 100)}
+    watcher.step(now=50)
+    assert watcher.failed[str(ses)] == (1, 100)
+
+    watcher.step(now=100)  # still broken: waits twice as long
+    assert watcher.failed[str(ses)] == (2, 300)
+
+    rebuild_templates(sql)
+    watcher.step(now=300)
+    assert not watcher.failed
+    n = sql.execute("select count(*) from acq").fetchone()[0]
+    assert n == 1
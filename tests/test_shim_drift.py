@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import sqlite3
+
+import pytest
+
+from mrqart.shim_drift import ShimDrift
+
+BASE = [1174, -2475, 4575, 531, -20, 59, 54, -8, 123160323, 4]
+
+
+def shim_str(offset=0, jitter=0):
+    vals = [v + jitter for v in BASE]
+    vals[0] += offset
+    return ",".join(str(v) for v in vals)
+
+
+@pytest.fixture
+def sql():
+    sql = sqlite3.connect(":memory:")
+    with open("schema.sql") as f:
+        sql.executescript(f.read())
+    sql.execute(
+        "INSERT INTO acq_param (Project, SequenceName) VALUES ('Brain^X', 'rest')"
+    )
+    return sql
+
+
+def add_acq(sql, day, shims):
+    sql.execute(
+        "INSERT INTO acq (param_id, AcqDate, AcqTime, Station, Shims) VALUES (1, ?, '100000.0', 'AWP1', ?)",
+        (f"202601{day:02d}", shims),
+    )
+
+
+def test_ingest_new_flags_outlier_once(sql):
+    for day in range(1, 21):
+        add_acq(sql, day, shim_str(jitter=day % 3))
+    add_acq(sql, 21, shim_str(offset=500))
+
+    drift = ShimDrift(sql)
+    assert drift.ingest_new() == 21
+    flagged = sql.execute("select component, kind from shim_outlier").fetchall()
+    assert (0, "value") in flagged
+    assert all(comp == 0 for comp, _ in flagged)
+
+    # nothing new: no rescan, no duplicate flags
+    assert ShimDrift(sql).ingest_new() == 0
+    assert sql.execute("select count(*) from shim_outlier").fetchone()[0] == len(
+        flagged
+    )
+
+    n = sql.execute(
+        "select n from shim_stats where Station='AWP1' and component=0"
+    ).fetchone()[0]
+    assert n == 21
+
+
+def test_check_does_not_update(sql):
+    for day in range(1, 21):
+        add_acq(sql, day, shim_str(jitter=day % 3))
+    drift = ShimDrift(sql)
+    drift.ingest_new()
+
+    assert drift.check("AWP1", "rest", shim_str(jitter=1)) == []
+    out = drift.check("AWP1", "rest", shim_str(offset=500))
+    assert out[0]["component"] == 0
+    assert drift.check("AWP1", "rest", "null") == []
+    assert drift.stats[("AWP1", "rest")][0].n == 20
+
+
+def test_check_sees_nightly_update(sql):
+    for day in range(1, 21):
+        add_acq(sql, day, shim_str(jitter=day % 3))
+    ShimDrift(sql).ingest_new()
+    realtime = ShimDrift(sql)
+    assert realtime.check("AWP1", "rest", shim_str(offset=500))
+
+    # the scanner really moved: the nightly run folds in the new values
+    for day in range(21, 31):
+        add_acq(sql, day, shim_str(offset=500, jitter=day % 3))
+    ShimDrift(sql).ingest_new()
+    realtime.check("AWP1", "rest", shim_str(offset=500))
+    assert realtime.stats[("AWP1", "rest")][0].n == 30
+
+
+def test_replaced_row_not_folded_twice(sql):
+    from mrqart.acq2sqlite import DBQuery
+
+    for day in range(1, 21):
+        add_acq(sql, day, shim_str(jitter=day % 3))
+    sql.execute("update acq set SubID = 's' || rowid, SeriesNumber = '4'")
+    sql.execute("update acq set Source = 'realtime' where AcqDate = '20260110'")
+    ShimDrift(sql).ingest_new()
+
+    # nightly crawl replaces the realtime row with a new rowid
+    nightly = DBQuery(sql)  # rows as sqlite3.Row
+    live = dict(sql.execute("select * from acq where Source = 'realtime'").fetchone())
+    assert nightly.drop_live(live) == 1
+    sql.execute(
+        "insert into acq (param_id, AcqDate, AcqTime, Station, SubID, SeriesNumber, Shims)"
+        " values (1, ?, ?, ?, ?, ?, ?)",
+        [live[k] for k in ("AcqDate", "AcqTime", "Station", "SubID")]
+        + [live["SeriesNumber"], live["Shims"]],
+    )
+    drift = ShimDrift(sql)
+    assert drift.ingest_new() == 0
+    assert drift._stats("AWP1", "rest")[0].n == 20
+    # and the watermark moved past it
+    assert drift.watermark() == sql.execute("select max(rowid) from acq").fetchone()[0]
+
+
+def test_init_keeps_transaction(sql):
+    add_acq(sql, 1, shim_str())
+    assert sql.in_transaction
+    ShimDrift(sql)
+    assert sql.in_transaction
+    sql.rollback()
+    assert sql.execute("select count(*) from acq").fetchone()[0] == 0
+
+
+def test_init_without_acq():
+    ShimDrift(sqlite3.connect(":memory:"))
@@ -263,3 +263,104 @@ def test_get_failure_streaks(tmp_path):
     streaks = get_failure_streaks(log)
     assert streaks[("Brain^wpc-8620", "HabitTask", "TR")] == 2
     assert streaks[("Brain^wpc-8620", "HabitTask", "FA")] == 1
+
+
+def test_check_headers_matches_check_header(template_checker):
+    """batch check gives the same CheckResult as one at a time"""
+    rows = [
+        MOCK_TEMPLATE,
+        {**MOCK_TEMPLATE, "TR": "1301"},
+        {**MOCK_TEMPLATE, "TR": "1300.0", "FA": "61"},
+        {**MOCK_TEMPLATE, "SequenceName": "NoSequence"},
+        {**MOCK_TEMPLATE, "TR": "1301"},
+    ]
+    batch = template_checker.check_headers(rows)
+    assert batch == [template_checker.check_header(r) for r in rows]
+    assert [r["conforms"] for r in batch] == [True, False, False, True, False]
+    assert batch[2]["errors"] == {"FA": {"expect": "60", "have": "61"}}
+
+
+def test_check_header_nearest_template(template_checker):
+    """renamed sequence without a template gets the closest one in its project"""
+    renamed = {**MOCK_TEMPLATE, "SequenceName": "HabitTask repeat", "TR": "1400"}
+    result = template_checker.check_header(renamed)
+    assert result["template"] == {}
+    assert result["nearest"]["template"]["SequenceName"] == "HabitTask"
+    assert list(result["nearest"]["errors"]) == ["TR"]
+
+    other_project = {**renamed, "Project": "Brain^wpc-DNE"}
+    assert template_checker.check_header(other_project)["nearest"] is None
+
+
+def test_nearest_template_index_rebuilt(template_checker, monkeypatch):
+    """long running checker sees templates added by a template_by_count rebuild"""
+    from mrqart import template_checker as tc_module
+
+    renamed = {**MOCK_TEMPLATE, "SequenceName": "HabitTask repeat", "TR": "1400"}
+    assert template_checker.check_header(renamed)["nearest"]["errors"]
+    sql = template_checker.db.sql
+    sql.execute(
+        "insert into acq_param (Project, SequenceName, TR, TE, FA, iPAT, Comments)"
+        " values (?, 'HabitTask long', '1400', '30', '60', 'GRAPPA', ?)",
+        (MOCK_TEMPLATE["Project"], MOCK_TEMPLATE["Comments"]),
+    )
+    sql.execute(
+        "insert into template_by_count (Project, SequenceName, param_id)"
+        " values (?, 'HabitTask long', last_insert_rowid())",
+        (MOCK_TEMPLATE["Project"],),
+    )
+    # still within INDEX_RECHECK_SECONDS: the old index
+    nearest = template_checker.check_header(renamed)["nearest"]
+    assert nearest["template"]["SequenceName"] == "HabitTask"
+    monkeypatch.setattr(tc_module, "INDEX_RECHECK_SECONDS", 0)
+    nearest = template_checker.check_header(renamed)["nearest"]
+    assert nearest["template"]["SequenceName"] == "HabitTask long"
+    assert nearest["errors"] == {}
+
+
+def test_index_features_unbucketable():
+    """inf/nan values and a 0 tolerance fall back to exact keys"""
+    from mrqart.template_checker import compile_comparators
+    from mrqart.template_index import features
+
+    plan = compile_comparators(0, {"TR": 0})
+    feats = features({"TR": "1300.2", "TE": "inf,30", "FA": "nan"}, plan)
+    assert ("TR", 1300.2) in feats and ("TE", float("inf")) in feats
+    assert ("TE", 600) in feats  # TE keeps its 0.05 tolerance
+    # default tolerances: inf (1e400 overflows) doesn't raise either
+    assert ("TR", float("inf")) in features({"TR": "1e400"})
+
+
+def test_get_templates_matches_get_template(db):
+    """one query for many pairs, same rows as get_template (incl. LIKE matching)"""
+    keys = [
+        ("Brain^wpc-8620", "HabitTask"),
+        ("brain^WPC-8620", "habittask"),
+        ("Brain^wpc-8620", "NoSequence"),
+    ]
+    many = db.get_templates(keys)
+    assert many == {k: db.get_template(*k) for k in keys}
+    assert many[keys[0]]["TR"] == "1300" and many[keys[2]] is None
+    assert db.get_templates([]) == {}
+
+
+def test_nearest_template_multiecho():
+    """the index compares TE to every echo, like the exact check"""
+    sql = sqlite3.connect(":memory:")
+    with open("schema.sql") as f:
+        _ = [sql.execute(c) for c in f.read().split(";")]
+    sql.execute(
+        "insert into acq_param (Project, SequenceName, TR, TE, FA)"
+        " values ('Brain^wpc-8620', 'rest_me', '1300', '14', '60')"
+    )
+    sql.execute(
+        "create table template_by_count as select 1 as n, Project, SequenceName,"
+        " rowid as param_id, '14,31.63' as multiecho_tes from acq_param"
+    )
+    checker = TemplateChecker(sql)
+    hdr = {k: "null" for k in DBQuery.CONSTS}
+    hdr.update(Project="Brain^wpc-8620", TR="1300", FA="60", TE="31.63")
+    assert checker.check_header({**hdr, "SequenceName": "rest_me"})["conforms"]
+    nearest = checker.check_header({**hdr, "SequenceName": "rest_me2"})["nearest"]
+    assert nearest["template"]["TE"] == "14,31.63"
+    assert nearest["errors"] == {}
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import json
+
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application
+
+from mrqart import mrqart
+from mrqart.mrqart import CurSeqStation, GetState, StateCache
+
+
+def add_station(station, series):
+    cur = mrqart.STATE[station] = CurSeqStation(station)
+    cur.update_isnew(series, "rest")
+    cur.hdr_check = {"conforms": True, "errors": {}, "input": {"SeriesNumber": series}}
+    mrqart.STATE_CACHE.bump(station)
+
+
+class TestGetState(AsyncHTTPTestCase):
+    def setUp(self):
+        self._state, self._cache = mrqart.STATE, mrqart.STATE_CACHE
+        mrqart.STATE = {}
+        mrqart.STATE_CACHE = StateCache()
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        mrqart.STATE, mrqart.STATE_CACHE = self._state, self._cache
+
+    def get_app(self):
+        return Application([(r"/state", GetState)])
+
+    def test_etag_and_304(self):
+        add_station("AWP1", "1")
+        first = self.fetch("/state")
+        assert first.code == 200
+        etag = first.headers["Etag"]
+        builds = mrqart.M_STATE_BUILDS.value
+
+        again = self.fetch("/state", headers={"If-None-Match": etag})
+        assert again.code == 304
+        assert mrqart.M_STATE_BUILDS.value == builds  # not re-serialized
+
+        add_station("AWP1", "2")
+        changed = self.fetch("/state", headers={"If-None-Match": etag})
+        assert changed.code == 200 and changed.headers["Etag"] != etag
+
+    def test_since(self):
+        add_station("AWP1", "1")
+        full = json.loads(self.fetch("/state").body)
+        assert list(full["stations"]) == ["AWP1"]
+
+        add_station("AWP2", "5")
+        query = f"since={full['version']}&boot={full['boot']}"
+        delta = json.loads(self.fetch(f"/state?{query}").body)
+        assert list(delta["stations"]) == ["AWP2"]
+        assert delta["version"] == 2
+
+        # versions from another server instance get everything
+        other = json.loads(self.fetch(f"/state?since=1&boot=nope").body)
+        assert sorted(other["stations"]) == ["AWP1", "AWP2"]
+
+        assert self.fetch("/state?since=x").code == 400
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+import asyncio
+
+from mrqart.mrqart import CurSeqStation, StateSnapshot
+
+
+def test_snapshot_roundtrip(tmp_path):
+    path = tmp_path / "state.json"
+    state = {"AWP1": CurSeqStation("AWP1")}
+    state["AWP1"].update_isnew("7", "rest")
+    state["AWP1"].count = 42
+    state["AWP1"].hdr_check = {"conforms": False, "errors": {"TR": {}}}
+
+    async def run():
+        snap = StateSnapshot(path, state, debounce=0.05)
+        for _ in range(10):
+            snap.mark_dirty()
+        assert not path.exists()
+        await asyncio.sleep(0.1)
+        return snap
+
+    snap = asyncio.run(run())
+    assert snap.writes == 1
+
+    restored: dict = {}
+    assert StateSnapshot(path, restored).load() == 1
+    assert restored["AWP1"].to_dict() == state["AWP1"].to_dict()
+    # still the same series: next file is an update, not new
+    assert not restored["AWP1"].update_isnew("7", "rest")
+
+
+def test_snapshot_missing_or_bad(tmp_path):
+    state: dict = {}
+    assert StateSnapshot(tmp_path / "nope.json", state).load() == 0
+    bad = tmp_path / "bad.json"
+    bad.write_text("{not json")
+    assert StateSnapshot(bad, state).load() == 0
+    assert state == {}
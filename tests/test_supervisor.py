@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import time
+
+from mrqart import mrqart
+from mrqart.supervisor import Supervisor
+
+
+def fake_worker(root, out, options):
+    "one new and one update per start, then exit like a crash"
+    station = f"{root}_station"
+    out.put(
+        ({"station": station, "type": "new", "content": {"conforms": True}}, "1rest")
+    )
+    out.put(({"station": station, "type": "update", "content": 3}, "1rest"))
+
+
+def drain(sup, n, timeout=20):
+    got = []
+    end = time.monotonic() + timeout
+    while len(got) < n and time.monotonic() < end:
+        item = sup.get(timeout=0.5)
+        if item:
+            got.append(item)
+    return got
+
+
+def test_worker_per_root_and_restart():
+    sup = Supervisor(["a", "b"], restart_delay=0, target=fake_worker)
+    sup.start()
+    try:
+        got = drain(sup, 4)
+        assert (
+            sorted(m["station"] for m, _ in got)
+            == ["a_station"] * 2 + ["b_station"] * 2
+        )
+        for proc in sup.procs.values():
+            proc.join(timeout=10)
+        sup.check()
+        assert sup.restarts == 2
+        assert len(drain(sup, 4)) == 4
+    finally:
+        sup.close()
+
+
+def test_apply_worker_message(monkeypatch):
+    sent = []
+    monkeypatch.setattr(mrqart, "ws_send", sent.append)
+    monkeypatch.setattr(mrqart, "STATE", {})
+    check = {"conforms": True, "errors": {}, "input": {}, "template": {}}
+    mrqart.apply_worker_message(
+        {"station": "AWP1", "type": "new", "content": check}, "7rest"
+    )
+    mrqart.apply_worker_message(
+        {"station": "AWP1", "type": "update", "content": 5}, "7rest"
+    )
+
+    cur = mrqart.STATE["AWP1"]
+    assert (cur.series_seqname, cur.count, cur.hdr_check) == ("7rest", 5, check)
+    assert [m["type"] for m in sent] == ["new", "update"]
+    # same series in the front end's STATE: a restart restores it as current
+    assert not cur.update_isnew("7", "rest")
+
+
+def test_watch_counts_from_workers():
+    sup = Supervisor(["a", "b"])
+    passed = []
+    for root, n in (("a", 3), ("b", 4), ("a", 5)):
+        counts = {"watches": n, "by_depth": {0: 1, 1: n - 1}, "expired": 1}
+        sup.dispatch(({"type": "watches", "root": root, "counts": counts}, ""), None)
+    sup.dispatch(
+        ({"station": "s", "type": "update", "content": 1}, "1rest"),
+        lambda msg, seqname: passed.append(msg),
+    )
+    counts = sup.counts()
+    assert (counts["watches"], counts["by_depth"], counts["expired"]) == (
+        9,
+        {0: 2, 1: 7},
+        2,
+    )
+    assert counts["workers"]["a"]["watches"] == 5
+    assert [m["type"] for m in passed] == ["update"]
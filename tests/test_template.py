@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 import pytest
 
-from mrqart.template_checker import TemplateChecker, find_errors
+from mrqart.template_checker import TemplateChecker, compile_comparators, find_errors
 
 
 def test_find_errors_tr():
@@ -51,3 +51,26 @@ def test_find_errors_te_wrong():
     """wrong single TE still fails"""
     errors = find_errors({"TE": "38.76"}, {"TE": "14.6"})
     assert errors["TE"]["have"] == "14.6"
+
+
+def test_find_errors_float_tolerance():
+    """numeric columns compare as floats within the plan's tolerance"""
+    plan = compile_comparators(1e-3, {"TE": 0.05, "TR": 1.0})
+    assert not find_errors({"FA": "60"}, {"FA": "60.0"}, plan=plan)
+    assert not find_errors({"TE": "38.76"}, {"TE": "4.8,38.8"}, plan=plan)
+    assert find_errors({"TE": "38.76"}, {"TE": "38.9"}, plan=plan)
+    assert find_errors({"TR": "1300"}, {"TR": "1301"}, plan=plan)
+
+    loose = compile_comparators(1e-3, {"TR": 5})
+    assert not find_errors({"TR": "1300"}, {"TR": "1301"}, plan=loose)
+
+
+def test_find_errors_pixelresol_vector():
+    """PixelResol from realtime and DB differ in precision and formatting"""
+    errors = find_errors(
+        {"PixelResol": "[2.2978723049164, 2.2978723049164]"},
+        {"PixelResol": [2.29787, 2.29787]},
+    )
+    assert not errors
+    errors = find_errors({"PixelResol": "[2.3, 2.3]"}, {"PixelResol": "[2.3]"})
+    assert "PixelResol" in errors
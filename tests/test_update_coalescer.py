@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+import asyncio
+
+from mrqart.mrqart import UpdateCoalescer
+
+
+def update(count, station="AWP1"):
+    return {"station": station, "type": "update", "content": count}
+
+
+def test_updates_coalesced_latest_wins():
+    sent = []
+
+    async def run():
+        co = UpdateCoalescer(sent.append, max_per_second=10)
+        for i in range(100):
+            co.submit(update(i))
+        co.submit(update(0, "AWP2"))
+        await asyncio.sleep(0.15)
+        return co
+
+    co = asyncio.run(run())
+    assert [m["content"] for m in sent if m["station"] == "AWP1"] == [0, 99]
+    assert [m["station"] for m in sent].count("AWP2") == 1
+    assert co.dropped == 98
+
+
+def test_new_flushes_pending_first():
+    sent = []
+
+    async def run():
+        co = UpdateCoalescer(sent.append, max_per_second=1)
+        co.submit(update(1))
+        co.submit(update(2))
+        co.submit({"station": "AWP1", "type": "new", "content": {}})
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert [(m["type"], m["content"]) for m in sent] == [
+        ("update", 1),
+        ("update", 2),
+        ("new", {}),
+    ]
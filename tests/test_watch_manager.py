@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import os
+
+from mrqart.mrqart import WatchManager
+
+
+class FakeWatcher:
+    """records watch/unwatch like aionotify.Watcher without inotify"""
+
+    def __init__(self):
+        self.requests = {}
+        self.descriptors = {}
+
+    def watch(self, path, flags, alias=None):
+        alias = alias or path
+        if alias in self.requests:
+            raise ValueError(alias)
+        self.requests[alias] = (path, flags)
+        self.descriptors[alias] = len(self.descriptors) + 1
+
+    def unwatch(self, alias):
+        del self.requests[alias]
+        del self.descriptors[alias]
+
+
+def mktree(root, *dirs):
+    for d in dirs:
+        os.makedirs(os.path.join(root, d))
+
+
+def test_watch_depth(tmp_path):
+    mktree(tmp_path, "ses1/a/deep", "ses2")
+    wm = WatchManager(FakeWatcher(), max_depth=2, idle_seconds=60)
+    wm.add_root(tmp_path)
+    root = str(tmp_path)
+    assert set(wm.depth) == {
+        root,
+        f"{root}/ses1",
+        f"{root}/ses1/a",
+        f"{root}/ses2",
+    }
+    assert wm.counts()["by_depth"] == {0: 1, 1: 2, 2: 1}
+
+    # new dir below a watched one. twice is fine
+    mktree(tmp_path, "ses3/b")
+    wm.watch(f"{root}/ses3/")
+    wm.watch(f"{root}/ses3")
+    assert wm.depth[f"{root}/ses3"] == 1
+    assert wm.depth[f"{root}/ses3/b"] == 2
+    assert len(wm.watcher.requests) == wm.counts()["watches"] == 6
+
+
+def test_expire_idle(tmp_path):
+    mktree(tmp_path, "old", "busy/series")
+    wm = WatchManager(FakeWatcher(), max_depth=2, idle_seconds=60)
+    wm.add_root(tmp_path)
+    root = str(tmp_path)
+
+    start = wm.last_seen[root]
+    wm.touch(f"{root}/busy/series", now=start + 100)
+    expired = wm.expire(now=start + 120)
+
+    assert expired == [f"{root}/old"]
+    assert set(wm.depth) == {root, f"{root}/busy", f"{root}/busy/series"}
+    assert f"{root}/old" not in wm.watcher.requests
+    assert wm.counts()["expired"] == 1
+
+    # roots never expire
+    wm.expire(now=start + 10_000)
+    assert list(wm.depth) == [root]
+
+
+def test_forget_after_kernel_removed(tmp_path):
+    class GoneWatcher(FakeWatcher):
+        def unwatch(self, alias):
+            raise IOError("already gone")
+
+    mktree(tmp_path, "ses")
+    wm = WatchManager(GoneWatcher(), max_depth=1)
+    wm.add_root(tmp_path)
+    wm.forget(f"{tmp_path}/ses")
+    assert f"{tmp_path}/ses" not in wm.watcher.requests
+    assert wm.counts()["watches"] == 1
+
+
+def test_pipeline_db_path(tmp_path):
+    """--db reaches the checker (and so --write-behind and shim drift)"""
+    from mrqart.mrqart import build_pipeline
+
+    db = tmp_path / "other.sqlite"
+    _, checker, drift = build_pipeline(
+        [str(tmp_path)], watcher_backend="poll", db_path=db
+    )
+    files = [r[2] for r in checker.db.sql.execute("PRAGMA database_list")]
+    assert files == [str(db)]
+    assert drift.sql is checker.db.sql
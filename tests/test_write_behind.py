@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+import asyncio
+import sqlite3
+
+import pytest
+
+from mrqart.acq2sqlite import DBQuery
+from mrqart.mrqart import WriteBehind
+
+
+@pytest.fixture
+def sql():
+    mem = sqlite3.connect(":memory:")
+    with open("schema.sql") as f:
+        _ = [mem.execute(c) for c in f.read().split(";")]
+    return mem
+
+
+def hdr(
+    te="30", acqtime="101010.000000", fov="FoV 1617*1727", series="7", date="20250102"
+):
+    d = {k: "x" for k in DBQuery.CONSTS}
+    d.update(
+        Project="Brain^wpc-8620",
+        SequenceName="rest_ME",
+        TE=te,
+        FoV=fov,
+        AcqTime=acqtime,
+        AcqDate=date,
+        SubID="11883_20250102",
+        SeriesNumber=series,
+        Operator="op",
+        Station="AWP1",
+        Shims="1,2,3",
+    )
+    return d
+
+
+def test_multiecho_one_row(sql):
+    writer = WriteBehind(DBQuery(sql, source=DBQuery.SOURCE_REALTIME))
+    for t, te in enumerate(["13", "30", "47", "13", "30"]):
+        writer.observe(hdr(te=te, acqtime=f"10101{t}.000000"))
+    writer.observe(hdr(series="8"))
+    assert writer.flush() == 0  # not settled
+    assert writer.flush(force=True) == 2
+
+    rows = [
+        tuple(r)
+        for r in sql.execute(
+            "select a.SeriesNumber, a.AcqTime, a.Source, p.TE"
+            " from acq a join acq_param p on a.param_id = p.rowid order by 1"
+        )
+    ]
+    assert rows == [
+        ("7", "101010.000000", "realtime", "13,30,47"),
+        ("8", "101010.000000", "realtime", "30"),
+    ]
+
+    # late file of a written series is not a new acquisition
+    writer.observe(hdr(te="47", acqtime="101099.000000"))
+    assert writer.flush(force=True) == 0
+
+
+def test_earliest_time_and_later_visit(sql):
+    db = DBQuery(sql, source=DBQuery.SOURCE_NIGHTLY)
+    writer = WriteBehind(DBQuery(sql, source=DBQuery.SOURCE_REALTIME))
+    # second volume's file arrived first
+    writer.observe(hdr(acqtime="101012.000000"))
+    writer.observe(hdr(acqtime="101010.000000"))
+    assert writer.flush(force=True) == 1
+    # what the nightly crawl reads from the first file
+    assert db.check_acq(hdr(acqtime="101010.000000"))
+
+    # same SubID and series number on another day is another acquisition
+    writer.observe(hdr(date="20250109"))
+    assert writer.flush(force=True) == 1
+    assert sql.execute("select count(*) from acq").fetchone()[0] == 2
+
+
+def test_nightly_skip_and_replace(sql):
+    db = DBQuery(sql, source=DBQuery.SOURCE_NIGHTLY)
+    writer = WriteBehind(DBQuery(sql, source=DBQuery.SOURCE_REALTIME))
+    writer.observe(hdr())
+    writer.observe(hdr(series="8", fov="null"))
+    writer.flush(force=True)
+
+    assert db.captured_live(hdr())
+    # realtime dicom was missing FoV: nightly reads it again and replaces the row
+    assert not db.captured_live(hdr(series="8"))
+    assert db.drop_live(hdr(series="8")) == 1
+    assert db.dict_to_db_row(hdr(series="8"))
+    sources = sql.execute("select Source from acq where SeriesNumber = '8'")
+    assert [r["Source"] for r in sources] == ["nightly"]
+
+
+def test_source_column_added():
+    old = sqlite3.connect(":memory:")
+    old.execute("create table acq (param_id integer, AcqTime text)")
+    DBQuery(old, source=DBQuery.SOURCE_NIGHTLY)
+    cols = [r[1] for r in old.execute("pragma table_info(acq)")]
+    assert cols[-1] == "Source"
+
+
+def test_bad_header_dropped(sql, caplog):
+    writer = WriteBehind(DBQuery(sql, source=DBQuery.SOURCE_REALTIME))
+    bad = hdr(series="9")
+    del bad["AcqTime"]
+    writer.observe(hdr())
+    writer.observe(bad)
+    writer.observe(hdr(series="8"))
+    assert writer.flush(force=True) == 2
+    assert "dropped acquisition" in caplog.text
+    series = [r[0] for r in sql.execute("select SeriesNumber from acq order by 1")]
+    assert series == ["7", "8"]
+    assert not writer.pending and not sql.in_transaction
+
+
+def test_run_forever_survives_error(sql):
+    writer = WriteBehind(DBQuery(sql, source=DBQuery.SOURCE_REALTIME), interval=0)
+    calls = []
+
+    def flush():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        raise asyncio.CancelledError
+
+    writer.flush = flush
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(writer.run_forever())
+    assert len(calls) == 2
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+from mrqart.ws_protocol import DeltaEncoder, decode
+
+TEMPLATE = {"Project": "Brain^wpc-8620", "SequenceName": "rest", "TR": "1300"}
+
+
+def new(series, tr="1300", station="AWP1", template=TEMPLATE):
+    hdr = {"Station": station, "SeriesNumber": series, "TR": tr, "Shims": "1,2,3"}
+    errors = {} if tr == "1300" else {"TR": {"have": tr, "expect": "1300"}}
+    content = {
+        "conforms": not errors,
+        "errors": errors,
+        "input": hdr,
+        "template": template,
+        "nearest": None,
+    }
+    return {"station": station, "type": "new", "content": content}
+
+
+def test_template_sent_once_and_input_delta():
+    enc = DeltaEncoder()
+    first = enc.encode(new("1"))
+    second = enc.encode(new("2", tr="2000"))
+
+    assert first["v"] == 2 and first["seq"] == 1 and second["seq"] == 2
+    tid = first["content"]["template_id"]
+    assert first["templates"] == {tid: TEMPLATE}
+    assert "templates" not in second
+    assert second["content"]["template_id"] == tid
+    assert "input" in first["content"]
+    assert second["content"]["input_delta"] == {"SeriesNumber": "2", "TR": "2000"}
+    assert enc.hello()["templates"] == {tid: TEMPLATE}
+
+
+def test_decode_rebuilds_checkresult():
+    enc = DeltaEncoder()
+    templates, inputs = {}, {}
+    msgs = [new("1"), new("2", tr="2000"), new("1", station="AWP2"), new("3")]
+    for msg in msgs:
+        assert decode(enc.encode(msg), templates, inputs) == msg["content"]
+
+
+def test_decode_missing_base():
+    enc = DeltaEncoder()
+    enc.encode(new("1"))
+    # a browser that connected after the first message
+    assert decode(enc.encode(new("2")), {}, {}) is None
+
+
+def test_update_and_no_template():
+    enc = DeltaEncoder()
+    upd = enc.encode({"station": "AWP1", "type": "update", "content": 3})
+    assert upd == {"station": "AWP1", "type": "update", "content": 3, "v": 2, "seq": 1}
+    msg = enc.encode(new("1", template={}))
+    assert msg["content"]["template_id"] is None and "templates" not in msg
+
+
+def test_state_is_full():
+    enc = DeltaEncoder()
+    enc.encode(new("1"))
+    enc.encode(new("2"))
+    state = enc.state({"AWP1": new("2")["content"], "AWP2": None})
+    tid = state["stations"]["AWP1"]["content"]["template_id"]
+    assert state["templates"] == {tid: TEMPLATE}
+    assert state["stations"]["AWP1"]["seq"] == 2
+    assert state["stations"]["AWP1"]["content"]["input"]["SeriesNumber"] == "2"
+    assert state["stations"]["AWP2"]["content"] is None
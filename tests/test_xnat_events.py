@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+import asyncio
+import tempfile
+from pathlib import Path
+
+from tornado.testing import AsyncHTTPTestCase, gen_test
+from tornado.web import Application
+
+from mrqart import mrqart
+from mrqart.mrqart import XnatEvent
+from mrqart.xnat_events import XnatEventQueue, fake_session_event, post_event
+
+
+def test_queue_dedupes(tmp_path):
+    seen = []
+    events = XnatEventQueue([str(tmp_path)], seen.append, dedupe_seconds=60)
+    assert events.put("a", now=0)
+    assert not events.put("a", now=1)  # still queued
+
+    async def run():
+        task = asyncio.create_task(events.run_forever())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    assert seen == ["a"]
+    done = events.done["a"]
+    assert not events.put("a", now=done + 30)  # processed recently
+    assert events.put("a", now=done + 61)
+    assert events.duplicates == 2
+
+
+class TestXnatEvent(AsyncHTTPTestCase):
+    def setUp(self):
+        self._events = mrqart.XNAT_EVENTS
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        mrqart.XNAT_EVENTS = self._events
+
+    def get_app(self):
+        return Application([(r"/xnat/event", XnatEvent)])
+
+    def post(self, body):
+        return self.fetch("/xnat/event", method="POST", body=body)
+
+    def test_not_enabled(self):
+        mrqart.XNAT_EVENTS = None
+        assert self.post("{}").code == 404
+
+    @gen_test
+    async def test_queued_once(self):
+        root = Path(tempfile.mkdtemp())
+        ses = root / "WPC-8620" / "2025.01.02-09.00.00"
+        (ses / "11883_20250102").mkdir(parents=True)
+        mrqart.XNAT_EVENTS = XnatEventQueue([str(root)], print)
+
+        event = fake_session_event("WPC-8620", "11883_20250102")
+        url = self.get_url("/xnat/event")
+        # the fake XNAT blocks like a real client would: keep it off the server's loop
+        first = await asyncio.to_thread(post_event, url, event)
+        again = await asyncio.to_thread(post_event, url, event)
+        assert first == (202, {"session": str(ses), "queued": True})
+        assert again == (202, {"session": str(ses), "queued": False})
+
+        missing = fake_session_event("WPC-8620", "nobody")
+        assert (await asyncio.to_thread(post_event, url, missing))[0] == 404
+        bad = await self.http_client.fetch(
+            url, method="POST", body="not json", raise_error=False
+        )
+        assert bad.code == 400